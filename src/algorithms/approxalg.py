@@ -15,6 +15,14 @@ from src.entities.trajenties import AoI, Tour, MultiRoundSolutionBuilder, MultiR
 from src.util import utility
 from abc import ABCMeta, abstractmethod
 
+import multiprocessing
+import numpy as np
+import functools
+import heapq
+import queue
+import json
+import time
+import os
 
 
 # """ Constructor for the Greedy-And-Prune Algorithm (GaP), input the graph that
@@ -61,8 +69,9 @@ class AbstractGreedyAndPrune():
         self.uavs = list(uavs_tours.keys())
         self.nuavs = len(self.uavs)
 
-        # uav_tours should use integer index for the model
-        self.uavs_tours = {i: uavs_tours[self.uavs[i]] for i in range(self.nuavs)}
+        # uav_tours should use integer index for the model (a stream of tours, e.g. iter_trajectories, is consumed once)
+        self.uavs_tours = {i: uavs_tours[self.uavs[i]] if isinstance(uavs_tours[self.uavs[i]], list)
+                           else list(uavs_tours[self.uavs[i]]) for i in range(self.nuavs)}
 
         # check depots (each drone should leave always from same depot)
         self.__check_depots()
@@ -101,6 +110,121 @@ class AbstractGreedyAndPrune():
         """
         pass
 
+    @abstractmethod
+    def candidate_quality(self, tour : Tour, uav_residual_rounds : int, visited_points : set):
+        """ the greedy quality of a candidate tour
+
+        :param tour: the candidate tour
+        :param uav_residual_rounds: the number of residual tours to assign to the drone of the tour
+        :param visited_points: the already visited points
+        :return: the quality of the tour (the higher the better)
+        """
+        pass
+
+    @abstractmethod
+    def objective_value(self, mr_solution: MultiRoundSolution):
+        """ the objective of the algorithm (TC or AC) for a solution, the higher the better """
+        pass
+
+    def randomized_choice(self, visited_points : set, residual_ntours_to_assign : dict, rng, alpha : float):
+        """ randomized greedy choice (GRASP): a random candidate of the restricted candidate list (RCL), i.e.,
+            among the candidates with quality >= best - alpha * (best - worst)
+
+        :param visited_points: the already visited points
+        :param residual_ntours_to_assign: a disctionary {drone : number of residual tours to assign}
+        :param rng: the random generator (numpy.random.Generator)
+        :param alpha: the greediness of the RCL, 0 -> only the best candidates, 1 -> all the candidates
+        :return:   a tuple (index_uav, index_tour)
+        """
+        choices, qualities = [], []
+        for ind_uav in range(self.nuavs):
+            uav_residual_rounds = residual_ntours_to_assign[ind_uav]
+            if uav_residual_rounds > 0:
+                uav_tours = self.uavs_tours[ind_uav]
+                for ind_tour in range(len(uav_tours)):
+                    choices.append((ind_uav, ind_tour))
+                    qualities.append(self.candidate_quality(uav_tours[ind_tour], uav_residual_rounds, visited_points))
+
+        qualities = np.array(qualities)
+        threshold = qualities.max() - alpha * (qualities.max() - qualities.min())
+        rcl = np.flatnonzero(qualities >= threshold)
+        return choices[rcl[rng.integers(len(rcl))]]
+
+    def stochastic_sample_size(self, epsilon : float) -> int:
+        """ the number of candidates sampled at each step by the stochastic greedy ("lazier than lazy greedy"):
+            (n / k) * log(1 / epsilon), with n the candidate tours and k the tours to assign (greedy steps).
+            The stochastic greedy is a (1 - 1/e - epsilon) approximation in expectation.
+
+        :param epsilon: the accuracy, in (0, 1)
+        """
+        assert 0 < epsilon < 1, "epsilon must be in (0, 1)"
+        n_candidates = sum(len(tours) for tours in self.uavs_tours.values())
+        n_steps = max(1, self.max_rounds * self.nuavs)
+        return max(1, min(n_candidates, int(np.ceil(n_candidates / n_steps * np.log(1 / epsilon)))))
+
+    def stochastic_choice(self, visited_points : set, residual_ntours_to_assign : dict, rng, sample_size : int):
+        """ stochastic greedy choice: the best candidate of a uniform random sample (without replacement) of the
+            candidates of the drones with residual tours
+
+        :param visited_points: the already visited points
+        :param residual_ntours_to_assign: a disctionary {drone : number of residual tours to assign}
+        :param rng: the random generator (numpy.random.Generator)
+        :param sample_size: the number of candidates to sample (see stochastic_sample_size)
+        :return:   a tuple (index_uav, index_tour)
+        """
+        uavs = [u for u in range(self.nuavs) if residual_ntours_to_assign[u] > 0 and len(self.uavs_tours[u]) > 0]
+        offsets = np.cumsum([0] + [len(self.uavs_tours[u]) for u in uavs])
+        sample = np.sort(rng.choice(offsets[-1], size=min(sample_size, offsets[-1]), replace=False))
+        owners = np.searchsorted(offsets, sample, side="right") - 1
+        best, best_quality = None, None
+        for i, ind_tour in zip(owners.tolist(), (sample - offsets[owners]).tolist()):
+            ind_uav = uavs[i]
+            quality = self.candidate_quality(self.uavs_tours[ind_uav][ind_tour],
+                                             residual_ntours_to_assign[ind_uav], visited_points)
+            if best is None or quality > best_quality:
+                best, best_quality = (ind_uav, ind_tour), quality
+        return best
+
+    def batch_choice(self, visited_points : set, residual_ntours_to_assign : dict) -> list:
+        """ round-parallel greedy choice: a tour for each drone with residual tours. The qualities of all the
+            candidates are computed once (a single scan of the pools); the conflicts among the drones are resolved
+            by a sequential greedy within the batch, with lazy re-evaluation: the precomputed qualities are upper
+            bounds of the qualities after the other choices of the batch (they can only decrease).
+
+        :param visited_points: the already visited points
+        :param residual_ntours_to_assign: a disctionary {drone : number of residual tours to assign}
+        :return: the list of choices (index_uav, index_tour), at most one for each drone
+        """
+        heaps = {}  # drone -> heap of (-quality upper bound, -index_tour)
+        for ind_uav in range(self.nuavs):
+            uav_residual_rounds = residual_ntours_to_assign[ind_uav]
+            if uav_residual_rounds > 0 and len(self.uavs_tours[ind_uav]) > 0:
+                heaps[ind_uav] = [(-self.candidate_quality(tour, uav_residual_rounds, visited_points), -ind_tour)
+                                  for ind_tour, tour in enumerate(self.uavs_tours[ind_uav])]
+                heapq.heapify(heaps[ind_uav])
+
+        batch_visited = set(visited_points)
+
+        def best_candidate(ind_uav):
+            """ the best candidate of the drone given the batch choices (lazy evaluation of the upper bounds) """
+            heap = heaps[ind_uav]
+            while True:
+                bound, neg_tour = heap[0]
+                quality = self.candidate_quality(self.uavs_tours[ind_uav][-neg_tour],
+                                                 residual_ntours_to_assign[ind_uav], batch_visited)
+                if len(heap) == 1 or -quality <= heap[1][0] and (len(heap) < 3 or -quality <= heap[2][0]):
+                    return quality, -neg_tour
+                heapq.heapreplace(heap, (-quality, neg_tour))
+
+        choices = []
+        while len(heaps) > 0 and len(self.reachable_points - batch_visited) > 0:
+            candidates = [best_candidate(u) + (u,) for u in heaps]  # (quality, index_tour, index_uav)
+            quality, ind_tour, ind_uav = max(candidates, key=lambda c: c[0])
+            choices.append((ind_uav, ind_tour))
+            batch_visited |= set(self.uavs_tours[ind_uav][ind_tour].targets_indexes)
+            del heaps[ind_uav]
+        return choices
+
     def greedy_stop_condition(self, visited_points : set, tour_to_assign : int) -> bool:
         """ stop condition of greedy algorithm
 
@@ -118,28 +242,97 @@ class AbstractGreedyAndPrune():
         """
         return utility.pruning_multiroundsolution(mr_solution)
 
-    def solution(self) -> MultiRoundSolution:
-        """ run the algorithm and build a multi-round solution until the stop condition is reached """
-        # multi-round solution to build
-        mrs_builder = MultiRoundSolutionBuilder(self.aoi)
-        for uav in self.uavs:
-            mrs_builder.add_drone(uav)
+    def __signature(self):
+        """ the shape of the problem (targets, rounds and tours of each drone), to validate a checkpoint """
+        return np.array([self.nnodes, self.max_rounds] + [len(self.uavs_tours[u]) for u in range(self.nuavs)])
+
+    def __save_state(self, checkpoint, name : str, choices : list, visited_points : set,
+                     residual_ntours_to_assign : dict, rng):
+        """ save the greedy state: choices so far, visited points, residual tours of each drone and random state """
+        checkpoint.save(name, signature=self.__signature(),
+                        choices=np.array(choices, dtype=np.int64).reshape(-1, 2),
+                        visited=np.array(sorted(visited_points), dtype=np.int64),
+                        residual=np.array([residual_ntours_to_assign[i] for i in range(self.nuavs)], dtype=np.int64),
+                        rng_state=np.array(json.dumps(rng.bit_generator.state) if rng is not None else ""))
+
+    def greedy_choices(self, seed = None, alpha : float = 0.0, checkpoint = None, name : str = "gap",
+                       epsilon : float = None, batch : bool = False) -> list:
+        """ run the greedy phase until the stop condition is reached
+
+        :param seed: if None the deterministic greedy choice is used, otherwise the randomized one
+                        (see randomized_choice) with this seed
+        :param alpha: the greediness of the randomized choice
+        :param checkpoint: if not None, the greedy state is saved in this checkpoint (src.util.checkpoint.Checkpoint)
+                        at its interval, and the greedy phase continues from the saved state, if any (default None)
+        :param name: the name of the greedy state in the checkpoint (default "gap")
+        :param epsilon: if not None, the stochastic greedy choice (see stochastic_choice) with this accuracy, and
+                        the seed of its sampling (default None)
+        :param batch: whether each step picks a tour for each drone with residual tours (see batch_choice) or
+                        a single tour (default False)
+        :return: the ordered list of the greedy choices (index_uav, index_tour)
+        """
+        rng = np.random.default_rng(seed) if seed is not None or epsilon is not None else None
+        sample_size = self.stochastic_sample_size(epsilon) if epsilon is not None else None
 
         # counters and set of visited points
         residual_ntours_to_assign = {i : self.max_rounds for i in range(self.nuavs)}
         tour_to_assign = self.max_rounds * self.nuavs
         visited_points = set()
+        choices = []
+
+        state = checkpoint.load(name) if checkpoint is not None else None
+        if state is not None:
+            assert np.array_equal(state["signature"], self.__signature()), "the checkpoint is of another problem"
+            choices = [tuple(c) for c in state["choices"].tolist()]
+            visited_points = set(state["visited"].tolist())
+            residual_ntours_to_assign = {i : int(r) for i, r in enumerate(state["residual"])}
+            tour_to_assign = sum(residual_ntours_to_assign.values())
+            if rng is not None:
+                rng.bit_generator.state = json.loads(str(state["rng_state"]))
+            if self.debug:
+                print("GaP: resumed from", len(choices), "choices")
 
         while not self.greedy_stop_condition(visited_points, tour_to_assign):
-            itd_uav, ind_tour = self.local_optimal_choice(visited_points, residual_ntours_to_assign)
-            residual_ntours_to_assign[itd_uav] -= 1
-            tour_to_assign -= 1
-            opt_tour = self.uavs_tours[itd_uav][ind_tour]
-            visited_points |= set(opt_tour.targets_indexes)  # update visited points
-            mrs_builder.append_tour(self.uavs[itd_uav], opt_tour)
-
+            if batch:
+                step_choices = self.batch_choice(visited_points, residual_ntours_to_assign)
+            elif rng is None:
+                step_choices = [self.local_optimal_choice(visited_points, residual_ntours_to_assign)]
+            elif sample_size is not None:
+                step_choices = [self.stochastic_choice(visited_points, residual_ntours_to_assign, rng, sample_size)]
+            else:
+                step_choices = [self.randomized_choice(visited_points, residual_ntours_to_assign, rng, alpha)]
+            for itd_uav, ind_tour in step_choices:
+                residual_ntours_to_assign[itd_uav] -= 1
+                tour_to_assign -= 1
+                opt_tour = self.uavs_tours[itd_uav][ind_tour]
+                visited_points |= set(opt_tour.targets_indexes)  # update visited points
+                choices.append((itd_uav, ind_tour))
+            if checkpoint is not None and checkpoint.due(name):
+                self.__save_state(checkpoint, name, choices, visited_points, residual_ntours_to_assign, rng)
+        if checkpoint is not None:
+            self.__save_state(checkpoint, name, choices, visited_points, residual_ntours_to_assign, rng)
+        return choices
+
+    def solution_from_choices(self, choices : list) -> MultiRoundSolution:
+        """ build and prune the multi-round solution of the greedy choices [(index_uav, index_tour), ...] """
+        # multi-round solution to build
+        mrs_builder = MultiRoundSolutionBuilder(self.aoi)
+        for uav in self.uavs:
+            mrs_builder.add_drone(uav)
+        for itd_uav, ind_tour in choices:
+            mrs_builder.append_tour(self.uavs[itd_uav], self.uavs_tours[itd_uav][ind_tour])
         return self.__pruning(mrs_builder.build())
 
+    def solution(self, seed = None, alpha : float = 0.0, epsilon : float = None, batch : bool = False) -> MultiRoundSolution:
+        """ run the algorithm and build a multi-round solution until the stop condition is reached
+
+        :param seed: if None the classic (deterministic) GaP, otherwise a randomized greedy phase with this seed
+        :param alpha: the greediness of the randomized greedy phase (see randomized_choice)
+        :param epsilon: if not None, the stochastic greedy (see stochastic_choice) with this accuracy
+        :param batch: whether pick a tour for each drone at each step (see batch_choice)
+        """
+        return self.solution_from_choices(self.greedy_choices(seed, alpha, epsilon=epsilon, batch=batch))
+
 
 # -------------------------------------------------------------------
 #
@@ -178,6 +371,13 @@ class CumulativeGreedyCoverage(AbstractGreedyAndPrune):
         new_points = (set(tour.targets_indexes) - visited_points)
         return round_count * len(new_points)
 
+    def candidate_quality(self, tour : Tour, uav_residual_rounds : int, visited_points : set):
+        return self.evaluate_tour(tour, uav_residual_rounds, visited_points)
+
+    def objective_value(self, mr_solution: MultiRoundSolution):
+        """ cumulative coverage (AC) over the max number of rounds """
+        return mr_solution.cumulative_coverage_score(self.max_rounds)
+
 # -------------------------------------------------------------------
 
 #
@@ -217,3 +417,132 @@ class TotalGreedyCoverage(AbstractGreedyAndPrune):
         new_points = (set(tour.targets_indexes) - visited_points)
         return len(new_points)
 
+
+    def candidate_quality(self, tour : Tour, uav_residual_rounds : int, visited_points : set):
+        return self.evaluate_tour(tour, visited_points)
+
+    def objective_value(self, mr_solution: MultiRoundSolution):
+        """ total coverage (TC) """
+        return mr_solution.coverage_score()
+
+
+# -------------------------------------------------------------------
+#
+# Anytime randomized GaP (GRASP) with parallel restarts
+#
+# -------------------------------------------------------------------
+
+# the GaP algorithm of a worker process, received once when the worker starts
+_worker_algorithm = None
+
+
+def _init_restart_worker(algorithm: AbstractGreedyAndPrune):
+    global _worker_algorithm
+    _worker_algorithm = algorithm
+
+
+def _restart(algorithm: AbstractGreedyAndPrune, seed, alpha: float):
+    """ run a restart: return the objective value and the greedy choices (the caller rebuilds the solution) """
+    choices = algorithm.greedy_choices(seed, alpha)
+    return algorithm.objective_value(algorithm.solution_from_choices(choices)), choices
+
+
+def _worker_restart(seed, alpha: float):
+    return _restart(_worker_algorithm, seed, alpha)
+
+
+class GreedyRandomizedAdaptiveSearch():
+    ''' Anytime GaP (GRASP): randomized restricted-candidate-list greedy restarts, run on a pool of processes
+        within a time budget. It keeps the best solution under the objective of the input algorithm
+        (TC for TC-GaP, AC for AC-GaP). The first restart is the classic deterministic GaP: it always completes, also
+        after the budget, hence the result is never worse than GaP. The restarts still running when the budget is
+        over are terminated.
+    '''
+
+    def __init__(self, algorithm: AbstractGreedyAndPrune, alpha: float = 0.2, time_budget: float = 10.0,
+                 max_restarts: int = None, n_workers: int = None, seed: int = 0, debug: bool = True):
+        """
+        :param algorithm: the GaP algorithm to restart (CumulativeGreedyCoverage or TotalGreedyCoverage)
+        :param alpha: the greediness of the restricted candidate list, 0 -> random ties among the best candidates,
+                        1 -> all the candidates (default 0.2)
+        :param time_budget: the time budget in seconds, no restart starts after it (default 10 seconds)
+        :param max_restarts: the maximum number of restarts, None for no limit (default None)
+        :param n_workers: the number of processes, 1 runs the restarts in this process (default: number of cpus)
+        :param seed: the base seed, the restart i > 0 uses the seed [seed, i] (default 0)
+        :param debug: whether print or not the improvements
+        """
+        self.algorithm = algorithm
+        self.alpha = alpha
+        self.time_budget = time_budget
+        self.max_restarts = max_restarts
+        self.n_workers = n_workers
+        self.seed = seed
+        self.debug = debug
+
+        self.best_value = None
+        self.best_restart = None
+        self.best_choices = None
+        self.history = []  # (restart, objective value, elapsed seconds) of the completed restarts
+
+    def restart_seed(self, restart: int):
+        """ the seed of a restart, None for the first (deterministic) one """
+        return None if restart == 0 else [self.seed, restart]
+
+    def __update(self, restart: int, value, choices: list, t_start: float):
+        """ keep the best restart, on ties the one with lowest index """
+        self.history.append((restart, value, time.monotonic() - t_start))
+        if self.best_value is None or value > self.best_value \
+                or (value == self.best_value and restart < self.best_restart):
+            if self.debug and self.best_value is not None and value > self.best_value:
+                print("GRASP: restart", restart, "improves the objective from", self.best_value, "to", value)
+            self.best_value, self.best_restart, self.best_choices = value, restart, choices
+
+    def __has_budget(self, restart: int, t_start: float) -> bool:
+        if restart == 0:
+            return True  # the deterministic GaP always runs
+        return time.monotonic() - t_start < self.time_budget \
+            and (self.max_restarts is None or restart < self.max_restarts)
+
+    def solution(self) -> MultiRoundSolution:
+        """ run the restarts within the time budget and return the best multi-round solution """
+        t_start = time.monotonic()
+        restart = 0
+        if self.n_workers == 1:
+            while self.__has_budget(restart, t_start):
+                value, choices = _restart(self.algorithm, self.restart_seed(restart), self.alpha)
+                self.__update(restart, value, choices, t_start)
+                restart += 1
+        else:
+            n_workers = self.n_workers if self.n_workers is not None else os.cpu_count()
+            results = queue.Queue()  # (restart, outcome) of the completed restarts
+            pool = multiprocessing.Pool(n_workers, initializer=_init_restart_worker, initargs=(self.algorithm,))
+            running = set()  # the restarts submitted and not yet completed
+            try:
+                while True:
+                    while len(running) < 2 * n_workers and self.__has_budget(restart, t_start):
+                        on_result = functools.partial(lambda r, outcome: results.put((r, outcome)), restart)
+                        pool.apply_async(_worker_restart, (self.restart_seed(restart), self.alpha),
+                                         callback=on_result, error_callback=on_result)
+                        running.add(restart)
+                        restart += 1
+                    if not running:
+                        break
+                    # the deterministic GaP (restart 0) is waited in any case, the others only within the budget
+                    remaining = self.time_budget - (time.monotonic() - t_start)
+                    try:
+                        completed, outcome = results.get(timeout=None if 0 in running else max(0.0, remaining))
+                    except queue.Empty:
+                        break  # out of budget: the running restarts are terminated
+                    running.discard(completed)
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                    value, choices = outcome
+                    self.__update(completed, value, choices, t_start)
+            finally:
+                pool.terminate()  # no restart keeps running after the budget
+                pool.join()
+
+        if self.debug:
+            print("GRASP: best objective", self.best_value, "at restart", self.best_restart,
+                  "over", len(self.history), "restarts")
+        return self.algorithm.solution_from_choices(self.best_choices)
@@ -0,0 +1,153 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains the coarsening of very large surveys: the nearby targets are clustered into super-nodes,
+the planning runs on the coarse AoI (one node per cluster) with the existing algorithms, and every selected tour
+is expanded back into a tour of the targets.
+
+The clusters come from a hierarchical (divisive) clustering: a cluster is recursively bisected, at the median of its
+widest axis, until its radius and its size are small enough. Each cluster has a fixed inspection path (nearest
+neighbour order of its targets). The hovering time of a super-node is conservative: the inspection path, plus the
+detour to enter and exit the cluster (2 x radius), at the reference speed, plus the hovering time of its targets.
+Hence, by triangle inequality, the expanded tour of a feasible coarse tour is feasible for any drone at least as
+fast as the reference speed.
+
+The runtime and memory of the planning scale with the number of clusters: the graph of the target-level AoI is never
+built (see AoI.graph).
+"""
+
+from src.entities.trajenties import AoI, Tour, MultiRoundSolution, MultiRoundSolutionBuilder
+from src.algorithms.trajbuilder import DroneTrajGeneration
+from src.algorithms.dispatch import solve
+
+import numpy as np
+
+
+class TargetCoarsening():
+    ''' Cluster the targets of an AoI into super-nodes, to plan on a coarse AoI and expand the solution back '''
+
+    def __init__(self, aoi: AoI, reference_speed: float, max_radius: float, max_size: int = 50):
+        """
+        :param aoi: the input (large) area of interest, it must have all the paths viable (no viable_paths)
+        :param reference_speed: the speed (m/s) used to convert the paths inside the clusters in hovering time:
+                                 the expanded tours are feasible for the drones with speed >= reference_speed
+        :param max_radius: the max distance (meters) of the targets of a cluster from its centroid
+        :param max_size: the max number of targets of a cluster (default 50)
+        """
+        assert aoi.viable_paths is None, "the coarsening requires all the paths between targets to be viable"
+        self.aoi = aoi
+        self.reference_speed = reference_speed
+        self.max_radius = max_radius
+        self.max_size = max_size
+
+        self.coords = aoi.coordinates()
+        self.hovering = aoi.hovering_times()
+        # the targets of each cluster, in the order of its inspection path
+        self.clusters = [self.__inspection_path(cluster) for cluster in self.__clustering()]
+        self.coarse_aoi = self.__coarse_aoi()
+        self.coarse_coords = self.coarse_aoi.coordinates()
+
+    def __clustering(self) -> list:
+        """ recursive bisection of the targets: return the list of the clusters (arrays of target indexes) """
+        clusters = []
+        stack = [np.arange(self.aoi.n_targets)]
+        while len(stack) > 0:
+            cluster = stack.pop()
+            points = self.coords[cluster]
+            radius = np.sqrt(((points - points.mean(axis=0)) ** 2).sum(axis=1)).max() if len(cluster) > 0 else 0
+            if len(cluster) <= 1 or (len(cluster) <= self.max_size and radius <= self.max_radius):
+                if len(cluster) > 0:
+                    clusters.append(cluster)
+                continue
+            axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+            order = np.argsort(points[:, axis], kind="stable")
+            half = len(cluster) // 2
+            stack.append(cluster[order[half:]])
+            stack.append(cluster[order[:half]])
+        return clusters
+
+    def __inspection_path(self, cluster):
+        """ the nearest neighbour open path of the targets of a cluster, from the farthest one from the centroid """
+        points = self.coords[cluster]
+        distances = np.sqrt(((points[:, np.newaxis, :] - points[np.newaxis, :, :]) ** 2).sum(axis=2))
+        current = int(np.argmax(((points - points.mean(axis=0)) ** 2).sum(axis=1)))
+        visited = np.zeros(len(cluster), dtype=bool)
+        path = [current]
+        visited[current] = True
+        for i in range(len(cluster) - 1):
+            current = int(np.argmin(np.where(visited, np.inf, distances[current])))
+            visited[current] = True
+            path.append(current)
+        return cluster[path]
+
+    def __coarse_aoi(self) -> AoI:
+        """ the AoI with a super-node (the centroid) for each cluster and the same depots """
+        centroids, hovering = [], []
+        for cluster in self.clusters:
+            points = self.coords[cluster]
+            centroid = points.mean(axis=0)
+            radius = np.sqrt(((points - centroid) ** 2).sum(axis=1)).max()
+            path_len = np.sqrt(((points[1:] - points[:-1]) ** 2).sum(axis=1)).sum()
+            centroids.append((float(centroid[0]), float(centroid[1])))
+            hovering.append((path_len + 2 * radius) / self.reference_speed + self.hovering[cluster].sum())
+        return AoI(list(self.aoi.depots), centroids, self.aoi.width, self.aoi.height,
+                   targets_hovering_times=hovering)
+
+    # -------------------------------------------------------------------
+    # expansion
+    # -------------------------------------------------------------------
+
+    def expand_nodes(self, coarse_nodes: list) -> list:
+        """ expand the ordered nodes of a coarse tour [depot, cluster1, cluster2, ...] (coarse graph indexes) into the
+            ordered nodes of the target-level tour [depot, target1, target2, ...] (graph indexes of the input AoI).
+            Each cluster is inspected along its path, in the direction with the shortest entry and exit.
+        """
+        depot = coarse_nodes[0] - self.coarse_aoi.n_targets + self.aoi.n_targets
+        nodes = [depot]
+        for k, cluster_index in enumerate(coarse_nodes[1:], start=1):
+            path = self.clusters[cluster_index]
+            next_coords = self.coarse_coords[coarse_nodes[(k + 1) % len(coarse_nodes)]]
+            previous = self.coords[nodes[-1]]
+            forward = np.linalg.norm(previous - self.coords[path[0]]) + np.linalg.norm(self.coords[path[-1]] - next_coords)
+            backward = np.linalg.norm(previous - self.coords[path[-1]]) + np.linalg.norm(self.coords[path[0]] - next_coords)
+            nodes.extend((path if forward <= backward else path[::-1]).tolist())
+        return nodes
+
+    def expand_tour(self, coarse_tour: Tour) -> Tour:
+        """ expand a tour of the coarse AoI into a tour of the input AoI (an empty tour stays empty) """
+        if len(coarse_tour.edges_w_indexes) == 0:
+            return Tour(self.aoi, [])
+        return Tour.from_ordered_nodes(self.aoi, self.expand_nodes([coarse_tour.depot_index] + coarse_tour.targets_indexes))
+
+    def expand_solution(self, coarse_mrs: MultiRoundSolution) -> MultiRoundSolution:
+        """ expand a multi-round solution of the coarse AoI into a multi-round solution of the input AoI """
+        builder = MultiRoundSolutionBuilder(self.aoi)
+        for drone, tours in coarse_mrs.drone_and_tours.items():
+            builder.add_drone_with_tours(drone, [self.expand_tour(tour) for tour in tours])
+        return builder.build()
+
+    def solve(self, drones_depots: dict, max_rounds: int, algorithm: str = "AC-GaP") -> MultiRoundSolution:
+        """ plan on the coarse AoI (trajectories generation and assignment) and expand the solution
+
+        :param drones_depots: a dictionary {drone : depot coordinates}, the drones must be at least as fast as the
+                                reference speed
+        :param max_rounds: the maximum number of rounds
+        :param algorithm: one among "TC-GaP", "AC-GaP", "TC-OPT", "AC-OPT"
+        """
+        assert all(drone.speed >= self.reference_speed for drone in drones_depots), \
+            "the drones must be at least as fast as the reference speed of the coarsening"
+        trajectories_builder = DroneTrajGeneration(self.coarse_aoi)
+        pools = {}  # the drones with same depot, autonomy and speed share the candidate tours
+        uavs_tours = {}
+        for drone, depot in drones_depots.items():
+            key = (depot, drone.autonomy, drone.speed)
+            if key not in pools:
+                pools[key] = trajectories_builder.compute_trajectories(drone, depot)
+            uavs_tours[drone] = pools[key]
+        return self.expand_solution(solve(algorithm, self.coarse_aoi, uavs_tours, max_rounds))
@@ -0,0 +1,252 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains a spatial decomposition planner for large AoIs with many depots.
+
+    1. the targets are partitioned among the depots (of the drones): Voronoi regions (nearest depot that can reach
+       the target) or a load-balanced split, proportional to the capacity of the drones of each depot;
+    2. a sub-AoI is built for each partition (its depot and its targets);
+    3. the trajectories generation (Alg. 2) and the assignment (TC-GaP, AC-GaP, TC-OPT or AC-OPT) run for each
+       partition, in parallel on a pool of processes;
+    4. the solutions of the partitions are merged into a single MultiRoundSolution;
+    5. boundary repair: a target not covered (or, for AC, covered late) by its partition is inserted, at the cheapest
+       feasible position, in a tour of an earlier round of any drone (also across the partition border);
+       the redundant visits are then pruned.
+"""
+
+from src.entities.trajenties import AoI, Drone, Tour, MultiRoundSolution, MultiRoundSolutionBuilder
+from src.algorithms.trajbuilder import DroneTrajGeneration
+from src.algorithms.dispatch import solve
+from src.util import utility
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def _plan_partition(depot: tuple, targets: list, width: int, height: int, hovering_times: list,
+                    viable_paths: list, drones: list, algorithm: str, max_rounds: int) -> list:
+    """ Internal use - build the sub-AoI of a partition, its trajectories and its assignment.
+        The sub-AoI is built in the worker: only coordinates are sent to the process.
+
+    :return: the assignment as a list [(drone id, [[depot, target1, ...] of each round, ...]), ...] in sub-AoI indexes
+    """
+    sub_aoi = AoI([depot], targets, width, height, viable_paths=viable_paths, targets_hovering_times=hovering_times)
+    trajectories_builder = DroneTrajGeneration(sub_aoi)
+    trajectories_builder.compute_backbones({drone: depot for drone in drones})  # a single TSP for the partition
+    uavs_tours = {}
+    for drone in drones:
+        try:
+            uavs_tours[drone] = trajectories_builder.compute_trajectories(drone, depot)
+        except AssertionError:  # the drone cannot reach any target of the partition
+            continue
+    if len(uavs_tours) == 0:
+        return []
+    mrs = solve(algorithm, sub_aoi, uavs_tours, max_rounds)
+    return [(a["drone"], a["tours"]) for a in mrs.to_dict()["assignment"]]
+
+
+class DecompositionPlanner():
+    ''' Plan a large AoI as independent per-depot subproblems, solved in parallel, merged and repaired '''
+
+    def __init__(self, aoi: AoI, drones_depots: dict, max_rounds: int, algorithm: str = "AC-GaP",
+                 partition: str = "voronoi", n_workers: int = None, repair: bool = True, debug: bool = True):
+        """
+        :param aoi: the input area of interest with targets and depots
+        :param drones_depots: a dictionary {drone : depot coordinates} with the depot of each drone
+        :param max_rounds: the maximum number of rounds
+        :param algorithm: the algorithm of each partition, one among "TC-GaP", "AC-GaP", "TC-OPT", "AC-OPT"
+        :param partition: "voronoi" (nearest depot) or "balanced" (split proportional to the capacity of the depots)
+        :param n_workers: the number of processes, 1 solves the partitions in this process (default: number of cpus)
+        :param repair: whether run the boundary repair or not (default True)
+        :param debug: whether print or not the partitions and the repair outcome
+        """
+        assert partition in ("voronoi", "balanced"), "the partition must be voronoi or balanced"
+        self.aoi = aoi
+        self.drones_depots = drones_depots
+        self.max_rounds = max_rounds
+        self.algorithm = algorithm
+        self.partition = partition
+        self.n_workers = n_workers
+        self.repair = repair
+        self.debug = debug
+
+        self.drones = list(drones_depots.keys())
+        # the depots (graph indexes) with at least a drone, and their drones
+        self.depots = sorted({aoi.node_index(coords) for coords in drones_depots.values()})
+        self.depot_drones = {depot: [drone for drone in self.drones
+                                     if aoi.node_index(drones_depots[drone]) == depot] for depot in self.depots}
+        # the shortest viable paths from the depots (rows of the metric closure, the whole matrix is not built)
+        self.depot_distances = dict(zip(self.depots, aoi.closure_rows(self.depots)))
+        self.hovering = aoi.hovering_times()
+
+    # -------------------------------------------------------------------
+    # partition
+    # -------------------------------------------------------------------
+
+    def __reachable(self):
+        """ a boolean matrix (targets x depots): whether some drone of the depot can visit the target and come back """
+        reachable = np.zeros((self.aoi.n_targets, len(self.depots)), dtype=bool)
+        for j, depot in enumerate(self.depots):
+            for drone in self.depot_drones[depot]:
+                reachable[:, j] |= (self.hovering[:self.aoi.n_targets]
+                                    + 2 * self.depot_distances[depot][:self.aoi.n_targets] / drone.speed) <= drone.autonomy
+        return reachable
+
+    def partitions(self) -> dict:
+        """ partition the targets among the depots of the drones
+
+        :return: a dictionary {depot index : [target indexes]}
+        """
+        distances = np.column_stack([self.depot_distances[depot][:self.aoi.n_targets] for depot in self.depots])
+        reachable = self.__reachable()
+        # the unreachable depots are the last choice
+        costs = np.where(reachable, distances, distances + np.max(distances[np.isfinite(distances)], initial=0) + 1)
+
+        if self.partition == "voronoi":
+            owner = costs.argmin(axis=1)
+        else:
+            # capacity of a depot: the meters its drones can fly in the rounds, the quota of targets is proportional
+            capacity = np.array([sum(drone.autonomy * drone.speed for drone in self.depot_drones[depot])
+                                 for depot in self.depots], dtype=float)
+            quota = np.ceil(self.aoi.n_targets * capacity / capacity.sum()).astype(int)
+            # the targets with the highest regret (second choice much worse than the first) are assigned first
+            sorted_costs = np.sort(costs, axis=1)
+            regret = sorted_costs[:, 1] - sorted_costs[:, 0] if len(self.depots) > 1 else np.zeros(self.aoi.n_targets)
+            owner = np.zeros(self.aoi.n_targets, dtype=int)
+            for target in np.argsort(-regret, kind="stable"):
+                for j in np.argsort(costs[target], kind="stable"):
+                    if quota[j] > 0:
+                        break
+                owner[target] = j
+                quota[j] -= 1
+
+        partitions = {depot: np.flatnonzero(owner == j).tolist() for j, depot in enumerate(self.depots)}
+        if self.debug:
+            print("DecompositionPlanner: targets per depot", {depot: len(t) for depot, t in partitions.items()})
+        return partitions
+
+    # -------------------------------------------------------------------
+    # solve and merge
+    # -------------------------------------------------------------------
+
+    def __sub_viable_paths(self, nodes: set):
+        """ the viable paths among the input nodes (None if all the paths are viable) """
+        if self.aoi.viable_paths is None:
+            return None
+        coords = {self.aoi.node_coords(node) for node in nodes}
+        return [path for path in self.aoi.viable_paths if path[0] in coords and path[1] in coords]
+
+    def __solve_partitions(self, partitions: dict) -> dict:
+        """ solve the partitions (in parallel) and return {drone id : [[depot, target1, ...] of each round]} in
+            graph indexes of the whole AoI
+        """
+        jobs, nodes = [], []
+        for depot, targets in partitions.items():
+            if len(targets) == 0:
+                continue
+            nodes.append(targets + [depot])  # sub-AoI index -> AoI index
+            jobs.append((self.aoi.node_coords(depot), [self.aoi.node_coords(t) for t in targets], self.aoi.width,
+                         self.aoi.height, self.hovering[targets].tolist(), self.__sub_viable_paths(set(nodes[-1])),
+                         self.depot_drones[depot], self.algorithm, self.max_rounds))
+
+        if self.n_workers == 1:
+            results = [_plan_partition(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+                results = list(executor.map(_plan_partition, *zip(*jobs))) if len(jobs) > 0 else []
+
+        routes = {}
+        for sub_nodes, assignment in zip(nodes, results):
+            for drone_id, tours in assignment:
+                routes[drone_id] = [[sub_nodes[i] for i in tour] for tour in tours]
+        return routes
+
+    # -------------------------------------------------------------------
+    # boundary repair
+    # -------------------------------------------------------------------
+
+    def __repair(self, routes: dict):
+        """ insert the uncovered (or, for AC, late) targets in a tour of an earlier round, at the cheapest feasible
+            position. The routes {drone id : [[depot, target1, ...], ...]} are updated in place.
+
+        :return: the number of inserted targets
+        """
+        n_targets, R = self.aoi.n_targets, self.max_rounds
+        for drone in self.drones:  # all the rounds are available, an unused round is an empty route
+            drone_routes = routes.setdefault(drone.id, [])
+            depot = self.aoi.node_index(self.drones_depots[drone])
+            for r in range(R):
+                if r >= len(drone_routes):
+                    drone_routes.append([])
+                if len(drone_routes[r]) == 0:
+                    drone_routes[r] = [depot]
+
+        def route_time(route, drone):
+            nodes = np.array(route)
+            return (self.aoi.path_lengths(nodes, np.roll(nodes, -1)).sum() / drone.speed) + self.hovering[nodes].sum()
+
+        times = {drone.id: [route_time(route, drone) for route in routes[drone.id]] for drone in self.drones}
+        first_round = np.full(n_targets, R)
+        for drone in self.drones:
+            for r, route in enumerate(routes[drone.id]):
+                first_round[route[1:]] = np.minimum(first_round[route[1:]], r)
+
+        only_uncovered = self.algorithm.startswith("TC")
+        inserted = 0
+        for target in np.argsort(-first_round, kind="stable"):
+            fr = first_round[target]
+            if fr == 0 or (only_uncovered and fr < R):
+                continue
+            best = None  # (round, added time, drone, position)
+            for drone in self.drones:
+                depot = self.aoi.node_index(self.drones_depots[drone])
+                if self.hovering[target] + 2 * self.depot_distances[depot][target] / drone.speed > drone.autonomy:
+                    continue
+                for r in range(fr if best is None else min(fr, best[0] + 1)):
+                    nodes = np.array(routes[drone.id][r])
+                    nexts = np.roll(nodes, -1)
+                    delta = (self.aoi.path_lengths(nodes, target) + self.aoi.path_lengths(target, nexts)
+                             - self.aoi.path_lengths(nodes, nexts)) / drone.speed + self.hovering[target]
+                    pos = int(np.argmin(delta))
+                    if times[drone.id][r] + delta[pos] < drone.autonomy \
+                            and (best is None or (r, delta[pos]) < (best[0], best[1])):
+                        best = (r, delta[pos], drone, pos)
+            if best is None:
+                continue
+            r, added, drone, pos = best
+            routes[drone.id][r].insert(pos + 1, int(target))
+            times[drone.id][r] += added
+            first_round[target] = r
+            inserted += 1
+            # the later visits are removed (shorter routes, still feasible)
+            for other in self.drones:
+                for r2 in range(r + 1, R):
+                    route = routes[other.id][r2]
+                    if target in route[1:]:
+                        route.remove(target)
+                        times[other.id][r2] = route_time(route, other)
+        return inserted
+
+    def solution(self) -> MultiRoundSolution:
+        """ partition, solve the partitions in parallel, merge and repair: return the multi-round solution """
+        routes = self.__solve_partitions(self.partitions())
+        if self.repair:
+            inserted = self.__repair(routes)
+            if self.debug:
+                print("DecompositionPlanner: boundary repair inserted", inserted, "targets")
+
+        builder = MultiRoundSolutionBuilder(self.aoi)
+        for drone in self.drones:
+            tours = [Tour.from_ordered_nodes(self.aoi, route) if len(route) > 1 else Tour(self.aoi, [])
+                     for route in routes.get(drone.id, [])]
+            while len(tours) > 0 and len(tours[-1].edges_w_indexes) == 0:
+                tours.pop()
+            builder.add_drone_with_tours(drone, tours)
+        return utility.pruning_multiroundsolution(builder.build())
@@ -0,0 +1,57 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains the dispatch of the assignment algorithms by name (e.g., "AC-GaP", "TC-OPT"), shared by the
+planners (decomposition, coarsening) and the runners (sweep, planning service).
+gurobi is imported only by the OPT and CG algorithms.
+"""
+
+from src.algorithms.approxalg import CumulativeGreedyCoverage, TotalGreedyCoverage
+
+
+def solve(algorithm: str, aoi, uavs_tours: dict, max_rounds: int):
+    """
+    run the input algorithm and return its multi round solution.
+
+    :param algorithm: one among "TC-GaP", "AC-GaP", "TC-OPT", "AC-OPT", "TC-EXACT", "AC-EXACT", "TC-CG", "AC-CG"
+                        (EXACT: the optimum without gurobi, for small instances up to
+                        ExactCoverageSolver.MAX_TARGETS targets; CG: OPT by column generation, the
+                        input tours are the seed pool, e.g., a few maximal tours of each drone)
+    :param aoi: the input area of interest
+    :param uavs_tours: a dictionary {drone : [tour1, tour2, ...]}
+    :param max_rounds: the maximum number of rounds
+    :return: the multi round solution : trajenties.MultiRoundSolution
+    """
+    if algorithm == "TC-GaP":
+        return TotalGreedyCoverage(aoi, uavs_tours, max_rounds, debug=False).solution()
+    elif algorithm == "AC-GaP":
+        return CumulativeGreedyCoverage(aoi, uavs_tours, max_rounds, debug=False).solution()
+    elif algorithm in ("TC-OPT", "AC-OPT"):
+        # gurobi is required only by the optimal models
+        from src.algorithms.optimal import CumulativeCoverageModel, TotalCoverageModel
+        model_class = TotalCoverageModel if algorithm == "TC-OPT" else CumulativeCoverageModel
+        model = model_class(aoi, uavs_tours, max_rounds, debug=False)
+        model.build()
+        model.optimize()
+        if getattr(model, "solution", None) is None:
+            raise RuntimeError("optimal solution not found")
+        return model.solution
+    elif algorithm in ("TC-CG", "AC-CG"):
+        from src.algorithms.optimal import ColumnGenerationCoverage
+        mrs = ColumnGenerationCoverage(aoi, uavs_tours, max_rounds, objective=algorithm[:2], debug=False).solve()
+        if mrs is None:
+            raise RuntimeError("optimal solution not found")
+        return mrs
+    elif algorithm in ("TC-EXACT", "AC-EXACT"):
+        from src.algorithms.exact import ExactCoverageSolver
+        assert aoi.n_targets <= ExactCoverageSolver.MAX_TARGETS, \
+            "{} is exponential in the targets: at most {} targets".format(algorithm, ExactCoverageSolver.MAX_TARGETS)
+        return ExactCoverageSolver(aoi, uavs_tours, max_rounds, objective=algorithm[:2], debug=False).solution()
+    else:
+        raise ValueError("Unknown algorithm: {}".format(algorithm))
@@ -0,0 +1,193 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains an exact solver of TC-OPT and AC-OPT for small instances (e.g., less than 25 targets, a few drones
+and rounds), without external solvers (no gurobi).
+
+It solves the same model of src.algorithms.optimal: at each round each drone flies at most one of its tours, the tours
+of the same round are disjoint (a target is inspected by at most one tour per round), and the objective is the number
+of covered targets (TC) or the sum over the rounds of the covered targets (AC).
+
+The coverage state is a bitmask of the covered targets. The search is a depth-first branch and bound on the rounds:
+    - the choices of a round are enumerated drone by drone as unions of disjoint tour masks; the unions with the same
+      new coverage keep only the minimal ones (they block less tours), the tours without new targets are skipped;
+    - the successor states of a round covered by another successor are dominated and skipped;
+    - a state is pruned if a superset state, at the same round, was already explored with a higher or equal value;
+    - the upper bound of a state assumes, for each remaining round, the best new coverage of each drone.
+"""
+
+from src.entities.trajenties import AoI, Tour, MultiRoundSolutionBuilder, MultiRoundSolution
+
+import time
+
+
+def popcount(mask: int) -> int:
+    """ the number of bits set in the mask """
+    return bin(mask).count("1")
+
+
+class ExactCoverageSolver():
+    ''' Exact branch and bound, on bitmask coverage states, of TC-OPT and AC-OPT for small instances '''
+
+    # the max number of targets of a tractable instance (the search is exponential in the number of targets)
+    MAX_TARGETS = 25
+
+    def __init__(self, aoi: AoI, uavs_tours: dict, max_rounds: int, objective: str = "AC", debug: bool = True):
+        """
+        :param aoi: the input area of interest with targets and depots
+        :param uavs_tours: a dictionary that maps available drones to their available tours (see AbstractCoverageModel)
+        :param max_rounds: the maximum number of rounds to perform (max number of multi trips)
+        :param objective: "TC" (total coverage, as TotalCoverageModel) or "AC" (cumulative, as CumulativeCoverageModel)
+        :param debug: whether print or not the outcome of the search
+        """
+        assert objective in ("TC", "AC"), "the objective must be TC or AC"
+        self.aoi = aoi
+        self.max_rounds = max_rounds
+        self.objective = objective
+        self.debug = debug
+        self.uavs = list(uavs_tours.keys())
+        self.uavs_tours = uavs_tours
+
+        # the distinct tour masks of each drone (a tour for each mask) and their bits
+        self.tour_masks = []
+        self.mask_tour = []
+        for drone in self.uavs:
+            masks = {}
+            for tour in uavs_tours[drone]:
+                mask = sum(1 << int(i) for i in set(tour.targets_indexes))
+                if mask != 0:
+                    masks.setdefault(mask, tour)
+            self.tour_masks.append(list(masks.keys()))
+            self.mask_tour.append(masks)
+        self.reachable = 0
+        for masks in self.tour_masks:
+            for mask in masks:
+                self.reachable |= mask
+        self.n_reachable = popcount(self.reachable)
+
+        self.best_value = None
+        self.best_plan = None  # the tour mask of each drone in each round (0 for no tour)
+        self.nodes = 0  # the explored states
+        self.__explored = None
+
+    # -------------------------------------------------------------------
+    # search
+    # -------------------------------------------------------------------
+
+    def __round_choices(self, covered: int) -> dict:
+        """ the successor states of a round: {new covered mask : the tour mask of each drone (0 for no tour)} """
+        # partial choices, drone by drone: {union of the chosen (disjoint) tours : the tour mask of each drone}
+        partial = {0: ()}
+        for d, masks in enumerate(self.tour_masks):
+            useful = self.__minimal_unions(dict.fromkeys(mask for mask in masks if mask & ~covered), covered)
+            extended = {}
+            for union, plan in partial.items():
+                extended.setdefault(union, plan + (0,))  # the drone flies no tour
+                for mask in useful:
+                    if union & mask == 0:
+                        extended.setdefault(union | mask, plan + (mask,))
+            # the minimal unions matter only for the next drones
+            partial = self.__minimal_unions(extended, covered) if d < len(self.tour_masks) - 1 else extended
+        successors = {}
+        for union, plan in partial.items():
+            successors.setdefault(covered | union, plan)
+        return successors
+
+    def __minimal_unions(self, unions: dict, covered: int) -> dict:
+        """ among the unions with the same new coverage keep only the minimal ones: the others use more already
+            covered targets, blocking more tours of the other drones without benefits """
+        same_coverage = {}
+        for union in unions:
+            same_coverage.setdefault(union | covered, []).append(union)
+        minimal = {}
+        for group in same_coverage.values():
+            if len(group) > 1:
+                group = self.__minimal(group)
+            for union in group:
+                minimal[union] = unions[union]
+        return minimal
+
+    @staticmethod
+    def __minimal(masks: list) -> list:
+        """ the masks not including another one, from the smallest """
+        minimal = []
+        for mask in sorted(masks, key=popcount):
+            if not any(other & ~mask == 0 for other in minimal):
+                minimal.append(mask)
+        return minimal
+
+    @staticmethod
+    def __maximal(masks: list) -> list:
+        """ the masks not included in another one, from the largest """
+        maximal = []
+        for mask in sorted(masks, key=popcount, reverse=True):
+            if not any(mask & ~other == 0 for other in maximal):
+                maximal.append(mask)
+        return maximal
+
+    def __upper_bound(self, round: int, covered: int) -> int:
+        """ an upper bound of the objective of the remaining rounds: in each round each drone covers its best
+            number of new targets """
+        n_covered = popcount(covered)
+        uncovered = self.n_reachable - n_covered
+        gain = sum(max([popcount(mask & ~covered) for mask in masks], default=0) for masks in self.tour_masks)
+        remaining = self.max_rounds - round
+        if self.objective == "TC":
+            return n_covered + min(remaining * gain, uncovered)
+        return sum(n_covered + min(j * gain, uncovered) for j in range(1, remaining + 1))
+
+    def __search(self, round: int, covered: int, value: int, plan: list):
+        """ depth-first branch and bound from the state (round, covered), with the objective value so far """
+        self.nodes += 1
+        if round == self.max_rounds or covered == self.reachable:  # no more new targets
+            n_covered = popcount(covered)
+            total = n_covered if self.objective == "TC" else value + n_covered * (self.max_rounds - round)
+            if self.best_value is None or total > self.best_value:
+                self.best_value, self.best_plan = total, list(plan)
+            return
+        if self.best_value is not None and value + self.__upper_bound(round, covered) <= self.best_value:
+            return
+        # dominance: a superset state at the same round with higher or equal value was already explored
+        explored = self.__explored[round]
+        if any(covered & ~other == 0 and other_value >= value for other, other_value in explored):
+            return
+        explored.append((covered, value))
+
+        successors = self.__round_choices(covered)
+        # a successor covered by another successor is dominated
+        for coverage in self.__maximal(list(successors.keys())):
+            self.__search(round + 1, coverage, value + (popcount(coverage) if self.objective == "AC" else 0),
+                          plan + [successors[coverage]])
+
+    def solve(self):
+        """ run the search
+
+        :return: the optimal objective value (as the objVal of TotalCoverageModel / CumulativeCoverageModel)
+        """
+        t_start = time.perf_counter()
+        self.best_value, self.best_plan, self.nodes = None, None, 0
+        self.__explored = [[] for round in range(self.max_rounds)]
+        self.__search(0, 0, 0, [])
+        if self.debug:
+            print("Exact", self.objective, "objective", self.best_value, "explored states", self.nodes,
+                  "time {:.4f} s".format(time.perf_counter() - t_start))
+        return self.best_value
+
+    def solution(self) -> MultiRoundSolution:
+        """ solve and return the optimal multi-round solution: as the gurobi models, each drone has a tour for each
+            round, an empty tour if the round is not used """
+        if self.best_plan is None:
+            self.solve()
+        builder = MultiRoundSolutionBuilder(self.aoi)
+        for d, drone in enumerate(self.uavs):
+            builder.add_drone(drone)
+            for round in range(self.max_rounds):
+                mask = self.best_plan[round][d] if round < len(self.best_plan) else 0
+                builder.append_tour(drone, self.mask_tour[d][mask] if mask != 0 else Tour(self.aoi, []))
+        return builder.build()
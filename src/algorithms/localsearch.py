@@ -0,0 +1,175 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains a local-search improvement phase of a multi-round solution, e.g., after TC-GaP or AC-GaP.
+
+Moves:
+    swap: exchange two rounds of the same drone;
+    replace: replace a tour of a drone with another of its candidate tours;
+    round reorder: exchange two whole rounds (all the drones), to move earlier the rounds with many new targets (AC).
+The search keeps, for each target and round, the number of tours that cover the target in the round: a move only
+updates the counts of the targets of the moved tours, and the objective delta is computed on these targets only
+(no rebuild of the solution).
+"""
+
+from src.entities.trajenties import Tour, MultiRoundSolution, MultiRoundSolutionBuilder
+from src.util import utility
+
+import numpy as np
+import time
+
+
+class LocalSearch():
+    ''' First-improvement local search over a multi-round solution, with swap, replace and round reorder moves '''
+
+    def __init__(self, mrs: MultiRoundSolution, uavs_tours: dict = None, max_rounds: int = None,
+                 objective: str = "AC", time_budget: float = None, debug: bool = True):
+        """
+        :param mrs: the multi-round solution to improve
+        :param uavs_tours: the candidate tours of the drones {drone : [tour1, tour2, ...]}, used by the replace move.
+                            If None, only the swap and round reorder moves are used
+        :param max_rounds: the max number of rounds (the horizon of the objective), default the rounds of mrs
+        :param objective: "TC" (total coverage) or "AC" (cumulative coverage)
+        :param time_budget: the max seconds of search, None for no limit (until a local optimum)
+        :param debug: whether print or not the improvements
+        """
+        assert objective in ("TC", "AC"), "the objective must be TC or AC"
+        self.aoi = mrs.aoi
+        self.objective = objective
+        self.time_budget = time_budget
+        self.debug = debug
+        self.nrounds = max(mrs.max_rounds, max_rounds if max_rounds is not None else 0)
+
+        self.drones = list(mrs.drone_and_tours.keys())
+        self.empty_tour = Tour(self.aoi, [])
+        uavs_tours = uavs_tours if uavs_tours is not None else {}
+        self.candidates = [uavs_tours.get(drone, []) for drone in self.drones]
+
+        # the tours of each drone, one for each round (empty tour if the round is not used)
+        self.slots = [list(mrs.drone_and_tours[drone]) + [self.empty_tour] * (self.nrounds - len(mrs.drone_and_tours[drone]))
+                      for drone in self.drones]
+
+        # coverage counts (target x round) and first round of coverage of each target (nrounds if never)
+        self.counts = np.zeros((self.aoi.n_targets, self.nrounds), dtype=int)
+        for tours in self.slots:
+            for round, tour in enumerate(tours):
+                np.add.at(self.counts[:, round], tour.targets_array(), 1)  # the repeated targets of a tour at each visit
+        self.first_round = self.__first_round(self.counts)
+        self.value = int(self.__values(self.first_round).sum())
+        self.moves = {"swap": 0, "replace": 0, "reorder": 0}
+
+    def __first_round(self, counts):
+        covered = counts > 0
+        return np.where(covered.any(axis=1), covered.argmax(axis=1), self.nrounds)
+
+    def __values(self, first_round):
+        """ the contribution of the targets to the objective, given their first round """
+        if self.objective == "TC":
+            return (first_round < self.nrounds).astype(int)
+        return self.nrounds - first_round
+
+    def __apply(self, changes: list):
+        """ apply to the counts a list of changes (tour, round, +1 to add or -1 to remove the tour) """
+        for tour, round, sign in changes:
+            np.add.at(self.counts[:, round], tour.targets_array(), sign)
+
+    def __try(self, changes: list) -> bool:
+        """ apply the changes if they improve the objective, evaluated only on the affected targets """
+        self.__apply(changes)
+        affected = np.unique(np.concatenate([tour.targets_array() for tour, _, _ in changes]))
+        new_first_round = self.__first_round(self.counts[affected])
+        delta = int(self.__values(new_first_round).sum() - self.__values(self.first_round[affected]).sum())
+        if delta > 0:
+            self.first_round[affected] = new_first_round
+            self.value += delta
+            return True
+        self.__apply([(tour, round, -sign) for tour, round, sign in changes])  # revert
+        return False
+
+    def __swap(self, idrone: int, r1: int, r2: int) -> bool:
+        """ exchange the rounds r1 and r2 of a drone """
+        t1, t2 = self.slots[idrone][r1], self.slots[idrone][r2]
+        if t1 is t2 or self.objective == "TC":  # the TC does not depend on the round
+            return False
+        if self.__try([(t1, r1, -1), (t2, r2, -1), (t1, r2, 1), (t2, r1, 1)]):
+            self.slots[idrone][r1], self.slots[idrone][r2] = t2, t1
+            self.moves["swap"] += 1
+            return True
+        return False
+
+    def __replace(self, idrone: int, round: int, tour: Tour) -> bool:
+        """ replace the tour of a drone in a round """
+        old_tour = self.slots[idrone][round]
+        if tour is old_tour:
+            return False
+        if self.__try([(old_tour, round, -1), (tour, round, 1)]):
+            self.slots[idrone][round] = tour
+            self.moves["replace"] += 1
+            return True
+        return False
+
+    def __reorder(self, r1: int, r2: int) -> bool:
+        """ exchange the rounds r1 and r2 of all the drones """
+        if self.objective == "TC":
+            return False
+        changes = []
+        for tours in self.slots:
+            changes += [(tours[r1], r1, -1), (tours[r2], r2, -1), (tours[r1], r2, 1), (tours[r2], r1, 1)]
+        if self.__try(changes):
+            for tours in self.slots:
+                tours[r1], tours[r2] = tours[r2], tours[r1]
+            self.moves["reorder"] += 1
+            return True
+        return False
+
+    def __neighborhood(self):
+        """ the moves, as callables, in order of cost: round reorder, swap, replace """
+        for r1 in range(self.nrounds):
+            for r2 in range(r1 + 1, self.nrounds):
+                yield lambda r1=r1, r2=r2: self.__reorder(r1, r2)
+        for idrone in range(len(self.drones)):
+            for r1 in range(self.nrounds):
+                for r2 in range(r1 + 1, self.nrounds):
+                    yield lambda idrone=idrone, r1=r1, r2=r2: self.__swap(idrone, r1, r2)
+        for idrone in range(len(self.drones)):
+            for round in range(self.nrounds):
+                for tour in self.candidates[idrone]:
+                    yield lambda idrone=idrone, round=round, tour=tour: self.__replace(idrone, round, tour)
+
+    def search(self):
+        """ apply improving moves until a local optimum (or the time budget) is reached
+
+        :return: the objective value of the local optimum
+        """
+        t_start = time.monotonic()
+        improved = True
+        while improved:
+            improved = False
+            for move in self.__neighborhood():
+                if self.time_budget is not None and time.monotonic() - t_start > self.time_budget:
+                    return self.value
+                if move():
+                    improved = True
+            if self.debug:
+                print("LocalSearch:", self.objective, "objective", self.value, "moves", self.moves)
+        return self.value
+
+    def solution(self, prune: bool = True) -> MultiRoundSolution:
+        """ run the search and return the improved multi-round solution
+
+        :param prune: whether remove the redundant visits (see utility.pruning_multiroundsolution) or not
+        """
+        self.search()
+        builder = MultiRoundSolutionBuilder(self.aoi)
+        for drone, tours in zip(self.drones, self.slots):
+            # a round is used if its tour has targets (also the empty tours of the input, e.g., of OPT, are unused)
+            last = max([round + 1 for round, tour in enumerate(tours) if len(tour.targets_indexes) > 0], default=0)
+            builder.add_drone_with_tours(drone, tours[:last])
+        mrs = builder.build()
+        return utility.pruning_multiroundsolution(mrs) if prune else mrs
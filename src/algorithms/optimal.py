@@ -5,19 +5,22 @@ Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version
 
 Please cite these works in case of use.
 
-This file contains the optimal models, i.e., TC-OPT and AC-OPT.
+This file contains the optimal models, i.e., TC-OPT and AC-OPT, a rolling-horizon AC-OPT for long missions and
+TC-OPT / AC-OPT by column generation (tours generated on demand).
 See above papers per specs of the two models.
 
 They take input AoI, tours and max number of rounds. Return a multi round solution.
 """
-from src.entities.trajenties import AoI, Tour, MultiRoundSolutionBuilder
+from src.entities.trajenties import AoI, Tour, MultiRoundSolutionBuilder, MultiRoundSolution
 
 from gurobipy import *
 from abc import ABCMeta, abstractmethod
 from deprecated import deprecated
 
 import networkx as nx
+import numpy as np
 import gurobipy
+import time
 
 # """ Constructor for the Path Coverage, input the graph that
 #    must be covered, the list of uavs that will be used, for each
@@ -30,6 +33,11 @@ import gurobipy
 #    the uavs must be istance of class utility.Drone
 # """
 
+def merge_vars(old_vars, new_vars):
+    """ a single tupledict of the old (None if any) and new variables, e.g., after the extension of the rounds """
+    return new_vars if old_vars is None else tupledict(list(old_vars.items()) + list(new_vars.items()))
+
+
 # -----------------------------------------------------------------------------
 #
 # Abstract Class Model for path based coverage
@@ -39,7 +47,7 @@ class AbstractCoverageModel():
     ''' A gurobi abstract model for coverage path based path Planning problem with drones '''
     __metaclass__ = ABCMeta
 
-    def __init__(self, aoi: AoI, uavs_tours: dict, max_rounds: int, debug: bool = True):
+    def __init__(self, aoi: AoI, uavs_tours: dict, max_rounds: int, debug: bool = True, excluded_targets=None):
         """
         Constructor for the Optimal Model of the Path Coverage (TC-OPT and AC-OPT).
 
@@ -51,6 +59,8 @@ class AbstractCoverageModel():
                             Note: each drone should leave always from same depot! All the tours from same drone should have same depot, the drone cannot exchange depots!
         :param max_rounds: the maximum number of rounds to perform (max number of multi trips)
         :param debug: whether print or not debug stuff (iteration etc..) (default True).
+        :param excluded_targets: the indexes of the targets without coverage variables, e.g., already covered
+                                (default None: all the targets are in the model)
         """
         self.aoi = aoi
         self.max_rounds = max_rounds
@@ -59,17 +69,29 @@ class AbstractCoverageModel():
         # other help variables
         self.graph = aoi.graph
         self.nnodes = self.aoi.n_targets  # len(aoi.graph.nodes())  # all nodes in the graphs, it includes depots
+        excluded_targets = set() if excluded_targets is None else set(excluded_targets)
+        self.targets = [i for i in range(self.nnodes) if i not in excluded_targets]  # the targets of the model
         self.uavs = list(uavs_tours.keys())
         self.nuavs = len(self.uavs)
 
-        # uav_tours should use integer index for the model
-        self.uavs_tours = {i: uavs_tours[self.uavs[i]] for i in range(self.nuavs)}
+        # uav_tours should use integer index for the model (a stream of tours, e.g. iter_trajectories, is consumed once)
+        self.uavs_tours = {i: uavs_tours[self.uavs[i]] if isinstance(uavs_tours[self.uavs[i]], list)
+                           else list(uavs_tours[self.uavs[i]]) for i in range(self.nuavs)}
 
         # check depots (each drone should leave always from same depot)
         self.__check_depots()
 
         # optimization model
         self.model = None
+        self.traj_vars, self.cov_vars = None, None
+        self.target_cov_constrs, self.onetour_constrs = None, None  # the duals price the tours (column generation)
+
+        # for each target, the (uav, tour) pairs that cover it
+        self.target_tours = [[] for i in range(self.nnodes)]
+        for u in range(self.nuavs):
+            for p, tour in enumerate(self.uavs_tours[u]):
+                for i in set(tour.targets_indexes):
+                    self.target_tours[i].append((u, p))
 
     def __check_depots(self):
         """ asserts that each drone leaves always from same depots:
@@ -88,67 +110,122 @@ class AbstractCoverageModel():
         """
         pass
 
-    def add_vars(self):
-        ''' add all the required variables to the model '''
-        traj_vars = self.trajectory_vars()  # z.p.u(n)
-        cov_vars = self.coverage_point_vars()  # delta.i(n)
+    @abstractmethod
+    def extend_model(self, rounds: range):
+        """
+         add the variables and constraints of the new rounds to the built model, and update the objective function
+        """
+        pass
+
+    def extend_rounds(self, max_rounds: int):
+        """ extend the built (and possibly optimized) model to a larger max number of rounds, without rebuilding it:
+            the variables and constraints of the new rounds are added. The last solution, if any, is the MIP start
+            (it is feasible, with empty new rounds).
+            E.g., a sweep of max_rounds = 1..R: build with 1 round, then optimize and extend_rounds(r + 1).
+
+        :param max_rounds: the new max number of rounds (>= the current one)
+        """
+        assert self.model is not None, "the model must be built before to extend it"
+        assert max_rounds >= self.max_rounds, "the model can only be extended"
+        start = self.__incumbent_choices({key: var.X for key, var in self.traj_vars.items()}) \
+            if self.model.SolCount > 0 else None
+        rounds = range(self.max_rounds, max_rounds)
+        self.max_rounds = max_rounds
+        self.extend_model(rounds)
+        self.model.update()
+        if start is not None:
+            self.set_mip_start(start)
+
+    def add_tour(self, u: int, tour: Tour, vtype=GRB.BINARY):
+        """ add a tour of a drone to the built model, without rebuilding it: a new column z_p^u(n) for each round, in
+            the coverage constraints of its targets and in the one-tour constraint of the drone (column generation).
+            The tour is appended to the tours of the drone (the same list of the input uavs_tours, if a list).
+
+        :param u: the index of the drone (in uavs)
+        :param tour: the new tour, feasible for the drone
+        :param vtype: the type of the new variables (e.g., GRB.CONTINUOUS in a LP relaxation, default GRB.BINARY)
+        """
+        assert self.model is not None, "the model must be built before to add a tour"
+        p = len(self.uavs_tours[u])
+        self.uavs_tours[u].append(tour)
+        targets = sorted(set(tour.targets_indexes))
+        for i in targets:
+            self.target_tours[i].append((u, p))
+        targets = [i for i in targets if (i, 0) in self.target_cov_constrs]  # the excluded targets have no constraints
+        new_vars = tupledict()
+        for n in range(self.max_rounds):  # cov_var[i, n] - sum of the tours == 0, sum of the tours of u <= 1
+            column = Column([-1.0] * len(targets) + [1.0],
+                            [self.target_cov_constrs[i, n] for i in targets] + [self.onetour_constrs[u, n]])
+            new_vars[u, p, n] = self.model.addVar(vtype=vtype, name="z.p.u(n)[{},{},{}]".format(u, p, n),
+                                                  column=column)
+        self.traj_vars = merge_vars(self.traj_vars, new_vars)
+
+    def add_vars(self, rounds: range = None):
+        ''' add all the required variables to the model (of all the rounds, or of the input rounds) '''
+        traj_vars = self.trajectory_vars(rounds)  # z.p.u(n)
+        cov_vars = self.coverage_point_vars(rounds)  # delta.i(n)
+        # the MIP start, the checkpoints and the extension refer to all the variables
+        self.traj_vars = merge_vars(self.traj_vars, traj_vars)
+        self.cov_vars = merge_vars(self.cov_vars, cov_vars)
         return traj_vars, cov_vars
 
-    def trajectory_vars(self):
+    def trajectory_vars(self, rounds: range = None):
         ''' z_p^u(n) variables - trajectories choices
 
             p -> tour
             u -> drone/uav
             n -> number of round
         '''
+        rounds = range(self.max_rounds) if rounds is None else rounds
         return self.model.addVars(  # z_p^u(n)
             [(u, p, n)
              for u in range(self.nuavs)
              for p in range(len(self.uavs_tours[u]))
-             for n in range(self.max_rounds)],
+             for n in rounds],
             vtype=GRB.BINARY,
             name="z.p.u(n)")
 
-    def coverage_point_vars(self):
+    def coverage_point_vars(self, rounds: range = None):
         ''' deltapiccolo_i(n) variables - cov point var
 
             i -> target to visit
             n -> round of visit
         '''
+        rounds = range(self.max_rounds) if rounds is None else rounds
         return self.model.addVars(
             [(i, n)
-             for i in range(self.nnodes)  # delta_i(n)
-             for n in range(self.max_rounds)],
+             for i in self.targets  # delta_i(n)
+             for n in rounds],
             vtype=GRB.BINARY,
             name="delta.i(n)")
 
-    def add_base_constrs(self, traj_vars, cov_vars):
+    def add_base_constrs(self, traj_vars, cov_vars, rounds: range = None):
         ''' add all the required costraints to the model '''
-        self.round_target_cov_constr(traj_vars, cov_vars)  # b
-        self.oneround_onetour_constr(traj_vars)  # c
+        target_cov_constrs = self.round_target_cov_constr(traj_vars, cov_vars, rounds)  # b
+        onetour_constrs = self.oneround_onetour_constr(traj_vars, rounds)  # c
+        self.target_cov_constrs = merge_vars(self.target_cov_constrs, target_cov_constrs)
+        self.onetour_constrs = merge_vars(self.onetour_constrs, onetour_constrs)
         # self.exclusive_target_cov_constr(cov_vars)  #g  NOTE: not included
 
-    def round_target_cov_constr(self, traj_vars, cov_var):
+    def round_target_cov_constr(self, traj_vars, cov_var, rounds: range = None):
         """ impose that a point is visited only
             from one drone/tour at each round 
         """
-        self.model.addConstrs(
+        rounds = range(self.max_rounds) if rounds is None else rounds
+        return self.model.addConstrs(
             cov_var[i, n] ==
-            quicksum([traj_vars.sum(u, p, n)
-                      for u in range(self.nuavs)
-                      for p in range(len(self.uavs_tours[u]))
-                      if i in self.uavs_tours[u][p].targets_indexes
-                      ])
-            for i in range(self.nnodes)
-            for n in range(self.max_rounds)
+            quicksum([traj_vars[u, p, n] for u, p in self.target_tours[i]])
+            for i in self.targets
+            for n in rounds
         )
 
-    def oneround_onetour_constr(self, traj_vars):
+    def oneround_onetour_constr(self, traj_vars, rounds: range = None):
         """ impose only a tour for each drone in the same round """
-        self.model.addConstrs(
+        rounds = range(self.max_rounds) if rounds is None else rounds
+        return self.model.addConstrs(
             traj_vars.sum(u, '*', n) <= 1
             for u in range(self.nuavs)
-            for n in range(self.max_rounds)
+            for n in rounds
         )
 
     @deprecated
@@ -157,16 +234,57 @@ class AbstractCoverageModel():
             one of the rounds
         """
         self.model.addConstrs(cov_vars.sum(i, '*') == 1
-                              for i in range(self.nnodes)
+                              for i in self.targets
                               )
 
     def console_debug(self):
         if not self.debug:
             self.model.Params.outputFlag = 0
 
-    def optimize(self):
+    def set_mip_start(self, choices):
+        """ set the MIP start of the trajectory choices
+
+        :param choices: an array of rows (index_uav, index_tour, round), the chosen tours (the others are not chosen)
+        """
+        chosen = {tuple(choice) for choice in np.asarray(choices, dtype=int).reshape(-1, 3).tolist()}
+        for key, var in self.traj_vars.items():
+            var.Start = 1 if key in chosen else 0
+
+    def __incumbent_choices(self, values: dict):
+        """ the trajectory choices (rows (index_uav, index_tour, round)) of the values {var key : value} """
+        return np.array([key for key, value in values.items() if value >= 0.5], dtype=np.int64).reshape(-1, 3)
+
+    def __checkpoint_callback(self, checkpoint, name: str):
+        """ a gurobi callback that saves the last incumbent in the checkpoint, at most every checkpoint.interval """
+        keys, variables = list(self.traj_vars.keys()), list(self.traj_vars.values())
+        pending = {}  # the incumbent not yet saved
+
+        def callback(model, where):
+            if where == GRB.Callback.MIPSOL:
+                pending["choices"] = self.__incumbent_choices(dict(zip(keys, model.cbGetSolution(variables))))
+                pending["objective"] = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+            if "choices" in pending and checkpoint.due(name):
+                checkpoint.save(name, choices=pending.pop("choices"), objective=np.array(pending.pop("objective")))
+        return callback
+
+    def optimize(self, checkpoint=None, name: str = "opt"):
+        """ optimize the model
+
+        :param checkpoint: if not None, the incumbent is saved in this checkpoint (src.util.checkpoint.Checkpoint)
+                            at its interval, and the saved incumbent, if any, is the MIP start (default None)
+        :param name: the name of the incumbent in the checkpoint (default "opt")
+        """
         self.console_debug()
-        self.model.optimize()
+        if checkpoint is None:
+            self.model.optimize()
+        else:
+            incumbent = checkpoint.load(name)
+            if incumbent is not None:
+                self.set_mip_start(incumbent["choices"])
+            self.model.optimize(self.__checkpoint_callback(checkpoint, name))
+            if self.model.SolCount > 0:  # the final incumbent
+                choices = self.__incumbent_choices({key: var.X for key, var in self.traj_vars.items()})
+                checkpoint.save(name, choices=choices, objective=np.array(self.model.objVal))
         if self.model.getAttr('Status') == GRB.OPTIMAL:
             self.extract_solution()
 
@@ -189,8 +307,7 @@ class AbstractCoverageModel():
             for n in range(self.max_rounds):  # round
                 tour = Tour(self.aoi, [])  # in case the solution do not use this round, we place an empty tour
                 for p in range(len(self.uavs_tours[iu])):
-                    if (self.model.getVarByName('z.p.u(n)[%d,%d,%d]'
-                                                % (iu, p, n)).X >= 0.5):
+                    if self.traj_vars[iu, p, n].X >= 0.5:
                         tour = self.uavs_tours[iu][p]
                 mrs_builder.append_tour(self.uavs[iu], tour)
 
@@ -200,48 +317,73 @@ class AbstractCoverageModel():
 class CumulativeCoverageModel(AbstractCoverageModel):
     ''' A gurobi model for cumulative Coverage (AC-Opt) Model path based with drones '''
 
+    def __init__(self, aoi: AoI, uavs_tours: dict, max_rounds: int, debug: bool = True, excluded_targets=None,
+                 horizon: int = None):
+        """
+        See AbstractCoverageModel.
+
+        :param horizon: the rounds of the whole mission, if longer than max_rounds (e.g., a window of the rolling
+                        horizon): the cumulative coverage is measured on it (default None: max_rounds)
+        """
+        super(CumulativeCoverageModel, self).__init__(aoi, uavs_tours, max_rounds, debug, excluded_targets)
+        self.horizon = horizon
+
     def build(self):
         self.model = Model("cumulative_coverage")
+        self.traj_vars, self.cov_vars, self.cum_cov_vars = None, None, None
+        self.target_cov_constrs, self.onetour_constrs = None, None
         traj_vars, cov_vars, cum_cov_vars = self.add_vars()
         self.add_constrs(traj_vars, cov_vars, cum_cov_vars)
         self.objective_function(cum_cov_vars)
 
-    def add_vars(self):
+    def extend_model(self, rounds: range):
+        traj_vars, cov_vars, cum_cov_vars = self.add_vars(rounds)
+        self.add_constrs(traj_vars, self.cov_vars, cum_cov_vars, rounds)
+        self.objective_function(self.cum_cov_vars)
+
+    def add_vars(self, rounds: range = None):
         ''' add all the required variables to the model '''
         traj_vars, cov_vars = super(CumulativeCoverageModel,
-                                    self).add_vars()
-        cum_cov_vars = self.cumulative_cov_vars()  # DELTA.i(n)
+                                    self).add_vars(rounds)
+        cum_cov_vars = self.cumulative_cov_vars(rounds)  # DELTA.i(n)
+        self.cum_cov_vars = merge_vars(self.cum_cov_vars, cum_cov_vars)
         return traj_vars, cov_vars, cum_cov_vars
 
-    def cumulative_cov_vars(self):
+    def cumulative_cov_vars(self, rounds: range = None):
         ''' deltagrande_i(n) variables - cumulative coverage var '''
+        rounds = range(self.max_rounds) if rounds is None else rounds
         return self.model.addVars(  # DELTA_i(n)
             [(i, n)
-             for i in range(self.nnodes)
-             for n in range(self.max_rounds)],
+             for i in self.targets
+             for n in rounds],
             vtype=GRB.BINARY,
             name="DELTA_i(n)")
 
-    def add_constrs(self, traj_vars, cov_vars, cum_cov_vars):
+    def add_constrs(self, traj_vars, cov_vars, cum_cov_vars, rounds: range = None):
         ''' add all the required costraints to the model
         '''
         super(CumulativeCoverageModel,
-              self).add_base_constrs(traj_vars, cov_vars)
-        self.cumulative_cov_constr(cov_vars, cum_cov_vars)  # constr d
+              self).add_base_constrs(traj_vars, cov_vars, rounds)
+        self.cumulative_cov_constr(cov_vars, cum_cov_vars, rounds)  # constr d
 
-    def cumulative_cov_constr(self, cov_vars, cum_cov_vars):
+    def cumulative_cov_constr(self, cov_vars, cum_cov_vars, rounds: range = None):
         """ variable for cumulative coverage for each point i
             and for each round
         """
-        for i in range(self.nnodes):
-            for n in range(self.max_rounds):
+        rounds = range(self.max_rounds) if rounds is None else rounds
+        for i in self.targets:
+            for n in rounds:
                 cost = quicksum([cov_vars[i, k] for k in range(n + 1)])
                 self.model.addConstr(cum_cov_vars[i, n] <= cost,
                                      "cum_cov_constr")
 
     def objective_function(self, cumulative_cov_vars):
-        """ objective function of opt model """
-        self.model.setObjective(cumulative_cov_vars.sum('*', '*'),
+        """ objective function of opt model. With a longer horizon, the targets covered by the last round
+            count also for the rounds after it (horizon - max_rounds more rounds)
+        """
+        tail_rounds = 0 if self.horizon is None else self.horizon - self.max_rounds
+        self.model.setObjective(cumulative_cov_vars.sum('*', '*')
+                                + tail_rounds * cumulative_cov_vars.sum('*', self.max_rounds - 1),
                                 GRB.MAXIMIZE)
 
 
@@ -250,10 +392,20 @@ class TotalCoverageModel(AbstractCoverageModel):
 
     def build(self):
         self.model = Model("total_coverage")
+        self.traj_vars, self.cov_vars = None, None
+        self.target_cov_constrs, self.onetour_constrs = None, None
         traj_vars, cov_vars, tot_cov_vars = self.add_vars()
         self.add_constrs(traj_vars, cov_vars, tot_cov_vars)
         self.objective_function(tot_cov_vars)
 
+    def extend_model(self, rounds: range):
+        traj_vars, cov_vars = super(TotalCoverageModel, self).add_vars(rounds)
+        super(TotalCoverageModel, self).add_base_constrs(traj_vars, cov_vars, rounds)
+        # the coverage of the new rounds counts in the total coverage constraints
+        for i in self.targets:
+            for n in rounds:
+                self.model.chgCoeff(self.tot_cov_constrs[i], cov_vars[i, n], -1.0)
+
     def add_vars(self):
         ''' add all the required variables to the model '''
         traj_vars, cov_vars = super(TotalCoverageModel,
@@ -267,7 +419,7 @@ class TotalCoverageModel(AbstractCoverageModel):
             in at least one round    
         '''
         return self.model.addVars(  # DELTA_i(n)
-            [i for i in range(self.nnodes)],
+            [i for i in self.targets],
             vtype=GRB.BINARY,
             name="DELTA_i")
 
@@ -281,12 +433,296 @@ class TotalCoverageModel(AbstractCoverageModel):
         """ variable for cumulative coverage for each point i
             and for each round
         """
-        for i in range(self.nnodes):
+        self.tot_cov_constrs = {}  # extended with the new rounds, see extend_model
+        for i in self.targets:
             cost = quicksum([cov_vars[i, k] for k in range(self.max_rounds)])
-            self.model.addConstr(tot_cov_vars[i] <= cost,
-                                 "tot_cov_constr")
+            self.tot_cov_constrs[i] = self.model.addConstr(tot_cov_vars[i] <= cost,
+                                                           "tot_cov_constr")
 
     def objective_function(self, tot_cov_vars):
         """ objective function of opt model """
         self.model.setObjective(tot_cov_vars.sum('*'),
                                 GRB.MAXIMIZE)
+
+
+# -----------------------------------------------------------------------------
+#
+# Rolling horizon AC-OPT for long multi-round missions
+#
+# -----------------------------------------------------------------------------
+class RollingHorizonCoverage():
+    ''' Rolling-horizon AC-OPT: the AC-OPT model of a window of rounds is optimized, its first round is fixed and the
+        window slides forward by one round, without the already covered targets. Each window has the same size:
+        the runtime grows linearly with the number of rounds.
+    '''
+
+    def __init__(self, aoi: AoI, uavs_tours: dict, max_rounds: int, window: int = 2, debug: bool = True):
+        """
+        :param aoi: the input area of interest with targets and depots
+        :param uavs_tours: a dictionary that maps available drones to their available tours (see AbstractCoverageModel)
+        :param max_rounds: the maximum number of rounds of the mission
+        :param window: the number of rounds of each window (default 2)
+        :param debug: whether print or not the windows
+        """
+        self.aoi = aoi
+        self.uavs_tours = uavs_tours
+        self.max_rounds = max_rounds
+        self.window = window
+        self.debug = debug
+
+        self.value = None  # the cumulative coverage of the rolling solution
+        self.windows = []  # (first round, objective of the window, seconds) of each window
+
+    def __window_tours(self, covered):
+        """ the tours of each drone with some target not yet covered (the drones without such tours are omitted) """
+        uavs_tours = {}
+        for drone, tours in self.uavs_tours.items():
+            useful = [tour for tour in tours if not covered[tour.targets_array()].all()]
+            if len(useful) > 0:
+                uavs_tours[drone] = useful
+        return uavs_tours
+
+    def __mip_start(self, model: CumulativeCoverageModel, previous: MultiRoundSolution):
+        """ the MIP start of the window: the rounds after the first of the previous window (shifted back by one) """
+        index = {u: {id(tour): p for p, tour in enumerate(model.uavs_tours[u])} for u in range(model.nuavs)}
+        choices = [(u, index[u][id(tour)], n - 1)
+                   for u, drone in enumerate(model.uavs) if drone in previous.drone_and_tours
+                   for n, tour in enumerate(previous.drone_and_tours[drone])
+                   if 0 < n <= model.max_rounds and id(tour) in index[u]]
+        model.set_mip_start(choices)
+
+    def solution(self) -> MultiRoundSolution:
+        """ solve the windows and return the multi-round solution of the fixed rounds """
+        drones = list(self.uavs_tours.keys())
+        builder = MultiRoundSolutionBuilder(self.aoi)
+        for drone in drones:
+            builder.add_drone(drone)
+
+        covered = np.zeros(self.aoi.n_targets, dtype=bool)
+        previous = None
+        for start in range(self.max_rounds):
+            uavs_tours = self.__window_tours(covered)
+            if len(uavs_tours) == 0:  # all the reachable targets are covered
+                break
+            t_start = time.perf_counter()
+            model = CumulativeCoverageModel(self.aoi, uavs_tours, min(self.window, self.max_rounds - start),
+                                            debug=False, excluded_targets=np.flatnonzero(covered).tolist(),
+                                            horizon=self.max_rounds - start)
+            model.build()
+            if previous is not None:
+                self.__mip_start(model, previous)
+            model.optimize()
+            if getattr(model, "solution", None) is None:
+                raise RuntimeError("optimal solution of the window not found")
+            previous = model.solution
+            self.windows.append((start, model.model.objVal, time.perf_counter() - t_start))
+
+            # fix the first round of the window
+            for drone in drones:
+                tours = previous.drone_and_tours.get(drone, [])
+                tour = tours[0] if len(tours) > 0 else Tour(self.aoi, [])
+                builder.append_tour(drone, tour)
+                covered[tour.targets_array()] = True
+            if self.debug:
+                print("RollingHorizon: round", start, "covered targets", builder.coverage_score())
+
+        mrs = builder.build()
+        self.value = mrs.cumulative_coverage_score(self.max_rounds)
+        return mrs
+
+    def full_gap(self):
+        """ solve the full AC-OPT model (all the rounds) and compare it with the rolling solution
+
+        :return: a tuple (full objective, rolling objective, relative gap), None if the full model is not tractable
+                (e.g., a gurobi error for the size of the model, or not solved to optimality)
+        """
+        if self.value is None:
+            self.solution()
+        model = CumulativeCoverageModel(self.aoi, self.uavs_tours, self.max_rounds, debug=False)
+        try:
+            model.build()
+            model.optimize()
+        except GurobiError:
+            return None
+        if getattr(model, "solution", None) is None:
+            return None
+        full = model.model.objVal
+        return full, self.value, (full - self.value) / full if full > 0 else 0.0
+
+
+# -----------------------------------------------------------------------------
+#
+# Column generation TC-OPT and AC-OPT
+#
+# -----------------------------------------------------------------------------
+class ColumnGenerationCoverage():
+    ''' TC-OPT / AC-OPT by column generation: the tours are generated on demand instead of enumerated upfront.
+        The LP relaxation of the model is solved on the current pool of tours; a new tour of a drone, for a round,
+        improves the LP if its reduced cost (the sum of the duals of its targets in that round, minus the dual of the
+        one-tour constraint of the drone) is positive. The tours are priced by a prize-collecting orienteering
+        heuristic (the duals are the prizes) within the autonomy of the drone. When no improving tour is found the
+        MILP is solved on the generated pool: its value is a lower bound, the last LP value an upper bound
+        (up to the heuristic pricing).
+    '''
+
+    EPSILON = 1e-6  # the min reduced cost of an improving tour
+
+    def __init__(self, aoi: AoI, uavs_tours: dict, max_rounds: int, objective: str = "AC", max_iterations: int = 50,
+                 debug: bool = True):
+        """
+        :param aoi: the input area of interest with targets and depots
+        :param uavs_tours: the seed pool, a dictionary {drone : [tour1, tour2, ...]} with at least a tour for each drone
+                            (see AbstractCoverageModel), e.g., a few maximal tours of iter_trajectories
+        :param max_rounds: the maximum number of rounds to perform (max number of multi trips)
+        :param objective: "TC" (TotalCoverageModel) or "AC" (CumulativeCoverageModel)
+        :param max_iterations: the max number of pricing iterations (default 50)
+        :param debug: whether print or not the iterations
+        """
+        assert objective in ("TC", "AC"), "the objective must be TC or AC"
+        self.aoi = aoi
+        self.max_rounds = max_rounds
+        self.objective = objective
+        self.max_iterations = max_iterations
+        self.debug = debug
+
+        self.pool = {drone: list(tours) for drone, tours in uavs_tours.items()}  # the seed and generated tours
+        assert all(len(tours) > 0 for tours in self.pool.values()), "the seed pool needs a tour for each drone"
+        self.depots = {drone: tours[0].depot_index for drone, tours in self.pool.items()}
+        self.__pool_keys = {drone: {frozenset(tour.targets_indexes) for tour in tours}
+                            for drone, tours in self.pool.items()}
+        self.distances = aoi.metric_closure()
+        self.hovering = aoi.hovering_times()
+
+        self.lp_values = []  # the LP value of each iteration
+        self.model = None  # the final MILP model
+        self.solution = None
+
+    def __model(self):
+        """ the model (TC or AC) of the current pool, built """
+        model_class = TotalCoverageModel if self.objective == "TC" else CumulativeCoverageModel
+        model = model_class(self.aoi, self.pool, self.max_rounds, debug=False)
+        model.build()
+        return model
+
+    # -------------------------------------------------------------------
+    # pricing
+    # -------------------------------------------------------------------
+
+    def __route_time(self, route: list, drone) -> float:
+        """ the flight and hovering time of the closed route [depot, target1, ...] """
+        nodes = np.array(route)
+        return self.distances[nodes, np.roll(nodes, -1)].sum() / drone.speed + self.hovering[nodes].sum()
+
+    def __two_opt(self, route: list) -> list:
+        """ shorten the closed route [depot, target1, ...] with 2-opt moves (the depot stays first) """
+        improved = True
+        while improved:
+            improved = False
+            for a in range(len(route) - 1):
+                for b in range(a + 2, len(route)):
+                    c, d = route[b], route[(b + 1) % len(route)]
+                    if self.distances[route[a], c] + self.distances[route[a + 1], d] \
+                            < self.distances[route[a], route[a + 1]] + self.distances[c, d] - self.EPSILON:
+                        route[a + 1:b + 1] = route[a + 1:b + 1][::-1]
+                        improved = True
+        return route
+
+    def __orienteering(self, drone, prizes) -> list:
+        """ prize-collecting orienteering heuristic: insert, at the cheapest position, the target with the highest
+            prize per added time while the route is within the autonomy; then shorten the route (2-opt) and insert
+            again, until no target can be inserted
+
+        :param prizes: the prize of each target (array of n_targets), only the positive ones are collected
+        :return: the route [depot, target1, ...]
+        """
+        depot = self.depots[drone]
+        round_trip = self.hovering + 2 * self.distances[depot] / drone.speed
+        candidates = [i for i in np.flatnonzero(prizes > self.EPSILON) if round_trip[i] < drone.autonomy]
+        route, time_route = [depot], 0.0
+        while len(candidates) > 0:
+            nodes = np.array(route)
+            nexts = np.roll(nodes, -1)
+            cand = np.array(candidates)
+            # the added time of each candidate (columns) at each position (rows)
+            added = (self.distances[nodes][:, cand] + self.distances[cand][:, nexts].T
+                     - self.distances[nodes, nexts][:, np.newaxis]) / drone.speed + self.hovering[cand]
+            positions = added.argmin(axis=0)
+            best_added = added[positions, np.arange(len(cand))]
+            feasible = time_route + best_added < drone.autonomy
+            if not feasible.any():
+                shortened = self.__two_opt(list(route))
+                if self.__route_time(shortened, drone) < time_route - self.EPSILON:
+                    route, time_route = shortened, self.__route_time(shortened, drone)
+                    continue
+                break
+            ratio = np.where(feasible, prizes[cand] / np.maximum(best_added, self.EPSILON), -np.inf)
+            k = int(np.argmax(ratio))
+            route.insert(positions[k] + 1, int(cand[k]))
+            time_route += best_added[k]
+            candidates.remove(cand[k])
+        return route
+
+    def __price(self, model) -> int:
+        """ add to the pool (and to the LP relaxation of the model, as new columns) the improving tours of the drones,
+            for the duals of the LP of the model
+
+        :return: the number of added tours
+        """
+        n_added = 0
+        for u, drone in enumerate(model.uavs):
+            for n in range(self.max_rounds):
+                prizes = np.zeros(self.aoi.n_targets)
+                for i in model.targets:
+                    prizes[i] = model.target_cov_constrs[i, n].Pi
+                route = self.__orienteering(drone, prizes)
+                reduced_cost = prizes[route[1:]].sum() - model.onetour_constrs[u, n].Pi
+                key = frozenset(route[1:])
+                if len(route) == 1 or reduced_cost <= self.EPSILON or key in self.__pool_keys[drone]:
+                    continue
+                tour = Tour.from_ordered_nodes(self.aoi, route)
+                if tour.time_tour(drone.speed) >= drone.autonomy:
+                    continue
+                model.add_tour(u, tour, vtype=GRB.CONTINUOUS)  # the model shares the list of the pool of the drone
+                self.__pool_keys[drone].add(key)
+                n_added += 1
+        return n_added
+
+    # -------------------------------------------------------------------
+    # solve
+    # -------------------------------------------------------------------
+
+    def solve(self) -> MultiRoundSolution:
+        """ generate the tours (LP relaxation and pricing) and solve the MILP on the generated pool. A single model is
+            built: the new tours are added as columns of its LP relaxation, then the integrality is restored
+
+        :return: the multi round solution : trajenties.MultiRoundSolution (None if not solved to optimality)
+        """
+        model = self.__model()
+        model.console_debug()
+        model.model.update()
+        vtypes = [(variable, variable.VType) for variable in model.model.getVars()]
+        for variable, _ in vtypes:  # LP relaxation
+            variable.VType = GRB.CONTINUOUS
+        for iteration in range(self.max_iterations):
+            model.model.optimize()
+            if model.model.Status != GRB.OPTIMAL:
+                raise RuntimeError("LP relaxation not solved")
+            self.lp_values.append(model.model.objVal)
+            n_added = self.__price(model)
+            if self.debug:
+                print("ColumnGeneration: iteration", iteration, "LP", round(model.model.objVal, 4),
+                      "new tours", n_added, "pool", sum(len(tours) for tours in self.pool.values()))
+            if n_added == 0:
+                break
+
+        # the MILP on the generated pool: the original types, the new tours are binary
+        for variable, vtype in vtypes:
+            variable.VType = vtype
+        for variable in model.traj_vars.values():
+            variable.VType = GRB.BINARY
+        self.model = model
+        self.model.optimize()
+        self.solution = getattr(self.model, "solution", None)
+        if self.debug and self.solution is not None:
+            print("ColumnGeneration: MILP", self.model.model.objVal, "LP bound", round(self.lp_values[-1], 4))
+        return self.solution
@@ -16,11 +16,17 @@ from src.entities.trajenties import AoI, Drone, Tour
 from src.util.utility import Christofides
 
 import networkx as nx
+import numpy as np
 
 
 class DroneTrajGeneration():
     """
     Algorithm 2 TMC. It generates a set of feasible trajectories for an input drone
+
+    The TSP (backbone) of a depot is shared by its drones: a drone whose reachable targets are a subset of the backbone
+    (e.g., same depot and speed, less autonomy) visits them in the backbone order, shortcutting the unreachable ones
+    (no longer by triangle inequality); a new TSP is computed only for a drone that reaches targets out of the backbone.
+    compute_backbones computes in advance a single backbone per depot for a whole fleet.
     """
 
     def __init__(self, aoi: AoI):
@@ -28,90 +34,184 @@ class DroneTrajGeneration():
         :param aoi: the input aoi with targets and depots
         """
         self.aoi = aoi
+        self.n_tsp = 0  # the number of computed TSPs (backbones)
+        self.__backbones = {}  # depot index -> the ordered nodes of its TSP, starting from the depot
+        self.__windows = {}  # (depot index, ordered targets) -> the prefix sums of the order (see __prefix_sums)
+
+    def compute_backbones(self, drones_depots: dict):
+        """ compute a single backbone for each depot: the TSP of all the targets reachable by its drones
+
+        :param drones_depots: a dictionary {drone : depot coordinates}
+        """
+        depot_targets = {}
+        for drone, depot_coords in drones_depots.items():
+            depot_targets.setdefault(depot_coords, set()).update(self.__reachable_targets(drone, depot_coords))
+        for depot_coords, targets in depot_targets.items():
+            if len(targets) > 0:
+                self.__backbone_order(depot_coords, targets)
+
+    def compute_fleet_trajectories(self, drones_depots: dict) -> dict:
+        """ the feasible trajectories of a (heterogeneous) fleet, with one TSP per depot
+
+        :param drones_depots: a dictionary {drone : depot coordinates}
+        :return: a dictionary {drone : [tour1, tour2, ..., tourN]} (see compute_trajectories)
+        """
+        self.compute_backbones(drones_depots)
+        return {drone: self.compute_trajectories(drone, depot_coords) for drone, depot_coords in drones_depots.items()}
 
     def compute_trajectories(self, drone: Drone, depot_coords: tuple):
         """
         Actually compute the set of feasible trajectories accordina drone speed and energy.
+        The tours follow the backbone of the depot, which depends on the drones computed before on this generator
+        (a drone reaching targets out of the backbone recomputes it for the next ones): for a fleet, call
+        compute_backbones first (or use compute_fleet_trajectories), to get the same tours in any order of the drones.
 
         :param drone: the drone for the feasible trajectories set
         :param depot_coords: the depot coordinates for the input drone, where the trajectories start and end. e.g., (x1, y1)
         :return: a list of tours. e.g., [tour1, tour2, ..., tourN] starting and ending at input depot. (tour : src.entities.Tour)
         """
+        return list(self.iter_trajectories(drone, depot_coords))
+
+    def iter_trajectories(self, drone: Drone, depot_coords: tuple, max_tours: int = None, min_targets: int = 1,
+                          maximal: bool = False):
+        """
+        A generator of the feasible trajectories (see compute_trajectories): the tours are built lazily, along the TSP
+        order, only when requested. E.g., the candidate tours of GaP or OPT with bounded memory:
+            {drone: builder.iter_trajectories(drone, depot, max_tours=500, maximal=True)}
+
+        :param drone: the drone for the feasible trajectories set
+        :param depot_coords: the depot coordinates for the input drone, where the trajectories start and end. e.g., (x1, y1)
+        :param max_tours: the max number of yielded tours (default None: all)
+        :param min_targets: the min number of targets of a yielded tour (default 1: all)
+        :param maximal: if True only the maximal windows of the TSP order are yielded: from each first node, the longest
+                        feasible sub-tour, unless a sub-tour already yielded contains it. A maximal window covers all
+                        the targets of its prefixes (default False)
+        :return: a generator of tours starting and ending at input depot. (tour : src.entities.Tour)
+        """
         assert depot_coords in self.aoi.depots, "Depot should be included in the given AoI"
         depot_index = self.aoi.node_index(depot_coords)
 
         # remove unused and unreachable nodes
-        graph = self.__remove_nodes(self.aoi.graph, depot_coords, drone)
-        assert graph.number_of_nodes() > 1, "Drone {} has not enough energy to visit any node".format(drone)
+        targets = self.__reachable_targets(drone, depot_coords)
+        assert len(targets) > 0, "Drone {} has not enough energy to visit any node".format(drone)
 
-        # compute the initial TSP
-        tsp_tour = Christofides.compute(graph, depot_index)
-        tsp_nodes = [x[0] for x in tsp_tour]  # ordered visited nodes by TSP
-        assert len(tsp_nodes) == graph.number_of_nodes()
+        # the TSP order of the reachable targets (the shared backbone, shortcut)
+        tsp_nodes = self.__backbone_order(depot_coords, targets)
+        assert len(tsp_nodes) == len(targets) + 1
 
         nnodes = len(tsp_nodes)
-        output_tours = []
+        n_tours = 0
+        max_last = 0  # the last node of the longest yielded window
         for i in range(1, nnodes):  # index of first nodes of sub-tour
-            output_tours.extend(self.__compute_subtours(i, tsp_nodes, drone, depot_index))
-
-        return output_tours
-
-    def __compute_subtours(self, tsp_node_index: int, tsp_nodes: list, drone: Drone, depot_index: int) -> list:
+            last = self.__last_feasible(i, tsp_nodes, drone, depot_index)
+            if maximal:
+                if last <= max_last:
+                    continue  # contained in a window already yielded
+                max_last = last
+                lasts = [last]
+            else:
+                lasts = range(i, last + 1)
+            for j in lasts:
+                if j - i + 1 < min_targets:
+                    continue
+                if max_tours is not None and n_tours >= max_tours:
+                    return
+                yield Tour.from_graph_indexes(self.aoi, self.__subtour_edges(i, j, tsp_nodes, depot_index))
+                n_tours += 1
+
+    def __backbone_order(self, depot_coords: tuple, targets: set) -> list:
+        """ the TSP order [depot, target1, ...] of the input targets: the backbone of the depot without the other
+            targets. The backbone is recomputed, on the union of its targets and the input ones, if it misses some of
+            the input targets.
+        """
+        depot_index = self.aoi.node_index(depot_coords)
+        backbone = self.__backbones.get(depot_index)
+        if backbone is None or not targets.issubset(backbone):
+            if backbone is not None:
+                targets = targets.union(backbone[1:])
+            if self.aoi.viable_paths is None:
+                graph = self.__remove_nodes(self.aoi.graph, depot_coords, targets)
+                tsp_tour = Christofides.compute(graph, depot_index)
+            else:  # on the shortest viable paths (metric closure), without a complete graph
+                tsp_tour = Christofides.compute_dense(self.aoi.metric_closure(), [depot_index] + sorted(targets),
+                                                      depot_index)
+            backbone = [x[0] for x in tsp_tour]  # ordered visited nodes by TSP
+            assert len(backbone) == len(targets) + 1
+            self.__backbones[depot_index] = backbone
+            self.n_tsp += 1
+        return [node for node in backbone if node == depot_index or node in targets]
+
+    def __prefix_sums(self, tsp_nodes: list):
+        """ the prefix sums of an order [depot, target1, ...], shared by the drones with the same order:
+                the distance from the depot to each node, the path length from target1 to each node and the
+                hovering time from target1 to each node (included).
+            A sub-tour from the i-th to the j-th node costs
+                depot[i] + (path[j] - path[i]) + depot[j] meters and hovering[j] - hovering[i - 1] seconds.
+        """
+        key = tuple(tsp_nodes)
+        if key not in self.__windows:
+            nodes = np.array(tsp_nodes)
+            distances = self.aoi.metric_closure()  # shortest viable paths
+            path = np.concatenate(([0.0, 0.0], np.cumsum(distances[nodes[1:-1], nodes[2:]])))
+            hovering = np.concatenate(([0.0], np.cumsum(self.aoi.hovering_times()[nodes[1:]])))
+            self.__windows[key] = (distances[nodes[0], nodes], path, hovering)
+        return self.__windows[key]
+
+    def __subtour_edges(self, first: int, last: int, tsp_nodes: list, depot_index: int) -> list:
+        """ the edges of the sub-tour from the depot to tsp_nodes[first], along the TSP order to tsp_nodes[last],
+            and back to the depot """
+        return ([(depot_index, tsp_nodes[first])] + [(tsp_nodes[k - 1], tsp_nodes[k]) for k in range(first + 1, last + 1)]
+                + [(tsp_nodes[last], depot_index)])
+
+    def __last_feasible(self, tsp_node_index: int, tsp_nodes: list, drone: Drone, depot_index: int) -> int:
         """
 
         :param tsp_node_index: the current node, the first node to visit in the tour -> tsp_nodes[tsp_node_index]
         :param tsp_nodes: the ordered nodes of the tsp tour
         :param drone: the drone for the feasible trajectories set
         :param depot_index: the index of the drone (index of graph)
-        :return: a list of tour : src.entities.trajentities.Tour from tsp_node_index to the last nodes visitable according drone energy
+        :return: the index (in tsp_nodes) of the last node of the longest sub-tour from tsp_node_index visitable
+                 according drone energy: all the shorter sub-tours from tsp_node_index are visitable too
         """
-        out_tours = []
-
-        # initial tour
-        current_subtour = [(depot_index, tsp_nodes[tsp_node_index])]  # by construction this must be visitable
-        return_edge = (tsp_nodes[tsp_node_index], depot_index)
-        tour = Tour.from_graph_indexes(self.aoi, current_subtour + [return_edge])
-        assert tour.time_tour(
-            drone.speed) < drone.autonomy, "This is a bug in the multipath build, the drone should have enough energy " \
-                                           "to visit this point and come back to depot! "
-        out_tours.append(tour)  # add this first slice of tour
-
-        for i in range(tsp_node_index + 1, len(tsp_nodes)):  # last nodes in sub-tour
-            current_subtour += [(tsp_nodes[i - 1], tsp_nodes[i])]
-            return_edge = (tsp_nodes[i], depot_index)
-            tour = Tour.from_graph_indexes(self.aoi, current_subtour + [return_edge])
-            if tour.time_tour(drone.speed) < drone.autonomy:
-                out_tours.append(tour)  # add this first slice of tour
-            else:
-                break  # bigger sub-tours will have cost > autonomy by triangle inequality
-
-        return out_tours
+        depot, path, hovering = self.__prefix_sums(tsp_nodes)
+        i = tsp_node_index
+        times = ((depot[i] + path[i:] - path[i] + depot[i:]) / drone.speed + hovering[i:] - hovering[i - 1])
+        # the sub-tours within a rounding error from the autonomy are checked on the tour itself
+        tolerance = 1e-9 * max(drone.autonomy, 1)
+
+        for k, j in enumerate(range(i, len(tsp_nodes))):  # last nodes in sub-tour
+            feasible = times[k] < drone.autonomy - tolerance
+            if not feasible and times[k] < drone.autonomy + tolerance:
+                tour = Tour.from_graph_indexes(self.aoi, self.__subtour_edges(i, j, tsp_nodes, depot_index))
+                feasible = tour.time_tour(drone.speed) < drone.autonomy
+            if not feasible:
+                # by construction the first slice must be visitable
+                assert j > i, "This is a bug in the multipath build, the drone should have enough energy " \
+                              "to visit this point and come back to depot! "
+                return j - 1  # bigger sub-tours will have cost > autonomy by triangle inequality
+        return len(tsp_nodes) - 1
+
+    def __reachable_targets(self, drone: Drone, depot_coords: tuple) -> set:
+        """ the targets the drone can visit from the depot and come back (round trip time within the autonomy),
+            a vectorized mask on the distances from the depot and the hovering times """
+        depot_index = self.aoi.node_index(depot_coords)
+        round_trip = self.aoi.hovering_times() + 2 * self.aoi.metric_closure()[depot_index] / drone.speed
+        return set(np.flatnonzero(round_trip[:self.aoi.n_targets] <= drone.autonomy).tolist())
 
-    def __remove_nodes(self, graph: nx.Graph, depot_coords: tuple, drone: Drone) -> nx.Graph:
+    def __remove_nodes(self, graph: nx.Graph, depot_coords: tuple, targets: set) -> nx.Graph:
         """ remove unreachble nodes:
-                targets too far (the drone has not enough energy)
+                targets not in the input ones (e.g., too far, the drones have not enough energy)
                 depots different from the input one (depots != depots_coords)
 
+        The input graph is not copied: the returned graph is a read-only view of it with only the depot and the targets.
+        If the AoI has sparse viable paths the TSP is computed on the metric closure instead (see __backbone_order).
+
         :param graph: the input graph to remove nodes and depots
         :param depot_coords: the coordaintes of the unique depot to use
-        :param drone: the drone for the feasible trajectories set
-        :return: a copy of the input graph without some nodes
+        :param targets: the targets (indexes) to keep
+        :return: a view of the input graph without some nodes
         """
-        graph = graph.copy()
-        node_indexes_to_remove = []
-
-        # remove other depots from the graph as we don't want to visit them
-        for __depot_coords in self.aoi.depots:
-            if __depot_coords != depot_coords:
-                node_indexes_to_remove.append(self.aoi.node_index(__depot_coords))
-
-        depot_index = self.aoi.node_index(depot_coords)
-        # remove un-reachble nodes for the input drone
-        for n in graph.nodes():
-            if n == depot_index:
-                continue
-            if graph.nodes[n]["weight"] + (2 * graph.edges[depot_index, n]["weight"] / drone.speed) > drone.autonomy:
-                node_indexes_to_remove.append(n)  # remove non reachable nodes (round trip time is too much)
-
-        graph.remove_nodes_from(node_indexes_to_remove)
-        return graph
+        keep = np.zeros(self.aoi.n_targets + self.aoi.n_depots, dtype=bool)
+        keep[list(targets)] = True
+        keep[self.aoi.node_index(depot_coords)] = True
+        return nx.subgraph_view(graph, filter_node=lambda node: bool(keep[node]))
@@ -14,6 +14,10 @@ The main classes are:
     Tours -> a wrapper which represent a tour for a drone.
     Drone -> a drone entity that has a given speed and available energy
     MultiRoundSolution -> An assignment of tours to drones to cover a given set of points
+    SharedAoI -> An AoI published in shared memory, for multiprocess workers (see AoI.share)
+
+All the entities pickle compactly: an AoI as its input data (or as its shared memory handle), a tour as its AoI and
+its graph indexes, a drone as its (stable) id, autonomy and speed.
 
 The core is based on networkx and python3.8.
 The code consider 2d coordinates for point-of-interest (targets); 3D is not supported by this version.
@@ -26,12 +30,37 @@ Notice that any area with no-fly zone can be still considered: the output soluti
 
 """
 
+from multiprocessing import shared_memory
+
 import networkx as nx
+import numpy as np
 import math
 
-from matplotlib import pyplot as plt
 
-from src.util.trajplot import AoIPlotManager, ToursPlotManager
+def plotting():
+    """ lazily import the plotting layer (matplotlib) on the first plot/save request.
+
+        The entities and the algorithms do not depend on matplotlib: headless planners never pay its import time.
+        :return: the module src.util.trajplot
+    """
+    from src.util import trajplot
+    return trajplot
+
+
+def time_stats(first_times, percentiles: tuple = (50, 90, 95, 99)):
+    """
+
+    :param first_times: the first inspection time of each target, np.inf for the targets never inspected
+    :param percentiles: the percentiles to report
+    :return: a dictionary {"covered" : n. of inspected targets, "mean" : mean time, "p50" : 50th percentile, ...}
+                the times are np.nan if no target is inspected
+    """
+    first_times = first_times[np.isfinite(first_times)]
+    stats = {"covered": len(first_times),
+             "mean": float(np.mean(first_times)) if len(first_times) > 0 else np.nan}
+    for p in percentiles:
+        stats["p" + str(p)] = float(np.percentile(first_times, p)) if len(first_times) > 0 else np.nan
+    return stats
 
 
 def euclidean_distance(point1, point2):
@@ -57,7 +86,7 @@ def euclidean_distance(point1, point2):
 class AoI():
 
     def __init__(self, depots: list, target_points: list, width: int, height: int,
-                 node_hovering_time: int = 0, viable_paths: list = None):
+                 node_hovering_time: int = 0, viable_paths: list = None, targets_hovering_times: list = None):
         """
         :param depots: a list of depots (drones base stations) represented as 2D coordinates. E.g., [(x1, y1), (x2, y2), ..., (xn; yn)]
         :param target_points: a list of target points represented as 2D coordinates. E.g., [(x1, y1), (x2, y2), ..., (xn; yn)]
@@ -66,6 +95,8 @@ class AoI():
         :param node_hovering_time: the required hovering time in seconds for each target (default : 0 seconds)
         :param viable_paths : the only paths viables. A path is a tuple of two points. Input e.g., [(p1,p2), (p2,p3), ...]
                             where p1 = (x1, y1). If None all the paths (edegs) between points are considered viable (default: None)
+        :param targets_hovering_times: the hovering time in seconds of each target, in the order of target_points.
+                            If given, it overrides node_hovering_time (default: None)
         """
         # assert no duplicates target points and depots
         assert len(set(target_points)) == len(target_points), "the target points should not have duplicates " \
@@ -80,8 +111,77 @@ class AoI():
         self.n_depots = len(depots)
         self.n_targets = len(target_points)
         self.node_hovering_time = node_hovering_time
+        self.targets_hovering_times = targets_hovering_times
+        assert targets_hovering_times is None or len(targets_hovering_times) == self.n_targets, \
+            "a hovering time is required for each target"
         self.viable_paths = viable_paths
-        self.graph = self.__build_graph()
+        self.__graph = None  # built on demand, see graph
+
+        # coordinates -> graph index (targets have priority on depots with same coordinates)
+        self.__nodes_index = {coords: self.n_targets + i for i, coords in enumerate(self.depots)}
+        self.__nodes_index.update({coords: i for i, coords in enumerate(self.target_points)})
+
+        # dense arrays indexed as the graph nodes (targets first, then depots), built on demand
+        self.__coordinates = None
+        self.__distance_matrix = None
+        self.__hovering_times = None
+        self.__metric_closure = None
+        self.__predecessors = {}  # source node -> the predecessors on its shortest viable paths, built on demand
+        self.shared_handle = None  # the handle of the shared memory arrays, if published or attached (see share)
+
+    @classmethod
+    def from_arrays(cls, depots, target_points, width: int, height: int, targets_hovering_times=None,
+                    viable_paths: list = None, metric_closure=None):
+        """ build an AoI from numpy arrays
+
+        :param depots: a (n_depots x 2) array with the coordinates of the depots
+        :param target_points: a (n_targets x 2) array with the coordinates of the targets
+        :param width: the width of the area of interest
+        :param height: the height of the area of interest
+        :param targets_hovering_times: the hovering time of each target (array), None for no hovering time
+        :param viable_paths: the only viable paths (see the constructor), None if all the paths are viable
+        :param metric_closure: the precomputed shortest path distances (see metric_closure), e.g., in shared memory.
+                                It is used as is, without copy (default None: computed on demand)
+        """
+        def points(array):
+            array = np.asarray(array)
+            if np.issubdtype(array.dtype, np.floating) and np.all(np.mod(array, 1) == 0):
+                array = array.astype(np.int64)  # integral coordinates stay integers, as in the input lists
+            return [tuple(p) for p in array.reshape(-1, 2).tolist()]
+
+        aoi = cls(points(depots), points(target_points), width, height, viable_paths=viable_paths,
+                  targets_hovering_times=None if targets_hovering_times is None
+                  else np.asarray(targets_hovering_times, dtype=float).tolist())
+        aoi.__metric_closure = metric_closure
+        return aoi
+
+    def __reduce__(self):
+        """ compact pickling: only the input data (the graph and the dense arrays are rebuilt on demand).
+            A shared AoI pickles as its shared memory handle: the worker processes reattach to the same arrays.
+        """
+        if self.shared_handle is not None:
+            return attach_aoi, (self.shared_handle,)
+        return AoI, (self.depots, self.target_points, self.width, self.height, self.node_hovering_time,
+                     self.viable_paths, self.targets_hovering_times)
+
+    def share(self):
+        """ publish the arrays of the AoI (coordinates, hovering times and metric closure) in shared memory.
+            After this call, the AoI (and its tours and solutions) pickles as a lightweight handle that worker processes
+            reattach, without copies. The owner must close the returned SharedAoI when the workers are done.
+
+        :return: the owner of the shared memory : SharedAoI
+        """
+        shared = SharedAoI(self)
+        self.shared_handle = shared.handle
+        return shared
+
+    @property
+    def graph(self):
+        """ the networkx graph of the AoI, built on the first access: a large AoI can be used (e.g., coordinates,
+            hovering times, coarsening) without paying for its complete graph """
+        if self.__graph is None:
+            self.__graph = self.__build_graph()
+        return self.__graph
 
     def __build_graph(self):
         """ build the internal represents of the AoI using a graph with networkx module.
@@ -101,7 +201,8 @@ class AoI():
         # add nodes
         for i in range(0, self.n_targets):
             G.nodes[i]["pos"] = self.target_points[i]
-            G.nodes[i]["weight"] = self.node_hovering_time
+            G.nodes[i]["weight"] = self.node_hovering_time if self.targets_hovering_times is None \
+                else self.targets_hovering_times[i]
             G.nodes[i]["depot"] = 0
 
         # add depot with no weight
@@ -123,13 +224,167 @@ class AoI():
         else:
             for viable_edge in self.viable_paths:
                 coord_i, coord_j = viable_edge
-                i, j = all_nodes.index(coord_i), all_nodes.index(coord_j)
+                i, j = self.node_index(coord_i), self.node_index(coord_j)
                 w_ij = euclidean_distance(coord_i, coord_j)
                 G.add_edge(i, j, weight=w_ij)
 
-        # the graph, by construction, should respect the triangle inequality
+        # the graph, by construction, should respect the triangle inequality (if all the paths are viable, otherwise
+        # see metric_closure)
         return G
 
+    def coordinates(self):
+        """ return the 2D coordinates of all the graph nodes as a (n_targets + n_depots) x 2 numpy array (cached) """
+        if self.__coordinates is None:
+            self.__coordinates = np.array(self.target_points + self.depots, dtype=float).reshape(-1, 2)
+        return self.__coordinates
+
+    def viable_edges(self):
+        """ return the viable paths as two arrays of graph indexes (i, j) and the array of their lengths (meters) """
+        ij = np.array([(self.node_index(ci), self.node_index(cj)) for ci, cj in self.viable_paths], dtype=np.int64)
+        ij = ij.reshape(-1, 2)
+        coords = self.coordinates()
+        diff = coords[ij[:, 0]] - coords[ij[:, 1]]
+        return ij[:, 0], ij[:, 1], np.sqrt(diff[:, 0] ** 2 + diff[:, 1] ** 2)
+
+    def distance_matrix(self):
+        """ return the distances (meters) between graph nodes as a (n_targets + n_depots) square numpy array.
+            The matrix[i, j] is the weight of the edge (i, j) of the graph, np.inf if the path is not viable.
+
+            The matrix is computed (vectorized) on the first call and then cached.
+        """
+        if self.__distance_matrix is None:
+            if self.viable_paths is None:
+                if self.__metric_closure is not None:  # e.g., attached from shared memory: same matrix
+                    self.__distance_matrix = self.__metric_closure
+                else:
+                    coords = self.coordinates()
+                    diff = coords[:, np.newaxis, :] - coords[np.newaxis, :, :]
+                    self.__distance_matrix = np.sqrt(diff[:, :, 0] ** 2 + diff[:, :, 1] ** 2)
+            else:
+                nnodes = self.n_targets + self.n_depots
+                self.__distance_matrix = np.full((nnodes, nnodes), np.inf)
+                np.fill_diagonal(self.__distance_matrix, 0)
+                i, j, w_ij = self.viable_edges()
+                np.minimum.at(self.__distance_matrix, (i, j), w_ij)
+                np.minimum.at(self.__distance_matrix, (j, i), w_ij)
+        return self.__distance_matrix
+
+    def path_lengths(self, i, j):
+        """ return the lengths (meters) of the shortest viable paths from the nodes i to the nodes j (arrays of graph
+            indexes) as a numpy array. If all the paths are viable and the dense matrices are not built, the lengths
+            are computed from the coordinates: e.g., the tours of a huge AoI are evaluated without the n x n matrix.
+        """
+        if self.viable_paths is None and self.__distance_matrix is None and self.__metric_closure is None:
+            coords = self.coordinates()
+            diff = coords[i] - coords[j]
+            return np.sqrt(diff[..., 0] ** 2 + diff[..., 1] ** 2)  # as distance_matrix
+        return self.metric_closure()[i, j]
+
+    def closure_rows(self, sources):
+        """ return the rows of the metric closure of the input nodes (graph indexes) as a len(sources) x
+            (n_targets + n_depots) numpy array: the shortest viable paths from the sources, e.g., from the depots.
+            The all-pairs matrix is not built: the rows are computed from the coordinates, or by Dijkstra from the
+            sources on sparse viable paths (unless the closure is already cached, or scipy is not available).
+        """
+        sources = np.atleast_1d(np.asarray(sources, dtype=int))
+        if self.viable_paths is not None and self.__metric_closure is None:
+            matrix = self.__viable_matrix()
+            if matrix is not None:
+                from scipy.sparse.csgraph import shortest_path
+                return shortest_path(matrix, method="D", directed=False, indices=sources).reshape(len(sources), -1)
+        return self.path_lengths(sources[:, np.newaxis], np.arange(self.n_targets + self.n_depots)[np.newaxis, :])
+
+    def metric_closure(self):
+        """ return the shortest path distances (meters) between graph nodes as a (n_targets + n_depots) square numpy
+            array (np.inf if disconnected). If all the paths are viable, it is the distance matrix; otherwise (sparse
+            viable paths, e.g., no-fly zones) the all-pairs shortest paths are computed on the first call and cached:
+            a tour edge (i, j) is flown along the shortest viable path from i to j (see shortest_path).
+
+            It uses scipy (Dijkstra on a sparse matrix) if available, otherwise a vectorized Floyd-Warshall. Only the
+            distances are kept: the predecessors of a source are computed when one of its paths is requested.
+        """
+        if self.__metric_closure is None:
+            if self.viable_paths is None:
+                self.__metric_closure = self.distance_matrix()
+            else:
+                self.__metric_closure = self.__shortest_paths()
+        return self.__metric_closure
+
+    def __viable_matrix(self):
+        """ the viable paths as a sparse (csr) scipy matrix, None if scipy is not available. Duplicated paths (also in
+            opposite directions): the shortest is kept. The sparse matrices sum the duplicated entries, hence the paths
+            are reduced with a minimum before (and the self loops are dropped)
+        """
+        try:
+            from scipy.sparse import coo_matrix
+        except ImportError:
+            return None
+        nnodes = self.n_targets + self.n_depots
+        i, j, w_ij = self.viable_edges()
+        keep = i != j
+        i, j = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+        keys = i * nnodes + j
+        order = np.argsort(keys, kind="stable")
+        keys, w_ij = keys[order], w_ij[keep][order]
+        starts = np.flatnonzero(np.diff(keys, prepend=-1))  # the first entry of each path
+        w_ij = np.minimum.reduceat(w_ij, starts)
+        return coo_matrix((w_ij, (keys[starts] // nnodes, keys[starts] % nnodes)), shape=(nnodes, nnodes)).tocsr()
+
+    def __shortest_paths(self, source: int = None):
+        """ the all-pairs shortest path distances of the viable paths graph or, if a source is given, the predecessors
+            of its shortest paths (predecessors[j] is the node before j on the shortest path from the source to j, -1
+            if none). Without scipy all the predecessors are computed (and cached) at once.
+        """
+        matrix = self.__viable_matrix()
+        if matrix is not None:
+            from scipy.sparse.csgraph import shortest_path
+            if source is None:
+                return shortest_path(matrix, method="D", directed=False)
+            _, predecessors = shortest_path(matrix, method="D", directed=False, indices=source,
+                                            return_predecessors=True)
+            return np.where(predecessors < 0, -1, predecessors).astype(np.int32)
+
+        # Floyd-Warshall: for each intermediate node k, all the pairs are relaxed at once
+        nnodes = self.n_targets + self.n_depots
+        distances = self.distance_matrix().copy()
+        predecessors = None
+        if source is not None:
+            predecessors = np.where(np.isfinite(distances), np.arange(nnodes, dtype=np.int32)[:, np.newaxis], -1)
+            np.fill_diagonal(predecessors, -1)
+        for k in range(nnodes):
+            via_k = distances[:, k, np.newaxis] + distances[np.newaxis, k, :]
+            better = via_k < distances
+            distances = np.where(better, via_k, distances)
+            if predecessors is not None:
+                predecessors = np.where(better, predecessors[np.newaxis, k, :], predecessors).astype(np.int32)
+        if source is None:
+            return distances
+        self.__predecessors.update(enumerate(predecessors))
+        return predecessors[source]
+
+    def shortest_path(self, i: int, j: int) -> list:
+        """ return the nodes [i, ..., j] of the shortest viable path between two graph nodes """
+        if self.viable_paths is None or i == j:
+            return [i, j] if i != j else [i]
+        assert np.isfinite(self.metric_closure()[i, j]), "no viable path between {} and {}".format(i, j)
+        if i not in self.__predecessors:  # e.g., the closure is attached from shared memory: computed as well
+            self.__predecessors[i] = self.__shortest_paths(source=i)
+        predecessors = self.__predecessors[i]
+        path = [j]
+        while path[-1] != i:
+            path.append(int(predecessors[path[-1]]))
+        return path[::-1]
+
+    def hovering_times(self):
+        """ return the hovering time (seconds) of each graph node as a numpy array (0 for depots) """
+        if self.__hovering_times is None:
+            if self.targets_hovering_times is None:
+                targets_hovering = np.full(self.n_targets, self.node_hovering_time, dtype=float)
+            else:
+                targets_hovering = np.array(self.targets_hovering_times, dtype=float).reshape(self.n_targets)
+            self.__hovering_times = np.concatenate((targets_hovering, np.zeros(self.n_depots)))
+        return self.__hovering_times
+
     def __str__(self):
         return "{}x{} Aoi with {} depots and {} target".format(self.width, self.height, self.n_depots, self.n_targets)
 
@@ -142,7 +397,7 @@ class AoI():
         :param labels: if True each viable path (edge) will have a lebel with the weight; Otherwise no labels on edges (default=False)
         :param edges: if True the viable paths/edges will be printed; otherwise only the targets and depots are plotted (default=False)
         """
-        plot_builder = AoIPlotManager(self, labels=labels, edges=edges)
+        plot_builder = plotting().AoIPlotManager(self, labels=labels, edges=edges)
         plot_builder.show()
 
     def save(self, path: str, labels: bool = False, edges: bool = False):
@@ -152,7 +407,7 @@ class AoI():
         :param labels: if True each viable path (edge) will have a lebel with the weight; Otherwise no labels on edges (default=False)
         :param edges: if True the viable paths/edges will be printed; otherwise only the targets and depots are plotted (default=False)
         """
-        plot_builder = AoIPlotManager(self, labels=labels, edges=edges)
+        plot_builder = plotting().AoIPlotManager(self, labels=labels, edges=edges)
         plot_builder.save(path)
 
     def node_index(self, coords: tuple):
@@ -161,13 +416,21 @@ class AoI():
             :param coords : the coordinates of target or depot. e.g., (x1, y1)
             :return an int that correspend to the graph node index
         """
-        if coords in self.target_points:
-            return self.target_points.index(coords)
-        elif coords in self.depots:
-            return self.n_targets + self.depots.index(coords)
+        if coords in self.__nodes_index:
+            return self.__nodes_index[coords]
         else:
             raise ValueError('The input coords does not exist (both in depots and targets)')
 
+    def node_coords(self, index: int):
+        """ return the coordinates of a node of the internal graph structures
+
+            :param index : the graph node index
+            :return the coordinates of the target or depot. e.g., (x1, y1)
+        """
+        if index < self.n_targets:
+            return self.target_points[index]
+        return self.depots[index - self.n_targets]
+
 
 # A tour made of edges
 class Tour:
@@ -200,9 +463,47 @@ class Tour:
 
         self.len_tour_meters = None
         self.hovering_time_tour_seconds = None
+        self.targets_indexes_array = None
 
         self.nnodes = len(self.targets_coords) + 1  # plus depot
 
+    def __init_from_indexes(self, aoi: AoI, edges_w_indexes: list):
+        """ same as the constructor, from the graph indexes: no conversion from coordinates to indexes is needed
+
+        :param aoi: the input AoI where the tour is employed
+        :param edges_w_indexes: a list of tuple e.g., [(node1, node2), (node2, node3), ...]
+                    where each node is the index of graph internal structure node
+        """
+        self.aoi = aoi
+        self.edges_w_indexes = [(int(e0), int(e1)) for e0, e1 in edges_w_indexes]
+        self.edges_w_coords = [(aoi.node_coords(e0), aoi.node_coords(e1)) for e0, e1 in self.edges_w_indexes]
+
+        self.targets_indexes = []  # must be ordered
+        self.targets_coords = []  # must be ordered
+        for (e0, e1), (c0, c1) in zip(self.edges_w_indexes, self.edges_w_coords):
+            if e0 >= aoi.n_targets:
+                self.depot_index = e0
+                self.depot_coord = c0
+            else:
+                self.targets_indexes.append(e0)
+                self.targets_coords.append(c0)
+
+        self.len_tour_meters = None
+        self.hovering_time_tour_seconds = None
+        self.targets_indexes_array = None
+
+        self.nnodes = len(self.targets_coords) + 1  # plus depot
+
+    def __reduce__(self):
+        """ compact pickling: the AoI and the edges as a flat tuple of graph indexes """
+        return _tour_from_flat_indexes, (self.aoi, tuple(node for edge in self.edges_w_indexes for node in edge))
+
+    def targets_array(self):
+        """ return the ordered indexes of the targets as a numpy array (cached) """
+        if self.targets_indexes_array is None:
+            self.targets_indexes_array = np.array(self.targets_indexes, dtype=int)
+        return self.targets_indexes_array
+
     def time_tour(self, speed: float):
         """
             speed : m/s speed of drones to computer the required time to complete the tour
@@ -216,9 +517,10 @@ class Tour:
             return the len of the tour (meters)
         """
         if self.len_tour_meters is None:
+            edges = np.array(self.edges_w_indexes, dtype=int).reshape(-1, 2)
             tlen = 0
-            for edge in self.edges_w_indexes:
-                tlen += self.aoi.graph.edges[edge[0], edge[1]]['weight']
+            for length in self.aoi.path_lengths(edges[:, 0], edges[:, 1]).tolist():  # shortest viable paths
+                tlen += length
             self.len_tour_meters = tlen
 
         return self.len_tour_meters
@@ -228,9 +530,10 @@ class Tour:
             return the total hovevering time for the tour (seconds)
         """
         if self.hovering_time_tour_seconds is None:
+            hovering = self.aoi.hovering_times()
             hlen = 0
             for edge in self.edges_w_indexes:
-                hlen += self.aoi.graph.nodes[edge[1]]['weight']
+                hlen += hovering[edge[1]]
             self.hovering_time_tour_seconds = hlen
 
         return self.hovering_time_tour_seconds
@@ -255,8 +558,20 @@ class Tour:
 
                 node1 is in self.aoi.graph.nodes
         """
-        return cls(aoi, [(aoi.graph.nodes[x[0]]["pos"], aoi.graph.nodes[x[1]]["pos"])
-                            for x in edges_w_indexes])
+        tour = cls.__new__(cls)
+        tour.__init_from_indexes(aoi, edges_w_indexes)
+        return tour
+
+    @classmethod
+    def from_ordered_nodes(cls, aoi: AoI, nodes: list):
+        """ build a closed tour that visits the given nodes in order and comes back to the first one
+
+        :param aoi: the input AoI where the tour is employed
+        :param nodes: the ordered graph indexes of the tour, starting from the depot e.g., [depot, node1, node2, ...]
+                    the tour is [(depot, node1), (node1, node2), ..., (nodeN, depot)]
+        """
+        nodes = list(nodes)
+        return cls.from_graph_indexes(aoi, list(zip(nodes, nodes[1:] + nodes[:1])))
 
     def inspection_times(self, speed: float):
         """ return the inspection times for each target,
@@ -264,15 +579,24 @@ class Tour:
 
             return a list of inspection times (ordered)
         """
+        edges = np.array(self.edges_w_indexes, dtype=int).reshape(-1, 2)
+        lengths, hovering = self.aoi.path_lengths(edges[:, 0], edges[:, 1]), self.aoi.hovering_times()
         times = []
         time_cost = 0
         for i in range(len(self.edges_w_indexes) - 1):  # last edge don't partecipates
             edge = self.edges_w_indexes[i]
-            time_cost += (self.aoi.graph.edges[edge[0], edge[1]]['weight'] / speed
-                          + self.aoi.graph.nodes[edge[1]]["weight"])
+            time_cost += (lengths[i] / speed
+                          + hovering[edge[1]])
             times.append(time_cost)
         return times
 
+    def viable_edges(self):
+        """ return the edges actually flown: each edge of the tour expanded along its shortest viable path
+            (the same edges if all the paths are viable). e.g., [(depot, node1), (node1, x), (x, node2), ...]
+        """
+        return [(path[k], path[k + 1]) for e0, e1 in self.edges_w_indexes
+                for path in [self.aoi.shortest_path(e0, e1)] for k in range(len(path) - 1)]
+
     def __str__(self):
         out = "Tour w depot: "
         out += str(self.depot_coord) + ", nodes: "
@@ -290,21 +614,133 @@ class Tour:
             return self.edges_w_indexes == other.edges_w_indexes
 
 
+"""
+A batch of tours, stored as flat arrays of graph indexes, to evaluate their costs for many speeds at once (vectorized)
+"""
+class TourBatch:
+
+    def __init__(self, aoi: AoI, tours: list):
+        """
+        :param aoi: the input AoI where all the tours are employed
+        :param tours: a collection of tours : trajenties.Tour on the input aoi
+        """
+        self.aoi = aoi
+        self.tours = list(tours)
+        self.ntours = len(self.tours)
+
+        # flat edges of all the tours, the edges of the i-th tour are in [offsets[i], offsets[i+1])
+        nedges = np.array([len(tour.edges_w_indexes) for tour in self.tours], dtype=int)
+        self.offsets = np.concatenate(([0], np.cumsum(nedges)))
+        edges = np.array([edge for tour in self.tours for edge in tour.edges_w_indexes], dtype=int).reshape(-1, 2)
+        self.edge_tour = np.repeat(np.arange(self.ntours), nedges)  # the tour of each flat edge
+
+        self.edge_dst = edges[:, 1]
+        self.edge_len = self.aoi.path_lengths(edges[:, 0], edges[:, 1])  # meters, along the viable paths
+        self.edge_hovering = self.aoi.hovering_times()[edges[:, 1]]  # seconds, hovering on the arrival node
+
+        self.len_tours = np.bincount(self.edge_tour, weights=self.edge_len, minlength=self.ntours)
+        self.hovering_time_tours = np.bincount(self.edge_tour, weights=self.edge_hovering, minlength=self.ntours)
+
+    def completion_times(self, speeds):
+        """ return the time (seconds) to complete each tour, including hovering, for each speed
+
+        :param speeds: a speed or a vector of speeds (m/s)
+        :return: a numpy matrix ntours x nspeeds, where matrix[i, s] = tours[i].time_tour(speeds[s])
+        """
+        speeds = np.atleast_1d(np.asarray(speeds, dtype=float))
+        return self.len_tours[:, np.newaxis] / speeds[np.newaxis, :] + self.hovering_time_tours[:, np.newaxis]
+
+    def __cumulative_costs(self, edge_hovering=None):
+        """ return the cumulative len and hovering time of each flat edge along its tour,
+            i.e., the global cumsum minus the cumsum at the start of the tour
+
+            edge_hovering : the hovering time of each flat edge, if None the hovering times of the AoI
+        """
+        cum_len = np.cumsum(self.edge_len)
+        cum_hovering = np.cumsum(self.edge_hovering if edge_hovering is None else edge_hovering)
+        start = self.offsets[:-1][self.edge_tour]
+        cum_len -= np.concatenate(([0], cum_len))[start]
+        cum_hovering -= np.concatenate(([0], cum_hovering))[start]
+        return cum_len, cum_hovering
+
+    def __inspections(self):
+        """ return a mask of the flat edges that end on an inspection (the last edge goes back to the depot)
+            and the number of inspections of each tour
+        """
+        is_inspection = np.ones(len(self.edge_len), dtype=bool)
+        is_inspection[self.offsets[1:][self.offsets[1:] > 0] - 1] = False
+        ninspections = np.maximum(np.diff(self.offsets) - 1, 0)
+        return is_inspection, ninspections
+
+    def inspection_times(self, speeds):
+        """ return the inspection times of the targets of each tour, for each speed
+
+        :param speeds: a speed or a vector of speeds (m/s)
+        :return: a ragged list of ntours numpy matrices, where the i-th matrix has shape
+                    (number of targets of tours[i]) x nspeeds and its column s is tours[i].inspection_times(speeds[s])
+        """
+        speeds = np.atleast_1d(np.asarray(speeds, dtype=float))
+        cum_len, cum_hovering = self.__cumulative_costs()
+        times = cum_len[:, np.newaxis] / speeds[np.newaxis, :] + cum_hovering[:, np.newaxis]
+        is_inspection, ninspections = self.__inspections()
+        return np.split(times[is_inspection], np.cumsum(ninspections)[:-1])
+
+    def paired_times(self, tour_speeds, tour_hovering=None):
+        """ evaluate each tour with its own speed (e.g., the speed of the drone that flies it)
+
+        :param tour_speeds: a vector with the speed (m/s) of each tour
+        :param tour_hovering: a vector with the hovering time (seconds) on each target of each tour, np.nan to use
+                    the hovering times of the AoI. If None the hovering times of the AoI are used (default None)
+        :return: a tuple (completion times, inspected targets, inspection times, inspection tours):
+                    completion times -> the time to complete each tour (ntours,)
+                    inspected targets -> the flat graph indexes of the inspected targets of all the tours
+                    inspection times -> the flat inspection times, w.r.t. the start of their tour
+                    inspection tours -> the index of the tour of each flat inspection
+        """
+        tour_speeds = np.asarray(tour_speeds, dtype=float)
+        is_inspection, _ = self.__inspections()
+        edge_hovering, hovering_time_tours = self.edge_hovering, self.hovering_time_tours
+        if tour_hovering is not None:
+            edge_hovering = np.asarray(tour_hovering, dtype=float)[self.edge_tour]
+            edge_hovering = np.where(np.isnan(edge_hovering), self.edge_hovering, edge_hovering * is_inspection)
+            hovering_time_tours = np.bincount(self.edge_tour, weights=edge_hovering, minlength=self.ntours)
+
+        completion = self.len_tours / tour_speeds + hovering_time_tours
+        cum_len, cum_hovering = self.__cumulative_costs(edge_hovering)
+        edge_tour = self.edge_tour[is_inspection]
+        times = cum_len[is_inspection] / tour_speeds[edge_tour] + cum_hovering[is_inspection]
+        return completion, self.edge_dst[is_inspection], times, edge_tour
+
+    def evaluate(self, speeds):
+        """ return both the completion times matrix and the ragged inspection times (see above methods) """
+        return self.completion_times(speeds), self.inspection_times(speeds)
+
+
+def _tour_from_flat_indexes(aoi: AoI, flat_indexes: tuple) -> Tour:
+    """ Internal use - unpickle a tour: the edges are the pairs of the flat tuple of graph indexes """
+    return Tour.from_graph_indexes(aoi, list(zip(flat_indexes[0::2], flat_indexes[1::2])))
+
+
 """ a utility class to represent a drone """
 class Drone():
     obj_id = 0
 
-    def __init__(self, autonomy : int, speed : float):
+    def __init__(self, autonomy : int, speed : float, id=None):
         """
         :param autonomy: the autonomy in seconds for the drones
         :param speed: the average speed of drone (m/s). This versione does not support acceleration/deceleration
+        :param id: the explicit, stable, id of the drone (e.g., in multiprocess workers or services). If None, a unique
+                    id of this process is used (default None)
         """
-        self.__id()
+        self.__id(id)
         self.autonomy = autonomy
         self.speed = speed
 
-    def __id(self):
+    def __id(self, id=None):
         """ set a unique for the obj """
+        if id is not None:
+            self.id = id
+            return
         self.id = Drone.obj_id
         Drone.obj_id += 1
 
@@ -325,10 +761,16 @@ class Drone():
         return hash(self.id)
 
 """
-A utility class to create the multi round solution round by round, drone by drone, iteratively 
+A utility class to create the multi round solution round by round, drone by drone, iteratively.
+The coverage state (visits of each target in each round, first round of each target and objective values)
+is updated at each append/pop of a tour, only on the targets of the tour: build() does not scan the tours
+and pop_tour/undo are cheap moves for search algorithms.
 """
 class MultiRoundSolutionBuilder:
 
+    # the first round of the targets never covered, while building
+    NOT_COVERED = np.iinfo(np.int64).max
+
     def __init__(self, aoi : AoI):
         """
 
@@ -338,6 +780,43 @@ class MultiRoundSolutionBuilder:
         self.drone_and_tours = {}  # internal structure that save for each drone its tours ordered (from first to last round)
         self.drones = set()
 
+        # running coverage state
+        self.round_visits = np.zeros((aoi.n_targets, 0), dtype=np.int32)  # visits of each target in each round
+        self.targets_visits = np.zeros(aoi.n_targets, dtype=int)
+        self.targets_first_round = np.full(aoi.n_targets, self.NOT_COVERED, dtype=np.int64)
+        self.n_covered = 0  # the number of covered targets
+        self.sum_first_rounds = 0  # the sum of the first rounds of the covered targets
+        self.history = []  # the drones in order of append, for undo
+
+    @property
+    def max_rounds(self):
+        """ the number of rounds of the solution (the max number of tours of a drone) """
+        return max([len(tours) for tours in self.drone_and_tours.values()], default=0)
+
+    def __update(self, targets, round : int, sign : int):
+        """ add (sign = 1) or remove (sign = -1) a visit of the targets in the round, and update the first rounds """
+        targets = np.unique(targets)  # a target visited more times by a tour is a single visit (and covered once)
+        if round >= self.round_visits.shape[1]:  # double the rounds
+            grown = np.zeros((self.aoi.n_targets, max(2 * self.round_visits.shape[1], round + 1)), dtype=np.int32)
+            grown[:, :self.round_visits.shape[1]] = self.round_visits
+            self.round_visits = grown
+        self.round_visits[targets, round] += sign
+        self.targets_visits[targets] += sign
+
+        old_first = self.targets_first_round[targets]
+        if sign > 0:
+            changed = targets[old_first > round]
+            new_first = np.full(len(changed), round, dtype=np.int64)
+        else:  # only the targets first covered in the round, and no more visited in the round, change
+            changed = targets[(old_first == round) & (self.round_visits[targets, round] == 0)]
+            visited = self.round_visits[changed] > 0
+            new_first = np.where(visited.any(axis=1), visited.argmax(axis=1), self.NOT_COVERED)
+        old_first = self.targets_first_round[changed]
+        was_covered, is_covered = old_first != self.NOT_COVERED, new_first != self.NOT_COVERED
+        self.n_covered += int(np.count_nonzero(is_covered)) - int(np.count_nonzero(was_covered))
+        self.sum_first_rounds += int(new_first[is_covered].sum()) - int(old_first[was_covered].sum())
+        self.targets_first_round[changed] = new_first
+
     def add_drone(self, drone : Drone):
         """
         Add a drone in the solution without tours
@@ -359,7 +838,9 @@ class MultiRoundSolutionBuilder:
         :return: the object itself
         """
         assert drone in self.drone_and_tours, "drone does not exist in the multi-round solution"
+        self.__update(tour.targets_array(), len(self.drone_and_tours[drone]), 1)
         self.drone_and_tours[drone].append(tour)  # list of tours, empty at the beginning
+        self.history.append(drone)
         return self
 
     def add_drone_with_tours(self, drone: Drone, tours : list):
@@ -370,14 +851,59 @@ class MultiRoundSolutionBuilder:
         :param tours: all the ordered tours of the drone
         :return: the object itself
         """
-        assert drone not in self.drone_and_tours, "drone already exist in the multi-round solution"
-        self.drones.add(drone)
-        self.drone_and_tours[drone] = list(tours)  # list of tours, empty at the beginning
+        self.add_drone(drone)
+        for tour in tours:
+            self.append_tour(drone, tour)
         return self
 
+    def pop_tour(self, drone: Drone) -> Tour:
+        """
+        Remove the tour of the last round of the drone
+
+        :param drone: the drone
+        :return: the removed tour
+        """
+        assert len(self.drone_and_tours.get(drone, [])) > 0, "the drone has no tours"
+        tour = self.drone_and_tours[drone].pop()
+        self.__update(tour.targets_array(), len(self.drone_and_tours[drone]), -1)
+        # remove the last append of the drone from the history
+        self.history.pop(len(self.history) - 1 - self.history[::-1].index(drone))
+        return tour
+
+    def undo(self):
+        """
+        Remove the last appended tour (of any drone)
+
+        :return: a tuple (drone, removed tour)
+        """
+        assert len(self.history) > 0, "no tour to undo"
+        drone = self.history[-1]
+        return drone, self.pop_tour(drone)
+
+    def coverage_score(self):
+        """ return the number of covered target points, so far """
+        return self.n_covered
+
+    def cumulative_coverage_score(self, rounds: int = None):
+        """ return the cumulative coverage so far (see MultiRoundSolution.cumulative_coverage_score)
+
+        :param rounds: the horizon of the sum, default the rounds of the solution so far
+        """
+        rounds = self.max_rounds if rounds is None else rounds
+        if rounds >= self.max_rounds:
+            return rounds * self.n_covered - self.sum_first_rounds
+        first_rounds = self.targets_first_round[self.targets_first_round < rounds]
+        return int(np.sum(rounds - first_rounds))
+
+    def new_targets_on_round(self, round: int):
+        """ return the indexes of the targets covered for the first time in the round, so far """
+        return np.flatnonzero(self.targets_first_round == round)
+
     def build(self):
-        """ effectively build the MultiRoundSolution object """
-        return MultiRoundSolution(self)
+        """ effectively build the MultiRoundSolution object, from the running coverage state """
+        max_rounds = self.max_rounds
+        return MultiRoundSolution(self, targets_first_round=np.minimum(self.targets_first_round, max_rounds).astype(int),
+                                  targets_visits=self.targets_visits.copy())
 
 
 """
@@ -385,47 +911,55 @@ A utility class to store/save and get metrics of a multi round solution over a g
 """
 class MultiRoundSolution:
 
-    def __init__(self, builder : MultiRoundSolutionBuilder):
+    def __init__(self, builder : MultiRoundSolutionBuilder, targets_first_round=None, targets_visits=None):
         """
         Do not use this method, only internal use. Please refer to builder.
 
         :param builder: the builder with all data, tours and depot.
+        :param targets_first_round: the precomputed first round of inspection of each target (e.g., by the pruning).
+                    If None, it is taken from the running state of the builder (default None)
+        :param targets_visits: the precomputed number of visits of each target, required with targets_first_round
         """
         self.aoi = builder.aoi
-        self.drones = builder.drones
-        self.drone_and_tours = builder.drone_and_tours
+        self.drones = set(builder.drones)
+        # a copy: the builder can go on (e.g., undo) without changing the solution
+        self.drone_and_tours = {drone: list(tours) for drone, tours in builder.drone_and_tours.items()}
         self.ndrones = len(self.drone_and_tours.keys())  # the number of drone used in the solution
-        self.max_rounds = 0
+        self.max_rounds = max([len(tours) for tours in self.drone_and_tours.values()], default=0)
 
-        self.covered_graph_nodes = set()  # all the indexes of the nodes graph that are covered by some tour/drone
-        self.covered_graph_targets = set()  # all the indexes of the targets that are covered by some tour/drone
-
-        for drone in self.drone_and_tours.keys():
-            self.max_rounds = max(self.max_rounds, len(self.drone_and_tours[drone]))
-            for tour in self.drone_and_tours[drone]:
-                for e0, e1 in tour.edges_w_indexes:
-                    self.covered_graph_nodes.add(e0)
-                    coords_e0 = self.aoi.graph.nodes[e0]["pos"]
-                    if coords_e0 not in self.aoi.depots:  # skip depots
-                        self.covered_graph_targets.add(coords_e0)
-
-        self.__targets_covered_on_each_round()
-
-    def __targets_covered_on_each_round(self):
-        """ compute and fill:
-                self.targets_covered_on_each_round
-        """
-        self.targets_covered_on_each_round = dict()
-        already_visited = set()
-        for round in range(self.max_rounds):
-            self.targets_covered_on_each_round[round] = set()
-            for drone in self.drone_and_tours.keys():
-                if round >= len(self.drone_and_tours[drone]):  # the drone does not use all the rounds
-                    continue
-                for t in self.drone_and_tours[drone][round].targets_coords:
-                    if t not in already_visited:
-                        self.targets_covered_on_each_round[round].add(t)
-                        already_visited.add(t)
+        # index based metrics: for each target the first round of inspection (max_rounds if never covered)
+        # and the number of visits in the whole solution
+        if targets_first_round is None:
+            self.targets_first_round = np.minimum(builder.targets_first_round, self.max_rounds).astype(int)
+            self.targets_visits = builder.targets_visits.copy()
+        else:
+            self.targets_first_round, self.targets_visits = targets_first_round, targets_visits
+
+        # set based views, built on demand
+        self.__covered_graph_nodes = None
+        self.__targets_covered_on_each_round = None
+
+    @property
+    def covered_graph_nodes(self):
+        """ all the indexes of the nodes graph (targets and depots) that are covered by some tour/drone """
+        if self.__covered_graph_nodes is None:
+            self.__covered_graph_nodes = {e0 for tours in self.drone_and_tours.values()
+                                          for tour in tours for e0, e1 in tour.edges_w_indexes}
+        return self.__covered_graph_nodes
+
+    @property
+    def covered_graph_targets(self):
+        """ all the indexes of the targets that are covered by some tour/drone """
+        return set(np.flatnonzero(self.targets_first_round < self.max_rounds).tolist())
+
+    @property
+    def targets_covered_on_each_round(self):
+        """ a dictionary {round : set of the indexes of the targets covered for the first time in that round} """
+        if self.__targets_covered_on_each_round is None:
+            self.__targets_covered_on_each_round = {round: set() for round in range(self.max_rounds)}
+            for target in np.flatnonzero(self.targets_first_round < self.max_rounds).tolist():
+                self.__targets_covered_on_each_round[int(self.targets_first_round[target])].add(target)
+        return self.__targets_covered_on_each_round
 
     def __plot(self, title=None):
         """ plot the multi-round solution """
@@ -438,10 +972,11 @@ class MultiRoundSolution:
                 tours.append(tour)
                 tour_labels.append(str(drone) + " Round " + str(round_counter))
 
+        trajplot = plotting()
         if title is None:
-            plotter = ToursPlotManager(self.aoi, tours, labels=True, tour_labels=tour_labels)
+            plotter = trajplot.ToursPlotManager(self.aoi, tours, labels=True, tour_labels=tour_labels)
         else:
-            plotter = ToursPlotManager(self.aoi, tours, title=title, labels=True, tour_labels=tour_labels)
+            plotter = trajplot.ToursPlotManager(self.aoi, tours, title=title, labels=True, tour_labels=tour_labels)
         return plotter
 
     def plot(self, title=None):
@@ -462,29 +997,181 @@ class MultiRoundSolution:
         plotter = self.__plot(title)
         plotter.save(path)
 
+    def to_dict(self, rounds: int = None):
+        """ serialize the assignment and its metrics as a json-friendly dictionary:
+            {"coverage" : .., "cumulative_coverage" : .., "rounds" : ..,
+             "assignment" : [{"drone" : drone id, "tours" : [[depot, target1, target2, ...], ...]}, ...]}
+            where each tour is the ordered list of its graph indexes, starting from the depot (empty if the round is not used)
+
+        :param rounds: the horizon of the cumulative coverage (e.g., the max number of rounds of the algorithm, since
+                        the pruning may drop the last rounds), default the rounds of the solution
+        """
+        assignment = []
+        for drone in self.drone_and_tours.keys():
+            tours = [[tour.depot_index] + list(tour.targets_indexes) if len(tour.edges_w_indexes) > 0 else []
+                     for tour in self.drone_and_tours[drone]]
+            assignment.append({"drone": drone.id, "tours": tours})
+        return {"coverage": self.coverage_score(),
+                "cumulative_coverage": self.cumulative_coverage_score(rounds),
+                "rounds": self.max_rounds,
+                "assignment": assignment}
+
     def coverage_score(self):
         """ return the number of covered target points """
-        return len(self.covered_graph_targets)
+        return int(np.count_nonzero(self.targets_first_round < self.max_rounds))
+
+    def coverage_on_each_round(self):
+        """ return a numpy array with the number of targets covered for the first time in each round """
+        covered = self.targets_first_round[self.targets_first_round < self.max_rounds]
+        return np.bincount(covered, minlength=self.max_rounds)
+
+    def cumulative_coverage(self):
+        """ return a numpy array with the number of targets covered up to each round """
+        return np.cumsum(self.coverage_on_each_round())
+
+    def cumulative_coverage_score(self, rounds: int = None):
+        """ return the cumulative coverage, i.e., the sum of the targets covered up to each round (AC objective)
+
+        :param rounds: the horizon of the sum (e.g., the max number of rounds of the algorithm, since the pruning
+                        may drop the last rounds), default the rounds of the solution
+        """
+        rounds = self.max_rounds if rounds is None else rounds
+        first_rounds = self.targets_first_round[self.targets_first_round < min(rounds, self.max_rounds)]
+        return int(np.sum(rounds - first_rounds))
+
+    def first_inspection_times(self, speeds: dict = None):
+        """ return the time of the first inspection of each target (np.inf if never covered).
+            Each drone flies its tours back to back, from the first to the last round, starting at time 0.
+
+        :param speeds: a dictionary {drone : speed (m/s)} to override the speed of the drones (default: drone.speed)
+        :return: a numpy array with the first inspection time (seconds) of each target
+        """
+        tours, tour_speeds, tour_drones = [], [], []
+        for idrone, drone in enumerate(self.drone_and_tours.keys()):
+            speed = drone.speed if speeds is None or drone not in speeds else speeds[drone]
+            for tour in self.drone_and_tours[drone]:
+                tours.append(tour)
+                tour_speeds.append(speed)
+                tour_drones.append(idrone)
+
+        first_times = np.full(self.aoi.n_targets, np.inf)
+        if len(tours) == 0:
+            return first_times
+        completion, targets, times, inspection_tours = TourBatch(self.aoi, tours).paired_times(tour_speeds)
+
+        # start time of each tour: the completion of the previous tours of the same drone
+        tour_drones = np.array(tour_drones)
+        cum_completion = np.cumsum(completion)
+        first_tour_of_drone = np.searchsorted(tour_drones, tour_drones)
+        start = cum_completion - completion - (cum_completion - completion)[first_tour_of_drone]
+
+        np.minimum.at(first_times, targets, start[inspection_tours] + times)
+        return first_times
+
+    def inspection_time_stats(self, speeds: dict = None, percentiles: tuple = (50, 90, 95, 99)):
+        """ return statistics of the first inspection times of the covered targets
+
+        :param speeds: a dictionary {drone : speed (m/s)} to override the speed of the drones (default: drone.speed)
+        :param percentiles: the percentiles to report
+        :return: a dictionary {"covered" : n. of covered targets, "mean" : mean time, "p50" : 50th percentile, ...}
+                    the times are np.nan if no target is covered
+        """
+        return time_stats(self.first_inspection_times(speeds), percentiles)
 
     def plot_cumulative_coverage_for_round(self, title="Cumulative Coverage"):
         """ plot the cumulative round coverage """
-        x = []
-        y = []
-        all_covered_up_to_round = 0
-        for round in range(self.max_rounds):
-            cov_on_that_round = len(self.targets_covered_on_each_round[round])
-            all_covered_up_to_round += cov_on_that_round
-            # data for plot
-            x.append(round + 1)
-            y.append(all_covered_up_to_round)
+        x = list(range(1, self.max_rounds + 1))
+        y = self.cumulative_coverage().tolist()
 
         print(title, "cum-coverage for rounds:")
         print(x)
         print(y)
         print("----")
-        plt.plot(x, y)
-        plt.ylabel("Cumulative Coverage")
-        plt.xlabel("Round i-th")
-        plt.title(title)
-        plt.show()
+        plotting().plot_cumulative_coverage(x, y, title)
+
+
+
+# -----------------------------------------------------------#
+#
+#                    SHARED MEMORY
+#
+# -----------------------------------------------------------#
+
+# the AoIs attached by this process, by shared memory name (a worker attaches each AoI once)
+_attached_aois = {}
+
+
+""" The picklable handle of an AoI published in shared memory """
+class SharedAoIHandle:
+
+    def __init__(self, name: str, n_targets: int, n_depots: int, width: int, height: int, viable_paths: list = None):
+        """
+        :param name: the name of the shared memory block with the arrays of the AoI
+        :param n_targets: the number of targets
+        :param n_depots: the number of depots
+        :param width: the width of the area of interest
+        :param height: the height of the area of interest
+        :param viable_paths: the viable paths of the AoI (None if all the paths are viable)
+        """
+        self.name = name
+        self.n_targets = n_targets
+        self.n_depots = n_depots
+        self.width = width
+        self.height = height
+        self.viable_paths = viable_paths
+
+    def arrays(self, buffer):
+        """ the views (coordinates, hovering times, metric closure) of the AoI arrays on the shared buffer """
+        nnodes = self.n_targets + self.n_depots
+        block = np.ndarray((nnodes * (nnodes + 3),), dtype=np.float64, buffer=buffer)
+        coordinates = block[:2 * nnodes].reshape(nnodes, 2)
+        hovering = block[2 * nnodes:3 * nnodes]
+        distances = block[3 * nnodes:].reshape(nnodes, nnodes)
+        return coordinates, hovering, distances
+
+    def attach(self):
+        """ the AoI on the shared memory, attached once per process """
+        return attach_aoi(self)
+
+
+def attach_aoi(handle: SharedAoIHandle) -> AoI:
+    """ attach (once per process) the AoI published in shared memory with the input handle """
+    if handle.name not in _attached_aois:
+        memory = shared_memory.SharedMemory(name=handle.name)
+        coordinates, hovering, distances = handle.arrays(memory.buf)
+        aoi = AoI.from_arrays(coordinates[handle.n_targets:], coordinates[:handle.n_targets], handle.width,
+                              handle.height, hovering[:handle.n_targets], handle.viable_paths, distances)
+        aoi.shared_handle = handle
+        _attached_aois[handle.name] = (memory, aoi)  # the memory must stay open as long as the AoI is used
+    return _attached_aois[handle.name][1]
+
+
+""" The owner of an AoI published in shared memory: it must be closed when the workers are done """
+class SharedAoI:
+
+    def __init__(self, aoi: AoI):
+        """
+        :param aoi: the AoI to publish (see AoI.share)
+        """
+        nnodes = aoi.n_targets + aoi.n_depots
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, nnodes * (nnodes + 3) * 8))
+        self.handle = SharedAoIHandle(self.memory.name, aoi.n_targets, aoi.n_depots, aoi.width, aoi.height,
+                                      aoi.viable_paths)
+        coordinates, hovering, distances = self.handle.arrays(self.memory.buf)
+        coordinates[:] = aoi.coordinates()
+        hovering[:] = aoi.hovering_times()
+        distances[:] = aoi.metric_closure()
+        self.aoi = aoi
+
+    def close(self):
+        """ release the shared memory: the AoI pickles again with its data """
+        self.aoi.shared_handle = None
+        _attached_aois.pop(self.handle.name, None)
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -9,15 +9,21 @@ This files is intended to have some test case and example of code execution.
 """
 
 from src.entities.trajenties import AoI, Tour, Drone, MultiRoundSolutionBuilder
-from src.util import config, utility
+from src.util import config, utility, generator
 from src.util.trajplot import ToursPlotManager
-from src.algorithms.optimal import CumulativeCoverageModel, TotalCoverageModel
+from src.algorithms.optimal import CumulativeCoverageModel, TotalCoverageModel, RollingHorizonCoverage
 from src.algorithms.approxalg import CumulativeGreedyCoverage, TotalGreedyCoverage
 from src.algorithms.trajbuilder import DroneTrajGeneration
+from src.util.sweep import SweepRunner, run_cell
+from src.util.checkpoint import Checkpoint, compute_tour_pools, tours_arrays
 
 from argparse import ArgumentParser
 
 import numpy as np
+import subprocess
+import tempfile
+import time
+import sys
 
 
 def build_random_tour(aoi : AoI, depot_coords : tuple, ntargets_tour : int, seed:int=None):
@@ -45,6 +51,17 @@ def build_random_tour(aoi : AoI, depot_coords : tuple, ntargets_tour : int, seed
     edges_tour = utility.build_tour_from_ordered_nodes([depot_coords] + list_of_targets)
     return Tour.from_coordinates(aoi, edges_tour)
 
+
+def inspect_shared_aoi(aoi : AoI, tour : Tour, drone : Drone):
+    """
+     run in a worker process: return what the worker sees of the AoI, the tour and the drone it received
+
+    :return: a tuple (shared memory name, metric closure, tour edges, tour length, drone id, drone hash)
+    """
+    handle = aoi.shared_handle
+    return (None if handle is None else handle.name, np.array(aoi.metric_closure()), tour.edges_w_indexes,
+            tour.len_tour(), drone.id, hash(drone))
+
 def test1(plot=True):
     """ run the first code example (test)
         - it builds a AoI with random n-target points and x depots
@@ -379,6 +396,723 @@ def test7():
     mrs.save_plot(config.PATH_EXAMPLE_PLOTS + "test7_AC_mrs.png")  # for big istances (over 200/300 points) remove this plot
 
 
+def test8(runs=5):
+    """
+        benchmark the import time of the core modules (entities, utilities and algorithms).
+        Each module is imported in a fresh python interpreter, to avoid any cached module.
+        Print the average import time and whether matplotlib has been loaded (it should not: plotting is lazy)
+
+        runs : the number of fresh imports for each module
+    """
+    core_modules = ["src.entities.trajenties",
+                    "src.util.utility",
+                    "src.algorithms.trajbuilder",
+                    "src.algorithms.approxalg"]
+    code = "import time, sys, importlib\n" \
+           "t0 = time.perf_counter()\n" \
+           "importlib.import_module(sys.argv[1])\n" \
+           "print(time.perf_counter() - t0, 'matplotlib' in sys.modules)"
+
+    # ------------------------------------------------------------------------------------------------------
+    for module in core_modules:
+        times = []
+        matplotlib_loaded = False
+        for i in range(runs):
+            out = subprocess.run([sys.executable, "-c", code, module], capture_output=True, text=True, check=True)
+            elapsed, loaded = out.stdout.split()
+            times.append(float(elapsed))
+            matplotlib_loaded |= loaded == "True"
+        print(module, "import time: {:.1f} ms (avg on {} runs) - matplotlib loaded: {}".format(
+            1000 * np.mean(times), runs, matplotlib_loaded))
+
+
+def test9():
+    """
+        run a small parameter sweep of TC-GaP and AC-GaP (seeds x targets x fleets x rounds) on a pool of processes.
+        The rows are streamed to a csv file: run it again to see that the completed cells are skipped (resume).
+    """
+    grid = {"algorithm": ["TC-GaP", "AC-GaP"],
+            "seed": [50, 51, 52],
+            "n_targets": [30, 50],
+            "fleet": [[(1500, 8), (1500, 16)],
+                      [(1500, 8), (1500, 16), (3000, 8)]],
+            "max_rounds": [3, 4]}
+
+    # ------------------------------------------------------------------------------------------------------
+    runner = SweepRunner(grid, config.PATH_EXAMPLE_SWEEP, timeout=120, retries=1)
+    executed = runner.run()
+    print("Executed", executed, "cells of", len(runner.cells()), "- rows in", config.PATH_EXAMPLE_SWEEP)
+
+
+def test10(epsilons=(0.5, 0.1, 0.01), seeds=5):
+    """
+        benchmark the stochastic greedy ("lazier than lazy greedy") against the deterministic TC-GaP and AC-GaP
+        on large candidate pools (tens of thousands of tours for each drone).
+        Print, for each epsilon, the sample size, the objective (mean and min over the seeds) and the mean runtime
+
+        epsilons : the accuracies of the stochastic greedy
+        seeds : the number of seeds of each stochastic run
+    """
+    max_rounds = 6
+
+    # ------------------------------------------------------------------------------------------------------
+    # build a clustered AoI, the drones and their (large) candidate pools
+    aoi = generator.random_aoi(3000, 3000, 300, 2, layout="clusters", hovering_time=5, seed=50)
+    drones = [Drone(1500, 10), Drone(1200, 12), Drone(1800, 8)]
+    trajectories_builder = DroneTrajGeneration(aoi)
+    uavs_to_tours = {drone: trajectories_builder.compute_trajectories(drone, aoi.depots[i % aoi.n_depots])
+                     for i, drone in enumerate(drones)}
+    print("Candidate tours:", sum(len(tours) for tours in uavs_to_tours.values()))
+
+    # ------------------------------------------------------------------------------------------------------
+    for name, algorithm_class in (("TC-GaP", TotalGreedyCoverage), ("AC-GaP", CumulativeGreedyCoverage)):
+        alg = algorithm_class(aoi, uavs_to_tours, max_rounds, debug=False)
+        t_start = time.perf_counter()
+        value = alg.objective_value(alg.solution())
+        print(name, "deterministic: objective", value, "- time {:.3f} s".format(time.perf_counter() - t_start))
+        for epsilon in epsilons:
+            t_start = time.perf_counter()
+            values = [alg.objective_value(alg.solution(seed=seed, epsilon=epsilon)) for seed in range(seeds)]
+            print(name, "stochastic eps={} (sample {}): objective mean {:.1f} min {} - time {:.3f} s".format(
+                epsilon, alg.stochastic_sample_size(epsilon), np.mean(values), min(values),
+                (time.perf_counter() - t_start) / seeds))
+
+
+def test11(seeds=(50, 51, 52)):
+    """
+        benchmark the round-parallel batch greedy (a tour for each drone at each step) against the classic
+        one-at-a-time TC-GaP and AC-GaP. Print, for each AoI, the objectives, the loss of the batch greedy and the runtimes
+
+        seeds : the seeds of the random AoIs
+    """
+    max_rounds = 8
+    drones = [Drone(700, 10), Drone(600, 12), Drone(800, 8), Drone(650, 10)]
+
+    # ------------------------------------------------------------------------------------------------------
+    for seed in seeds:
+        aoi = generator.random_aoi(3000, 3000, 300, 2, hovering_time=5, seed=seed)
+        trajectories_builder = DroneTrajGeneration(aoi)
+        uavs_to_tours = {drone: trajectories_builder.compute_trajectories(drone, aoi.depots[i % aoi.n_depots])
+                         for i, drone in enumerate(drones)}
+
+        for name, algorithm_class in (("TC-GaP", TotalGreedyCoverage), ("AC-GaP", CumulativeGreedyCoverage)):
+            alg = algorithm_class(aoi, uavs_to_tours, max_rounds, debug=False)
+            t_start = time.perf_counter()
+            value = alg.objective_value(alg.solution())
+            t_classic = time.perf_counter() - t_start
+            t_start = time.perf_counter()
+            batch_value = alg.objective_value(alg.solution(batch=True))
+            t_batch = time.perf_counter() - t_start
+            print("seed", seed, name, "classic", value, "batch", batch_value,
+                  "- loss {:.2f}% - time classic {:.3f} s, batch {:.3f} s".format(
+                      100 * (value - batch_value) / value, t_classic, t_batch))
+
+
+def test12(seeds=(50, 51, 52)):
+    """
+        run the local search (swap, replace and round reorder moves) after TC-GaP and AC-GaP (deterministic and
+        fully randomized, alpha = 1), and after AC-OPT
+        (its solution has empty tours in the unused rounds). Check that the objective of the search equals the
+        objective of the returned solution and that it is not worse than the input solution.
+
+        seeds : the seeds of the random AoIs
+    """
+    from src.algorithms.localsearch import LocalSearch
+
+    max_rounds = 4
+    drones = [Drone(500, 10), Drone(400, 8)]
+
+    # ------------------------------------------------------------------------------------------------------
+    for seed in seeds:
+        aoi = generator.random_aoi(3000, 3000, 150, 1, layout="clusters", hovering_time=5, seed=seed)
+        trajectories_builder = DroneTrajGeneration(aoi)
+        uavs_to_tours = trajectories_builder.compute_fleet_trajectories({drone: aoi.depots[0] for drone in drones})
+
+        for name, algorithm_class, objective, alpha in (("TC-GaP", TotalGreedyCoverage, "TC", None),
+                                                        ("AC-GaP", CumulativeGreedyCoverage, "AC", None),
+                                                        ("random TC-GaP", TotalGreedyCoverage, "TC", 1.0),
+                                                        ("random AC-GaP", CumulativeGreedyCoverage, "AC", 1.0)):
+            alg = algorithm_class(aoi, uavs_to_tours, max_rounds, debug=False)
+            mrs = alg.solution() if alpha is None else alg.solution(seed=seed, alpha=alpha)
+            ls = LocalSearch(mrs, uavs_to_tours, max_rounds, objective=objective, debug=False)
+            input_value = ls.value
+            improved = ls.solution()
+            value = improved.coverage_score() if objective == "TC" else improved.cumulative_coverage_score(max_rounds)
+            assert ls.value == value, "the objective of the search differs from the one of the solution"
+            assert ls.value >= input_value, "the local search worsened the solution"
+            print("seed", seed, name, "objective", input_value, "-> local search", ls.value, "moves", ls.moves)
+
+        # a solution with empty tours in the unused rounds: they are not used rounds
+        small_pools = {drone: tours[:20] for drone, tours in uavs_to_tours.items()}
+        model = CumulativeCoverageModel(aoi, small_pools, max_rounds, debug=False)
+        model.build()
+        model.optimize()
+        ls = LocalSearch(model.solution, objective="AC", debug=False)
+        improved = ls.solution(prune=False)
+        assert ls.value == improved.cumulative_coverage_score(max_rounds)
+        assert all(len(tours) == 0 or len(tours[-1].targets_indexes) > 0 for tours in improved.drone_and_tours.values()), \
+            "the empty rounds of the input are kept as used rounds"
+        print("seed", seed, "AC-OPT objective", model.model.objVal, "-> local search", ls.value)
+
+
+def test13():
+    """
+        check the shortest viable paths (metric closure) with repeated viable paths: a path listed more times (also in
+        the opposite direction) has the length of the path, not the sum of the repetitions
+    """
+    depots = [(3, 4)]
+    targets = [(0, 0), (3, 0), (6, 0)]
+    paths = [((0, 0), (3, 0)), ((3, 0), (6, 0)), ((3, 0), (3, 4)), ((0, 0), (3, 4))]
+    repeated_paths = paths + [((0, 0), (3, 0)), ((3, 0), (0, 0)), ((6, 0), (3, 0))]
+
+    # ------------------------------------------------------------------------------------------------------
+    aoi = AoI(depots, targets, 10, 10, viable_paths=paths)
+    repeated_aoi = AoI(depots, targets, 10, 10, viable_paths=repeated_paths)
+    a, b = repeated_aoi.node_index((0, 0)), repeated_aoi.node_index((3, 0))
+    assert repeated_aoi.distance_matrix()[a, b] == repeated_aoi.metric_closure()[a, b] == 3.0
+    assert np.array_equal(aoi.metric_closure(), repeated_aoi.metric_closure()), \
+        "the repeated viable paths change the shortest paths"
+
+    tour = Tour.from_ordered_nodes(repeated_aoi, [repeated_aoi.node_index(depots[0])] + list(range(len(targets))))
+    assert tour.len_tour() == Tour.from_ordered_nodes(aoi, [aoi.node_index(depots[0])] + list(range(len(targets)))).len_tour()
+    print("Metric closure with repeated viable paths:")
+    print(repeated_aoi.metric_closure())
+    print("Tour", tour.targets_indexes, "length", tour.len_tour())
+
+
+def test14(sizes=(500, 1000, 2000)):
+    """
+        benchmark the trajectories generation on sparse viable paths: corridor AoIs of increasing size, where each node
+        is connected to the two following nodes along the corridor.
+        Print, for each size, the time of the shortest viable paths (metric closure), of the backbones (TSP on the
+        metric closure) and of the maximal windows, with the number of tours and the length of the backbones
+
+        sizes : the number of targets of the AoIs
+    """
+    for n_targets in sizes:
+        base = generator.random_aoi(10000, 2000, n_targets, 2, layout="corridor", hovering_time=5, seed=50)
+        nodes = base.target_points + base.depots
+        along = sorted(nodes)  # by x, the corridor goes from the left to the right side
+        paths = [(along[k], along[k + step]) for step in (1, 2) for k in range(len(along) - step)]
+        aoi = AoI(base.depots, base.target_points, base.width, base.height, viable_paths=paths)
+        drones_depots = {Drone(1500, 10): aoi.depots[0], Drone(1200, 12): aoi.depots[1]}
+
+        # ------------------------------------------------------------------------------------------------------
+        t_start = time.perf_counter()
+        closure = aoi.metric_closure()
+        t_closure = time.perf_counter()
+        trajectories_builder = DroneTrajGeneration(aoi)
+        trajectories_builder.compute_backbones(drones_depots)
+        t_backbones = time.perf_counter()
+        tours = [tour for drone, depot in drones_depots.items()
+                 for tour in trajectories_builder.iter_trajectories(drone, depot, maximal=True)]
+        t_windows = time.perf_counter()
+
+        assert all(np.isfinite(closure[aoi.node_index(depot)]).all() for depot in aoi.depots)
+        print("Targets", n_targets, "- closure {:.2f} s, backbones {:.2f} s ({} TSP), windows {:.2f} s ({} tours)".format(
+            t_closure - t_start, t_backbones - t_closure, trajectories_builder.n_tsp, t_windows - t_backbones,
+            len(tours)), "- mean tour length {:.0f} m".format(np.mean([tour.len_tour() for tour in tours])))
+
+
+def test15(seeds=(50, 51, 52)):
+    """
+        check the resume of the candidate tour pools (checkpoint): a run interrupted after saving the pool of the
+        first drone, and then resumed, builds the same pools of an uninterrupted run
+    """
+    for seed in seeds:
+        aoi = generator.random_aoi(3000, 3000, 80, 1, layout="clusters", hovering_time=5, seed=seed)
+        # the small drone reaches a part of the targets of the big one: in an uninterrupted run it shortcuts the
+        # backbone of the big drone
+        drones_depots = {Drone(1500, 10): aoi.depots[0], Drone(500, 8): aoi.depots[0]}
+        big_drone = list(drones_depots)[0]
+
+        # ------------------------------------------------------------------------------------------------------
+        uninterrupted = compute_tour_pools(aoi, drones_depots)
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint = Checkpoint(directory, interval=0)
+            compute_tour_pools(aoi, {big_drone: drones_depots[big_drone]}, checkpoint)  # interrupted run
+            resumed = compute_tour_pools(aoi, drones_depots, checkpoint)
+
+        for drone in drones_depots:
+            assert len(uninterrupted[drone]) == len(resumed[drone]) and \
+                all(np.array_equal(a, b) for a, b in zip(tours_arrays(uninterrupted[drone]),
+                                                         tours_arrays(resumed[drone]))), \
+                "the resumed tours of {} differ from the uninterrupted run".format(drone)
+        print("Seed", seed, "- resumed pools equal to the uninterrupted run:",
+              {str(drone): len(tours) for drone, tours in resumed.items()})
+
+
+def test16():
+    """
+        check the running coverage of the solution builder (and of the local search) with tours visiting a target more
+        times: e.g., a tour on targets [1, 2, 1] covers two targets, as the built solution
+    """
+    from src.algorithms.localsearch import LocalSearch
+
+    aoi = generator.random_aoi(1000, 1000, 5, 1, hovering_time=5, seed=50)
+    depot = aoi.node_index(aoi.depots[0])
+    repeated_tour = Tour.from_graph_indexes(aoi, [(depot, 1), (1, 2), (2, 1), (1, depot)])
+    other_tour = Tour.from_graph_indexes(aoi, [(depot, 1), (1, 3), (3, depot)])
+    drone, other_drone = Drone(1000, 10), Drone(1000, 10)
+
+    # ------------------------------------------------------------------------------------------------------
+    builder = MultiRoundSolutionBuilder(aoi)
+    builder.add_drone_with_tours(drone, [repeated_tour])
+    assert builder.coverage_score() == builder.build().coverage_score() == 2
+    assert builder.cumulative_coverage_score(2) == builder.build().cumulative_coverage_score(2) == 4
+
+    builder.add_drone_with_tours(other_drone, [other_tour])
+    builder.pop_tour(drone)  # the target 1 is still covered by the other drone
+    assert builder.coverage_score() == builder.build().coverage_score() == 2
+    builder.pop_tour(other_drone)
+    assert builder.coverage_score() == builder.sum_first_rounds == 0
+
+    mrs = MultiRoundSolutionBuilder(aoi).add_drone_with_tours(drone, [other_tour, repeated_tour]).build()
+    ls = LocalSearch(mrs, {drone: [repeated_tour, other_tour]}, objective="AC", debug=False)
+    assert ls.value == mrs.cumulative_coverage_score(2) == 5
+    assert ls.value == ls.solution(prune=False).cumulative_coverage_score(2)
+    print("Coverage of the tours", repeated_tour.targets_indexes, "and", other_tour.targets_indexes,
+          "- targets", mrs.coverage_score(), "cumulative", mrs.cumulative_coverage_score(2))
+
+
+def test17(seeds=(50, 51), max_rounds=4):
+    """
+        check the extension of the TC-OPT and AC-OPT models to more rounds: a model built with 1 round and extended
+        (extend_rounds) round by round has the same optimal objective of a model built from scratch at each round
+
+        seeds : the seeds of the random AoIs
+        max_rounds : the max number of rounds of the extensions
+    """
+    drones = [Drone(500, 10), Drone(400, 8)]
+    for seed in seeds:
+        aoi = generator.random_aoi(3000, 3000, 40, 1, layout="clusters", hovering_time=5, seed=seed)
+        trajectories_builder = DroneTrajGeneration(aoi)
+        trajectories_builder.compute_backbones({drone: aoi.depots[0] for drone in drones})
+        uavs_to_tours = {drone: list(trajectories_builder.iter_trajectories(drone, aoi.depots[0], max_tours=15,
+                                                                             maximal=True))
+                         for drone in drones}  # small models (license)
+
+        # ------------------------------------------------------------------------------------------------------
+        for name, model_class in (("TC-OPT", TotalCoverageModel), ("AC-OPT", CumulativeCoverageModel)):
+            extended = model_class(aoi, uavs_to_tours, 1, debug=False)
+            extended.build()
+            for rounds in range(1, max_rounds + 1):
+                if rounds > 1:
+                    extended.extend_rounds(rounds)
+                extended.optimize()
+                fresh = model_class(aoi, uavs_to_tours, rounds, debug=False)
+                fresh.build()
+                fresh.optimize()
+                assert abs(extended.model.objVal - fresh.model.objVal) < 1e-6, \
+                    "the extended model differs from the built one at {} rounds".format(rounds)
+                print("seed", seed, name, "rounds", rounds, "objective", extended.model.objVal,
+                      "(extended) ==", fresh.model.objVal, "(built)")
+
+
+def test18(seeds=(50, 51), max_rounds=5, windows=(1, 2, 3)):
+    """
+        check the rolling-horizon AC-OPT against the full AC-OPT model (full_gap): the rolling solution is feasible,
+        hence its cumulative coverage is not greater than the optimal one (gap >= 0)
+
+        seeds : the seeds of the random AoIs
+        max_rounds : the number of rounds of the mission
+        windows : the number of rounds of each window
+    """
+    drones = [Drone(500, 10), Drone(400, 8)]
+    for seed in seeds:
+        aoi = generator.random_aoi(3000, 3000, 40, 1, layout="clusters", hovering_time=5, seed=seed)
+        trajectories_builder = DroneTrajGeneration(aoi)
+        trajectories_builder.compute_backbones({drone: aoi.depots[0] for drone in drones})
+        uavs_to_tours = {drone: list(trajectories_builder.iter_trajectories(drone, aoi.depots[0], max_tours=15,
+                                                                             maximal=True))
+                         for drone in drones}  # small models (license)
+
+        # ------------------------------------------------------------------------------------------------------
+        for window in windows:
+            rolling = RollingHorizonCoverage(aoi, uavs_to_tours, max_rounds, window=window, debug=False)
+            mrs = rolling.solution()
+            assert rolling.value == mrs.cumulative_coverage_score(max_rounds)
+            full_gap = rolling.full_gap()
+            assert full_gap is not None, "the full AC-OPT model is not solved"
+            full, value, gap = full_gap
+            assert value == rolling.value and gap >= 0, "the rolling solution is better than the optimal one"
+            print("seed", seed, "window", window, "- full AC-OPT", full, "rolling", value, "gap {:.3f}".format(gap))
+
+
+def test19(seeds=(50, 51, 52), max_rounds=3):
+    """
+        check the exact solver without gurobi (TC-EXACT and AC-EXACT) against the gurobi models (TC-OPT and AC-OPT):
+        on small random instances they have the same optimal objective
+
+        seeds : the seeds of the random AoIs
+        max_rounds : the number of rounds
+    """
+    from src.algorithms.exact import ExactCoverageSolver
+
+    drones = [Drone(500, 10), Drone(400, 8)]
+    for seed in seeds:
+        aoi = generator.random_aoi(3000, 3000, 15, 1, layout="clusters", hovering_time=5, seed=seed)
+        trajectories_builder = DroneTrajGeneration(aoi)
+        uavs_to_tours = trajectories_builder.compute_fleet_trajectories({drone: aoi.depots[0] for drone in drones})
+
+        # ------------------------------------------------------------------------------------------------------
+        for objective, model_class in (("TC", TotalCoverageModel), ("AC", CumulativeCoverageModel)):
+            model = model_class(aoi, uavs_to_tours, max_rounds, debug=False)
+            model.build()
+            model.optimize()
+            mrs = ExactCoverageSolver(aoi, uavs_to_tours, max_rounds, objective=objective, debug=False).solution()
+            value = mrs.coverage_score() if objective == "TC" else mrs.cumulative_coverage_score(max_rounds)
+            assert abs(value - model.model.objVal) < 1e-6, "the exact solver differs from the {}-OPT".format(objective)
+            print("seed", seed, objective + "-EXACT", value, "==", objective + "-OPT", model.model.objVal,
+                  "- tours", sum(len(tours) for tours in uavs_to_tours.values()))
+
+
+def test20(seeds=(50, 51), max_rounds=3, seed_tours=5):
+    """
+        run TC-OPT and AC-OPT by column generation from a seed pool of a few maximal tours of each drone.
+        The new tours are added as columns of a single model: check that its MILP has the same objective of a model
+        built from scratch on the generated pool, and that it is not worse than the model of the seed pool
+
+        seeds : the seeds of the random AoIs
+        max_rounds : the number of rounds
+        seed_tours : the number of maximal tours of each drone in the seed pool
+    """
+    from src.algorithms.optimal import ColumnGenerationCoverage
+
+    drones = [Drone(500, 10), Drone(400, 8)]
+    for seed in seeds:
+        aoi = generator.random_aoi(3000, 3000, 40, 1, layout="clusters", hovering_time=5, seed=seed)
+        trajectories_builder = DroneTrajGeneration(aoi)
+        trajectories_builder.compute_backbones({drone: aoi.depots[0] for drone in drones})
+        seed_pool = {drone: list(trajectories_builder.iter_trajectories(drone, aoi.depots[0], max_tours=seed_tours,
+                                                                         maximal=True))
+                     for drone in drones}
+
+        # ------------------------------------------------------------------------------------------------------
+        for objective, model_class in (("TC", TotalCoverageModel), ("AC", CumulativeCoverageModel)):
+            cg = ColumnGenerationCoverage(aoi, seed_pool, max_rounds, objective=objective, debug=False)
+            cg.solve()
+            models = {}
+            for name, pool in (("seed", seed_pool), ("generated", cg.pool)):
+                models[name] = model_class(aoi, pool, max_rounds, debug=False)
+                models[name].build()
+                models[name].optimize()
+            assert abs(cg.model.model.objVal - models["generated"].model.objVal) < 1e-6, \
+                "the column generation model differs from the model of the generated pool"
+            assert cg.model.model.objVal >= models["seed"].model.objVal - 1e-6
+            print("seed", seed, objective + "-CG", cg.model.model.objVal, "(LP bound {:.2f}, {} iterations)".format(
+                cg.lp_values[-1], len(cg.lp_values)), "-", objective + "-OPT on the seed pool",
+                models["seed"].model.objVal, "- pool", sum(len(tours) for tours in seed_pool.values()), "->",
+                sum(len(tours) for tours in cg.pool.values()))
+
+
+def test21(seeds=range(6), max_rounds=6):
+    """
+        check the sweep rows of GaP and OPT: the cumulative coverage is on the max rounds of the cell, hence a pruned
+        GaP solution (fewer rounds) and the OPT one (empty rounds) report the same AC when they cover all the
+        targets in the first round
+
+        seeds : the seeds of the cells
+        max_rounds : the max rounds of the cells
+    """
+    n_targets = 20
+    for seed in seeds:
+        rows = {algorithm: run_cell({"algorithm": algorithm, "seed": seed, "n_targets": n_targets,
+                                     "fleet": [(1500, 16)], "max_rounds": max_rounds})
+                for algorithm in ("AC-GaP", "AC-OPT")}
+        assert all(row["coverage"] == n_targets for row in rows.values()), "the drone should cover all the targets"
+        assert rows["AC-GaP"]["cumulative_coverage"] == rows["AC-OPT"]["cumulative_coverage"] == n_targets * max_rounds, \
+            "the cumulative coverage of the rows is not on the same rounds"
+        print("seed", seed, {algorithm: (row["cumulative_coverage"], row["rounds"]) for algorithm, row in rows.items()})
+
+
+def test22(n_targets=3000, max_rounds=3):
+    """
+        plan a large survey on its coarsened AoI (targets clustered into super-nodes) and expand the solution back.
+        Check that the expanded tours are feasible for the drones (as fast as the reference speed, or faster), that
+        each expanded tour inspects all the targets of its clusters and that an empty coarse tour stays empty
+
+        n_targets : the number of targets of the survey
+        max_rounds : the maximum number of rounds
+    """
+    from src.algorithms.coarsening import TargetCoarsening
+
+    aoi = generator.random_aoi(10000, 10000, n_targets, 2, layout="clusters", hovering_time=5, seed=50)
+    reference_speed = 10
+    drones_depots = {Drone(1200, reference_speed): aoi.depots[0], Drone(1000, 15): aoi.depots[1]}
+
+    # ------------------------------------------------------------------------------------------------------
+    t_start = time.perf_counter()
+    coarsening = TargetCoarsening(aoi, reference_speed=reference_speed, max_radius=200)
+    mrs = coarsening.solve(drones_depots, max_rounds)
+    print("Targets", n_targets, "clusters", len(coarsening.clusters), "- coverage", mrs.coverage_score(),
+          "- time {:.2f} s".format(time.perf_counter() - t_start))
+
+    cluster_of = np.zeros(aoi.n_targets, dtype=int)
+    for k, cluster in enumerate(coarsening.clusters):
+        cluster_of[cluster] = k
+    selected = set(cluster_of[list(mrs.covered_graph_targets)].tolist())
+    assert mrs.coverage_score() == sum(len(coarsening.clusters[k]) for k in selected), \
+        "some targets of the selected clusters are not covered"
+    for drone, tours in mrs.drone_and_tours.items():
+        for tour in tours:
+            for speed in (drone.speed, 2 * drone.speed):
+                assert tour.time_tour(speed) <= drone.autonomy, "an expanded tour is not feasible"
+            clusters = set(cluster_of[tour.targets_indexes].tolist())
+            assert sorted(tour.targets_indexes) == sorted(t for k in clusters for t in coarsening.clusters[k].tolist()), \
+                "an expanded tour does not inspect all the targets of its clusters"
+
+    # an empty coarse tour (an unused round) stays empty
+    drone, depot = list(drones_depots.items())[0]
+    coarse_tour = DroneTrajGeneration(coarsening.coarse_aoi).compute_trajectories(drone, depot)[0]
+    coarse_mrs = MultiRoundSolutionBuilder(coarsening.coarse_aoi).add_drone_with_tours(
+        drone, [Tour(coarsening.coarse_aoi, []), coarse_tour]).build()
+    expanded = coarsening.expand_solution(coarse_mrs).drone_and_tours[drone]
+    assert len(expanded[0].edges_w_indexes) == 0 and len(expanded[1].targets_indexes) > 0
+
+
+def test23(seed=50, n_targets=200):
+    """
+        plan a multi-depot AoI with the spatial decomposition (Voronoi and balanced partitions, TC-GaP and AC-GaP),
+        with and without the boundary repair. Check that all the tours are within the autonomy of their drones and
+        flown from their depots, and that the repair does not lower the coverage
+
+        seed : the seed of the random AoI
+        n_targets : the number of targets
+    """
+    from src.algorithms.decomposition import DecompositionPlanner
+
+    max_rounds = 3
+    aoi = generator.random_aoi(3000, 3000, n_targets, 3, layout="clusters", hovering_time=5, seed=seed)
+    drones_depots = {Drone(autonomy, speed): aoi.depots[i % aoi.n_depots]
+                     for i, (autonomy, speed) in enumerate([(500, 10), (400, 8), (600, 10), (500, 12), (300, 10),
+                                                            (450, 9)])}
+
+    # ------------------------------------------------------------------------------------------------------
+    for partition in ("voronoi", "balanced"):
+        for algorithm in ("TC-GaP", "AC-GaP"):
+            scores = {}
+            for repair in (False, True):
+                planner = DecompositionPlanner(aoi, drones_depots, max_rounds, algorithm=algorithm,
+                                               partition=partition, n_workers=1, repair=repair, debug=False)
+                mrs = planner.solution()
+                for drone, tours in mrs.drone_and_tours.items():
+                    for tour in tours:
+                        if len(tour.edges_w_indexes) == 0:
+                            continue
+                        assert tour.depot_coord == drones_depots[drone], "a tour is not flown from the drone depot"
+                        assert tour.time_tour(drone.speed) <= drone.autonomy, "a tour exceeds the drone autonomy"
+                scores[repair] = (mrs.coverage_score(), mrs.cumulative_coverage_score(max_rounds))
+            assert scores[True][0] >= scores[False][0], "the repair lowered the coverage"
+            print(partition, algorithm, "(coverage, cumulative coverage) without repair", scores[False],
+                  "with repair", scores[True])
+
+
+def test24(seed=50, n_targets=40, slow_targets=400):
+    """
+        serve the planning service on a temporary Unix socket: register and plan an AoI, check that a warm re-plan
+        takes less than 100 ms, that a plan is rejected as "busy" when the queue is full (a single worker busy with a
+        cold pool and a single pending request) and that an unknown op or AoI gets an "error"
+
+        seed : the seed of the random AoIs
+        n_targets : the number of targets of the AoI planned warm
+        slow_targets : the number of targets of the AoI planned cold, to keep the worker busy
+    """
+    from src.util.planservice import PlanningService, PlanningClient
+    import threading
+    import asyncio
+    import os
+
+    path = os.path.join(tempfile.mkdtemp(), "planner.sock")
+    service = PlanningService(n_workers=1, queue_size=1, debug=False)
+    threading.Thread(target=asyncio.run, args=(service.serve(path=path),), daemon=True).start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    client = PlanningClient(path=path)
+    fleet = [{"id": 0, "autonomy": 1500, "speed": 10, "depot": 0}, {"id": 1, "autonomy": 1200, "speed": 8, "depot": 0}]
+    aoi = generator.random_aoi(1500, 1500, n_targets, 1, hovering_time=5, seed=seed)
+
+    # ------------------------------------------------------------------------------------------------------
+    assert client.register_aoi("area", aoi)["status"] == "ok"
+    cold = client.plan("area", fleet, rounds=3)
+    assert cold["status"] == "ok" and len(cold["solution"]["assignment"]) == len(fleet), cold
+    t_start = time.perf_counter()
+    warm = client.plan("area", fleet, rounds=3)
+    warm_time = time.perf_counter() - t_start
+    assert warm["status"] == "ok" and warm["solution"] == cold["solution"], "the warm re-plan differs"
+    assert warm_time < 0.1, "the warm re-plan took {:.3f} s".format(warm_time)
+    print("cold plan", round(cold["time"], 3), "s, warm re-plan (round trip)", round(warm_time, 4), "s")
+
+    # ------------------------------------------------------------------------------------------------------
+    assert client.request({"op": "unknown"})["status"] == "error"
+    assert client.plan("missing", fleet, rounds=3)["status"] == "error"
+
+    # ------------------------------------------------------------------------------------------------------
+    slow_aoi = generator.random_aoi(3000, 3000, slow_targets, 1, hovering_time=5, seed=seed)
+    assert client.register_aoi("slow", slow_aoi)["status"] == "ok"
+    slow_fleet = [{"id": 0, "autonomy": 3000, "speed": 10, "depot": 0}]
+    responses = []
+
+    def plan_in_thread(aoi_id, fleet):
+        other = PlanningClient(path=path)
+        responses.append(other.plan(aoi_id, fleet, rounds=3))
+        other.close()
+
+    def wait_stats(condition):
+        while not condition(client.request({"op": "stats"})):
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=plan_in_thread, args=("slow", slow_fleet))]
+    threads[0].start()  # taken by the single worker, busy for seconds with the cold pool
+    time.sleep(0.5)
+    wait_stats(lambda stats: stats["pending"] == 0)
+    threads.append(threading.Thread(target=plan_in_thread, args=("area", fleet)))
+    threads[1].start()  # waits in the queue
+    wait_stats(lambda stats: stats["pending"] == 1)
+    busy = client.plan("area", fleet, rounds=3)
+    assert busy["status"] == "busy", busy
+    for thread in threads:
+        thread.join()
+    assert all(response["status"] == "ok" for response in responses), responses
+    assert client.plan("area", fleet, rounds=3)["status"] == "ok", "the service should accept plans again"
+    client.close()
+    print("busy reply with a full queue:", busy)
+
+
+def test25(seed=50, max_rounds=4, n_drones=300, n_rounds=2000, budget=0.1):
+    """
+        check the fleet simulator: with zero turnaround and no failures the first inspection times are the ones of
+        MultiRoundSolution.first_inspection_times; a failure injected in the middle of a tour drops exactly the
+        inspections after the failure instant. Then replay n_drones drones x n_rounds rounds within the time budget
+
+        seed : the seed of the random AoI
+        max_rounds : the max rounds of the GaP solution
+        n_drones : the number of drones of the large replay
+        n_rounds : the number of rounds of the large replay
+        budget : the maximum time (seconds) of a run of the large replay
+    """
+    from src.util.fleetsim import FleetSimulator
+
+    aoi = generator.random_aoi(2000, 2000, 120, 2, hovering_time=5, seed=seed)
+    drones = [Drone(900, 10), Drone(800, 8), Drone(1000, 12)]
+    trajectories_builder = DroneTrajGeneration(aoi)
+    uavs_to_tours = {drone: trajectories_builder.compute_trajectories(drone, aoi.depots[i % aoi.n_depots])
+                     for i, drone in enumerate(drones)}
+    mrs = CumulativeGreedyCoverage(aoi, uavs_to_tours, max_rounds, debug=False).solution()
+
+    # ------------------------------------------------------------------------------------------------------
+    simulator = FleetSimulator(mrs)
+    result = simulator.run()
+    expected = mrs.first_inspection_times()
+    assert np.array_equal(np.isfinite(result.first_inspection_times), np.isfinite(expected))
+    assert np.allclose(result.first_inspection_times[np.isfinite(expected)], expected[np.isfinite(expected)]), \
+        "the simulated first inspections differ from the solution ones"
+    assert result.failures == {} and result.completed_tours == {d: len(t) for d, t in mrs.drone_and_tours.items()}
+
+    # ------------------------------------------------------------------------------------------------------
+    # the failure in the middle of a tour (between two inspections) of a drone, at its second round
+    drone = next(d for d, tours in mrs.drone_and_tours.items()
+                 if len(tours) > 1 and len(tours[1].targets_indexes) > 1)
+    takeoff = mrs.drone_and_tours[drone][0].time_tour(drone.speed)
+    times = mrs.drone_and_tours[drone][1].inspection_times(drone.speed)
+    k = len(times) // 2
+    failure = takeoff + (times[k - 1] + times[k]) / 2
+
+    expected = np.full(aoi.n_targets, np.inf)
+    for d, tours in mrs.drone_and_tours.items():
+        start = 0
+        for tour in tours:
+            for (_, target), t in zip(tour.edges_w_indexes, tour.inspection_times(d.speed)):
+                if d != drone or start + t < failure:
+                    expected[target] = min(expected[target], start + t)
+            start += tour.time_tour(d.speed)
+
+    result = simulator.run(failure_times={drone: failure})
+    assert np.array_equal(np.isfinite(result.first_inspection_times), np.isfinite(expected))
+    assert np.allclose(result.first_inspection_times[np.isfinite(expected)], expected[np.isfinite(expected)]), \
+        "the failure did not drop exactly the later inspections"
+    assert result.failures == {drone: failure} and result.completed_tours[drone] == 1
+    print("failure at {:.1f} s: targets inspected {} (without failure {})".format(
+        failure, result.coverage_score(), mrs.coverage_score()))
+
+    # ------------------------------------------------------------------------------------------------------
+    # the large replay: each drone cycles over the first tours of the pool of its type
+    builder = MultiRoundSolutionBuilder(aoi)
+    for i in range(n_drones):
+        drone = drones[i % len(drones)]
+        pool = uavs_to_tours[drone][:10]
+        builder.add_drone_with_tours(Drone(drone.autonomy, drone.speed), [pool[r % len(pool)] for r in range(n_rounds)])
+    large = builder.build()
+    t_start = time.perf_counter()
+    simulator = FleetSimulator(large, default_turnaround=60)
+    build_time = time.perf_counter() - t_start
+    run_times = []
+    for run_seed in range(3):
+        t_start = time.perf_counter()
+        simulator.run(failure_probability=0.001, seed=run_seed)
+        run_times.append(time.perf_counter() - t_start)
+    run_time = min(run_times)
+    assert run_time < budget, "a replay of {} drones x {} rounds took {:.3f} s".format(n_drones, n_rounds, run_time)
+    print("{} drones x {} rounds: simulator built in {:.3f} s, run in {:.3f} s".format(n_drones, n_rounds,
+                                                                                      build_time, run_time))
+
+
+def test26(seed=50, n_targets=300, n_workers=2):
+    """
+        publish an AoI in shared memory: the pickled AoI is a small handle, the worker processes (spawned) attach the
+        same metric closure, the tours and the drones pickle round-trip with equal edges, ids and hashes, and
+        SharedAoI.close releases the shared memory block
+
+        seed : the seed of the random AoI
+        n_targets : the number of targets
+        n_workers : the number of worker processes
+    """
+    from src.entities.trajenties import attach_aoi
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+    import multiprocessing
+    import pickle
+
+    aoi = generator.random_aoi(2000, 2000, n_targets, 2, hovering_time=5, seed=seed)
+    tour = build_random_tour(aoi, aoi.depots[0], 10, seed=seed)
+    drone = Drone(1500, 10, id=7)
+    full_size = len(pickle.dumps(aoi))
+
+    # ------------------------------------------------------------------------------------------------------
+    shared = aoi.share()
+    handle_size = len(pickle.dumps(aoi))
+    assert handle_size < 1024 and handle_size < full_size / 10, \
+        "the shared AoI pickles in {} bytes (unshared {})".format(handle_size, full_size)
+    attached = attach_aoi(shared.handle)
+    assert np.array_equal(attached.metric_closure(), aoi.metric_closure())
+
+    # the round trip of the tour and the drone in this process
+    other_tour, other_drone = pickle.loads(pickle.dumps((tour, drone)))
+    assert other_tour == tour and other_tour.aoi is attached and other_tour.len_tour() == tour.len_tour()
+    assert other_drone == drone and other_drone.id == drone.id and hash(other_drone) == hash(drone)
+
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        seen = list(executor.map(inspect_shared_aoi, [aoi] * n_workers, [tour] * n_workers, [drone] * n_workers))
+    for name, closure, edges, length, drone_id, drone_hash in seen:
+        assert name == shared.handle.name and np.array_equal(closure, aoi.metric_closure()), \
+            "a worker does not see the shared metric closure"
+        assert edges == tour.edges_w_indexes and length == tour.len_tour()
+        assert drone_id == drone.id and drone_hash == hash(drone)
+
+    # ------------------------------------------------------------------------------------------------------
+    shared.close()
+    try:
+        shared_memory.SharedMemory(name=shared.handle.name).close()
+        released = False
+    except FileNotFoundError:
+        released = True
+    assert released, "the shared memory block was not released"
+    assert aoi.shared_handle is None and len(pickle.dumps(aoi)) == full_size
+    print("AoI of {} targets: pickled in {} bytes, shared handle in {} bytes, {} workers attached".format(
+        n_targets, full_size, handle_size, len(seen)))
+
+
 if __name__ == "__main__":
     parser = ArgumentParser()
     
@@ -404,3 +1138,41 @@ if __name__ == "__main__":
         test6()
     elif test_id == 7:
         test7()
+    elif test_id == 8:
+        test8()
+    elif test_id == 9:
+        test9()
+    elif test_id == 10:
+        test10()
+    elif test_id == 11:
+        test11()
+    elif test_id == 12:
+        test12()
+    elif test_id == 13:
+        test13()
+    elif test_id == 14:
+        test14()
+    elif test_id == 15:
+        test15()
+    elif test_id == 16:
+        test16()
+    elif test_id == 17:
+        test17()
+    elif test_id == 18:
+        test18()
+    elif test_id == 19:
+        test19()
+    elif test_id == 20:
+        test20()
+    elif test_id == 21:
+        test21()
+    elif test_id == 22:
+        test22()
+    elif test_id == 23:
+        test23()
+    elif test_id == 24:
+        test24()
+    elif test_id == 25:
+        test25()
+    elif test_id == 26:
+        test26()
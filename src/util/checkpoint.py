@@ -0,0 +1,216 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains the checkpoint and resume of long planning runs.
+
+A Checkpoint is a directory of binary (.npz) files, each written atomically (temporary file, fsync and rename):
+a crash during a write leaves the previous checkpoint intact. The saved items are:
+    tours: the candidate tour pools of the drones (DroneTrajGeneration), saved drone by drone;
+    gap: the greedy state of TC-GaP / AC-GaP (choices so far, visited targets, residual tours per drone, random state);
+    opt: the incumbent of TC-OPT / AC-OPT, restored as MIP start;
+    solution: the final multi-round solution.
+The tours are stored as flat arrays of graph indexes: the binary solution format (see solution_arrays).
+
+E.g., the same call continues from the latest checkpoint after a crash, with the same final result:
+    resumable_solve("AC-GaP", aoi, drones_depots, max_rounds=4, checkpoint=Checkpoint("data/run1", interval=60))
+"""
+
+from src.entities.trajenties import AoI, Drone, Tour, MultiRoundSolution, MultiRoundSolutionBuilder
+
+import numpy as np
+import tempfile
+import time
+import os
+
+
+class Checkpoint():
+    ''' A directory of atomically written binary checkpoints, saved at most every interval seconds '''
+
+    def __init__(self, directory: str, interval: float = 60.0):
+        """
+        :param directory: the directory of the checkpoint files (created if it does not exist)
+        :param interval: the min seconds between two periodic saves of the same item, 0 saves at every step
+                            (default 60 seconds). The final state is always saved
+        """
+        self.directory = directory
+        self.interval = interval
+        self.__last_save = {}  # item name -> time of the last save
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        """ the file of the item """
+        return os.path.join(self.directory, name + ".npz")
+
+    def due(self, name: str) -> bool:
+        """ whether the periodic save of the item is due """
+        return time.monotonic() - self.__last_save.get(name, -np.inf) >= self.interval
+
+    def save(self, name: str, **arrays):
+        """ atomically write the arrays of the item """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix="." + name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.__last_save[name] = time.monotonic()
+
+    def load(self, name: str):
+        """ the arrays of the item as a dictionary, None if the item was never saved """
+        if not os.path.exists(self.path(name)):
+            return None
+        with np.load(self.path(name), allow_pickle=False) as data:
+            return {key: data[key] for key in data.files}
+
+    def clear(self, name: str):
+        """ remove the item """
+        if os.path.exists(self.path(name)):
+            os.remove(self.path(name))
+
+
+# -------------------------------------------------------------------
+# binary solution format
+# -------------------------------------------------------------------
+
+def tours_arrays(tours: list):
+    """ the tours as two arrays: the number of edges of each tour and the flat graph indexes of all the edges """
+    edges = [np.array(tour.edges_w_indexes, dtype=np.int64).reshape(-1, 2) for tour in tours]
+    return (np.array([len(e) for e in edges], dtype=np.int64),
+            np.concatenate(edges).reshape(-1) if len(edges) > 0 else np.empty(0, dtype=np.int64))
+
+
+def tours_from_arrays(aoi: AoI, n_edges, flat_edges) -> list:
+    """ the tours of the arrays (see tours_arrays), an empty tour for 0 edges """
+    offsets = np.concatenate(([0], np.cumsum(n_edges) * 2))
+    tours = []
+    for i in range(len(n_edges)):
+        edges = flat_edges[offsets[i]:offsets[i + 1]].reshape(-1, 2).tolist()
+        tours.append(Tour.from_graph_indexes(aoi, [tuple(e) for e in edges]) if len(edges) > 0 else Tour(aoi, []))
+    return tours
+
+
+def drones_arrays(drones: list) -> dict:
+    """ the ids, autonomies and speeds of the drones """
+    return {"drone_ids": np.array([drone.id for drone in drones]),
+            "drone_autonomy": np.array([drone.autonomy for drone in drones], dtype=float),
+            "drone_speed": np.array([drone.speed for drone in drones], dtype=float)}
+
+
+def drones_from_arrays(arrays: dict) -> list:
+    """ the drones of the arrays (see drones_arrays) """
+    return [Drone(float(autonomy), float(speed), id=drone_id.item())
+            for drone_id, autonomy, speed in zip(arrays["drone_ids"], arrays["drone_autonomy"], arrays["drone_speed"])]
+
+
+def solution_arrays(mrs: MultiRoundSolution) -> dict:
+    """ the multi-round solution as arrays: the drones, the number of rounds of each drone and its tours """
+    drones = list(mrs.drone_and_tours.keys())
+    n_edges, flat_edges = tours_arrays([tour for drone in drones for tour in mrs.drone_and_tours[drone]])
+    return dict(drones_arrays(drones), n_rounds=np.array([len(mrs.drone_and_tours[d]) for d in drones], dtype=np.int64),
+                n_edges=n_edges, flat_edges=flat_edges)
+
+
+def solution_from_arrays(aoi: AoI, arrays: dict) -> MultiRoundSolution:
+    """ the multi-round solution of the arrays (see solution_arrays) """
+    tours = tours_from_arrays(aoi, arrays["n_edges"], arrays["flat_edges"])
+    offsets = np.concatenate(([0], np.cumsum(arrays["n_rounds"])))
+    builder = MultiRoundSolutionBuilder(aoi)
+    for i, drone in enumerate(drones_from_arrays(arrays)):
+        builder.add_drone_with_tours(drone, tours[offsets[i]:offsets[i + 1]])
+    return builder.build()
+
+
+# -------------------------------------------------------------------
+# resumable items
+# -------------------------------------------------------------------
+
+def save_tour_pools(checkpoint: Checkpoint, uavs_tours: dict, name: str = "tours"):
+    """ save the candidate tours of the drones {drone : [tour1, tour2, ...]} """
+    drones = list(uavs_tours.keys())
+    n_edges, flat_edges = tours_arrays([tour for drone in drones for tour in uavs_tours[drone]])
+    checkpoint.save(name, n_tours=np.array([len(uavs_tours[drone]) for drone in drones], dtype=np.int64),
+                    n_edges=n_edges, flat_edges=flat_edges, **drones_arrays(drones))
+
+
+def load_tour_pools(checkpoint: Checkpoint, aoi: AoI, name: str = "tours") -> dict:
+    """ the saved candidate tours {drone : [tour1, tour2, ...]}, an empty dictionary if never saved """
+    arrays = checkpoint.load(name)
+    if arrays is None:
+        return {}
+    tours = tours_from_arrays(aoi, arrays["n_edges"], arrays["flat_edges"])
+    offsets = np.concatenate(([0], np.cumsum(arrays["n_tours"])))
+    return {drone: tours[offsets[i]:offsets[i + 1]] for i, drone in enumerate(drones_from_arrays(arrays))}
+
+
+def compute_tour_pools(aoi: AoI, drones_depots: dict, checkpoint: Checkpoint = None, name: str = "tours") -> dict:
+    """ the candidate tours of the drones (DroneTrajGeneration), resumed from the checkpoint: the pools of the
+        drones already saved are loaded, the others are computed and saved (at most every checkpoint.interval)
+
+    :param drones_depots: a dictionary {drone : depot coordinates}
+    :return: a dictionary {drone : [tour1, tour2, ...]}, in the order of drones_depots
+    """
+    from src.algorithms.trajbuilder import DroneTrajGeneration
+
+    saved = load_tour_pools(checkpoint, aoi, name) if checkpoint is not None else {}
+    saved = {drone.id: tours for drone, tours in saved.items()}
+    trajectories_builder = DroneTrajGeneration(aoi)
+    trajectories_builder.compute_backbones(drones_depots)  # the fleet backbones: a resumed run builds the same tours
+    uavs_tours = {}
+    for drone, depot in drones_depots.items():
+        if drone.id in saved:
+            uavs_tours[drone] = saved[drone.id]
+            continue
+        uavs_tours[drone] = trajectories_builder.compute_trajectories(drone, depot)
+        if checkpoint is not None and checkpoint.due(name):
+            save_tour_pools(checkpoint, uavs_tours, name)
+    if checkpoint is not None and len(uavs_tours) > len(saved):
+        save_tour_pools(checkpoint, uavs_tours, name)
+    return uavs_tours
+
+
+def resumable_solve(algorithm: str, aoi: AoI, drones_depots: dict, max_rounds: int,
+                    checkpoint: Checkpoint) -> MultiRoundSolution:
+    """ the resume entry point: generate the tour pools and run the algorithm, continuing from the latest checkpoint.
+        The final solution is saved too: a completed run is only loaded.
+
+    :param algorithm: one among "TC-GaP", "AC-GaP", "TC-OPT", "AC-OPT"
+    :param aoi: the input area of interest
+    :param drones_depots: a dictionary {drone : depot coordinates}
+    :param max_rounds: the maximum number of rounds
+    :param checkpoint: the checkpoint of the run
+    :return: the multi round solution : trajenties.MultiRoundSolution
+    """
+    arrays = checkpoint.load("solution")
+    if arrays is not None:
+        return solution_from_arrays(aoi, arrays)
+
+    uavs_tours = compute_tour_pools(aoi, drones_depots, checkpoint)
+    if algorithm in ("TC-GaP", "AC-GaP"):
+        from src.algorithms.approxalg import CumulativeGreedyCoverage, TotalGreedyCoverage
+        algorithm_class = TotalGreedyCoverage if algorithm == "TC-GaP" else CumulativeGreedyCoverage
+        gap = algorithm_class(aoi, uavs_tours, max_rounds, debug=False)
+        mrs = gap.solution_from_choices(gap.greedy_choices(checkpoint=checkpoint))
+    elif algorithm in ("TC-OPT", "AC-OPT"):
+        from src.algorithms.optimal import CumulativeCoverageModel, TotalCoverageModel
+        model_class = TotalCoverageModel if algorithm == "TC-OPT" else CumulativeCoverageModel
+        model = model_class(aoi, uavs_tours, max_rounds, debug=False)
+        model.build()
+        model.optimize(checkpoint=checkpoint)
+        if getattr(model, "solution", None) is None:
+            raise RuntimeError("optimal solution not found")
+        mrs = model.solution
+    else:
+        raise ValueError("Unknown algorithm: {}".format(algorithm))
+
+    checkpoint.save("solution", **solution_arrays(mrs))
+    return mrs
@@ -16,4 +16,5 @@ This files contains all the static paths ed info used in the project
 #
 
 
-PATH_EXAMPLE_PLOTS="data/test_plots/"
\ No newline at end of file
+PATH_EXAMPLE_PLOTS="data/test_plots/"
+PATH_EXAMPLE_SWEEP="data/test_sweep.csv"
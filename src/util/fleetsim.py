@@ -0,0 +1,164 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains a discrete-event simulator of a fleet of drones that executes a multi-round solution.
+
+A MultiRoundSolution is round-synchronous, while in the field each drone flies its tours at its own pace:
+it takes off, inspects the targets of the tour, lands, recharges (turnaround time) and takes off for the next round.
+The simulator replays a solution with per-drone speed, hovering time and turnaround time, and optional failures
+(a failed drone is lost: it inspects nothing after the failure instant). It returns the actual timestamp of the first
+inspection of every target.
+
+The drones do not interact: the events of a drone (take off, inspections, landing, failure) only depend on its own
+previous events. Hence the event timeline of each drone is computed at once, vectorized over all the flights of the
+fleet (cumulative flight and turnaround times), which is equivalent to process the events in chronological order.
+The tours are evaluated once (see trajenties.TourBatch): the simulator can run many times
+(e.g., different failure seeds) on the same solution inside optimization loops.
+"""
+
+from src.entities.trajenties import MultiRoundSolution, TourBatch, time_stats
+
+import numpy as np
+
+
+""" The outcome of a simulation """
+class SimulationResult:
+
+    def __init__(self, first_inspection_times, landing_times: dict, completed_tours: dict, failures: dict):
+        """
+        :param first_inspection_times: a numpy array with the first inspection time of each target (np.inf if never)
+        :param landing_times: a dictionary {drone : time of the last landing (or of the failure)}
+        :param completed_tours: a dictionary {drone : number of completed tours}
+        :param failures: a dictionary {drone : time of failure} of the failed drones only
+        """
+        self.first_inspection_times = first_inspection_times
+        self.landing_times = landing_times
+        self.completed_tours = completed_tours
+        self.failures = failures
+
+    def mission_time(self):
+        """ return the time when the last drone lands (or fails) """
+        return max(self.landing_times.values(), default=0)
+
+    def coverage_score(self):
+        """ return the number of inspected targets """
+        return int(np.count_nonzero(np.isfinite(self.first_inspection_times)))
+
+    def inspection_time_stats(self, percentiles: tuple = (50, 90, 95, 99)):
+        """ return the mean and the percentiles of the first inspection times of the inspected targets """
+        return time_stats(self.first_inspection_times, percentiles)
+
+
+""" Discrete-event simulator of the execution of a multi-round solution, with asynchronous drones """
+class FleetSimulator:
+
+    def __init__(self, mrs: MultiRoundSolution, speeds: dict = None, hovering_times: dict = None,
+                 turnaround_times: dict = None, default_turnaround: float = 0):
+        """
+        :param mrs: the multi round solution to simulate
+        :param speeds: a dictionary {drone : speed (m/s)} to override the speed of the drones (default: drone.speed)
+        :param hovering_times: a dictionary {drone : hovering time (seconds) on each target} to override the
+                                hovering times of the AoI (default: the AoI ones)
+        :param turnaround_times: a dictionary {drone : seconds between a landing and the next take off}
+                                (e.g., recharge or battery swap)
+        :param default_turnaround: the turnaround time of the drones not in turnaround_times (default 0)
+        """
+        self.mrs = mrs
+        self.aoi = mrs.aoi
+        self.drones = list(mrs.drone_and_tours.keys())
+        self.ndrones = len(self.drones)
+        speeds = speeds if speeds is not None else {}
+        hovering_times = hovering_times if hovering_times is not None else {}
+        turnaround_times = turnaround_times if turnaround_times is not None else {}
+        self.turnaround = np.array([turnaround_times.get(d, default_turnaround) for d in self.drones], dtype=float)
+
+        # the (drone, tour) pairs are evaluated once: the same tour object of the same drone shares the evaluation
+        unique = {}  # (drone, id of the tour) -> (index of the evaluated tour, tour)
+        self.drone_tours = []  # for each drone, the index of its unique evaluated tours, round by round
+        for idrone, drone in enumerate(self.drones):
+            self.drone_tours.append([unique.setdefault((idrone, id(tour)), (len(unique), tour))[0]
+                                     for tour in mrs.drone_and_tours[drone]])
+        tours = [tour for _, tour in unique.values()]
+        tour_speeds = [speeds.get(self.drones[idrone], self.drones[idrone].speed) for idrone, _ in unique.keys()]
+        tour_hovering = [hovering_times.get(self.drones[idrone], np.nan) for idrone, _ in unique.keys()]
+
+        if len(tours) > 0:
+            self.completion, self.targets, self.times, self.inspection_tours = \
+                TourBatch(self.aoi, tours).paired_times(tour_speeds, tour_hovering)
+        else:
+            self.completion, self.targets = np.zeros(0), np.zeros(0, dtype=int)
+            self.times, self.inspection_tours = np.zeros(0), np.zeros(0, dtype=int)
+
+    def run(self, failure_probability: float = 0, failure_times: dict = None, seed: int = None) -> SimulationResult:
+        """
+        simulate the execution of the solution.
+
+        :param failure_probability: the probability that a drone fails during each of its tours; the failure
+                                    instant is uniform along the tour (default 0, no random failures)
+        :param failure_times: a dictionary {drone : absolute time of failure} of injected failures (default None)
+        :param seed: the seed of the random failures
+        :return: the SimulationResult
+        """
+        rng = np.random.default_rng(seed)
+        failure_at = np.full(self.ndrones, np.inf)
+        if failure_times is not None:
+            for idrone, drone in enumerate(self.drones):
+                failure_at[idrone] = failure_times.get(drone, np.inf)
+
+        # all the flights (drone, round) as flat arrays, drone by drone
+        nrounds = np.array([len(tours) for tours in self.drone_tours], dtype=int)
+        flight_drone = np.repeat(np.arange(self.ndrones), nrounds)
+        flight_tour = np.array([itour for tours in self.drone_tours for itour in tours], dtype=int)
+        nflights = len(flight_tour)
+        first_flight = np.concatenate(([0], np.cumsum(nrounds)))[:-1]  # first flight of each drone
+
+        # timeline of each drone: take off, landing and next take off after the turnaround
+        duration = self.completion[flight_tour]
+        step = duration + self.turnaround[flight_drone]
+        cum_step = np.cumsum(step) - step
+        takeoff = cum_step - cum_step[first_flight][flight_drone]
+        end = takeoff + duration
+
+        # failures: the injected ones and, for each flight, whether the drone fails and when along the tour
+        random_failure = rng.random(nflights) < failure_probability
+        failure_instant = rng.random(nflights)
+        fails = np.minimum(failure_at[flight_drone],
+                           np.where(random_failure, takeoff + failure_instant * duration, np.inf))
+        broken = (fails < end) | (failure_at[flight_drone] <= takeoff)  # lost during the tour or on the ground
+        first_broken = np.full(self.ndrones, nflights)
+        np.minimum.at(first_broken, flight_drone[broken], np.flatnonzero(broken))
+
+        flight_index = np.arange(nflights)
+        flown = flight_index < first_broken[flight_drone]  # completed flights
+        completed = np.bincount(flight_drone[flown], minlength=self.ndrones)
+        failed = first_broken < nflights
+        landing = np.zeros(self.ndrones)
+        last = first_flight + completed - 1  # last completed flight of each drone
+        landing[completed > 0] = end[last[completed > 0]]
+        landing[failed] = np.minimum(fails, failure_at[flight_drone])[first_broken[failed]]
+
+        tour_first_start = np.full(len(self.completion), np.inf)  # first take off of each evaluated tour
+        np.minimum.at(tour_first_start, flight_tour[flown], takeoff[flown])
+        # flights interrupted by a failure: (tour, take off, failure instant)
+        cut_flights = [(flight_tour[i], takeoff[i], landing[flight_drone[i]]) for i in first_broken[failed]]
+
+        # the inspections: the first completed flight of each evaluated tour, and the interrupted flights
+        first_times = np.full(self.aoi.n_targets, np.inf)
+        ins_times = tour_first_start[self.inspection_tours] + self.times
+        np.minimum.at(first_times, self.targets, ins_times)
+        for itour, takeoff, fails in cut_flights:
+            inspections = np.flatnonzero(self.inspection_tours == itour)
+            times = takeoff + self.times[inspections]
+            valid = times < fails
+            np.minimum.at(first_times, self.targets[inspections][valid], times[valid])
+
+        return SimulationResult(first_times,
+                                {drone: float(landing[i]) for i, drone in enumerate(self.drones)},
+                                {drone: int(completed[i]) for i, drone in enumerate(self.drones)},
+                                {drone: float(landing[i]) for i, drone in enumerate(self.drones) if failed[i]})
@@ -0,0 +1,187 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains a vectorized generator of (large) random instances, built on np.random.Generator.
+
+Layouts of the targets:
+    uniform: the targets are uniformly distributed in the area;
+    clusters: the targets are sampled from Gaussian clusters (random centers, sizes and spreads);
+    corridor: the targets lie along a random polyline (e.g., a road, a river or a pipeline), within a given half-width.
+Depot strategies:
+    random: uniform in the area;  border: on the border of the area;  grid: the centers of a regular grid of cells;
+    line: on the horizontal line y = 100 (as utility.build_random_aoi).
+The coordinates are integers (meters) and without duplicates, the hovering times are per target.
+The arrays are handed to AoI.from_arrays: 100k+ targets are generated in a few tenths of a second.
+
+E.g.,
+    aoi = generator.random_aoi(5000, 5000, 100000, 4, layout="clusters", hovering_time=(2, 10), seed=1)
+"""
+
+from src.entities.trajenties import AoI
+
+import numpy as np
+
+
+LAYOUTS = ("uniform", "clusters", "corridor")
+DEPOT_STRATEGIES = ("random", "border", "grid", "line")
+
+
+def _unique_points(rng: np.random.Generator, sampler, n: int, width: int, height: int, excluded=None):
+    """ Internal use - draw n distinct integer points in the area with a vectorized sampler, resampling the
+        duplicates (and the excluded points) until enough points are found.
+
+    :param sampler: a function (rng, size) -> (size x 2) float array of candidate points
+    :param excluded: a (k x 2) array of points not allowed (e.g., the depots), default None
+    :return: a (n x 2) int64 array, in the order of sampling
+    """
+    assert n <= width * height, "the area has less integer points than the requested targets"
+    points = np.empty((0, 2), dtype=np.int64)
+    keys = np.empty(0, dtype=np.int64)
+    excluded_keys = np.empty(0, dtype=np.int64) if excluded is None \
+        else excluded[:, 0].astype(np.int64) * height + excluded[:, 1].astype(np.int64)
+    for attempt in range(100):
+        missing = n - len(points)
+        if missing == 0:
+            return points
+        candidates = np.rint(sampler(rng, missing + missing // 10 + 16)).astype(np.int64)
+        candidates[:, 0] = np.clip(candidates[:, 0], 0, width - 1)
+        candidates[:, 1] = np.clip(candidates[:, 1], 0, height - 1)
+        # keep the first occurrence of each new point (the order of sampling is preserved)
+        candidate_keys = candidates[:, 0] * height + candidates[:, 1]
+        _, first = np.unique(candidate_keys, return_index=True)
+        first = np.sort(first)
+        new = first[~np.isin(candidate_keys[first], keys) & ~np.isin(candidate_keys[first], excluded_keys)][:missing]
+        points = np.concatenate((points, candidates[new]))
+        keys = np.concatenate((keys, candidate_keys[new]))
+    raise ValueError("the layout is too dense: cannot draw {} distinct points".format(n))
+
+
+# -------------------------------------------------------------------
+# layouts
+# -------------------------------------------------------------------
+
+def uniform_targets(rng: np.random.Generator, n_targets: int, width: int, height: int, excluded=None):
+    """ the targets uniformly distributed in the area
+
+    :return: a (n_targets x 2) int64 array of coordinates
+    """
+    def sampler(rng, size):
+        return rng.uniform((0, 0), (width, height), size=(size, 2))
+    return _unique_points(rng, sampler, n_targets, width, height, excluded)
+
+
+def clustered_targets(rng: np.random.Generator, n_targets: int, width: int, height: int, n_clusters: int = 10,
+                      spread: float = None, excluded=None):
+    """ the targets sampled from Gaussian clusters: random centers, random weights (sizes) and random spreads
+
+    :param n_clusters: the number of clusters
+    :param spread: the mean standard deviation (meters) of the clusters, default 1/20 of the smallest side
+    :return: a (n_targets x 2) int64 array of coordinates
+    """
+    spread = spread if spread is not None else min(width, height) / 20
+    centers = rng.uniform((0, 0), (width, height), size=(n_clusters, 2))
+    sigmas = rng.uniform(0.5, 1.5, size=n_clusters) * spread
+    weights = rng.dirichlet(np.full(n_clusters, 2.0))
+
+    def sampler(rng, size):
+        cluster = rng.choice(n_clusters, size=size, p=weights)
+        return centers[cluster] + rng.standard_normal((size, 2)) * sigmas[cluster, np.newaxis]
+    return _unique_points(rng, sampler, n_targets, width, height, excluded)
+
+
+def corridor_targets(rng: np.random.Generator, n_targets: int, width: int, height: int, n_waypoints: int = 5,
+                     half_width: float = None, excluded=None):
+    """ the targets along a random polyline, from the left to the right side of the area, within a half-width
+
+    :param n_waypoints: the number of waypoints of the polyline (its ends included)
+    :param half_width: the max distance (meters) of the targets from the polyline, default 1/50 of the smallest side
+    :return: a (n_targets x 2) int64 array of coordinates
+    """
+    half_width = half_width if half_width is not None else min(width, height) / 50
+    waypoints = np.column_stack((np.linspace(0, width, n_waypoints), rng.uniform(0, height, size=n_waypoints)))
+    segments = waypoints[1:] - waypoints[:-1]
+    lengths = np.sqrt((segments ** 2).sum(axis=1))
+    normals = np.column_stack((-segments[:, 1], segments[:, 0])) / lengths[:, np.newaxis]
+
+    def sampler(rng, size):
+        segment = rng.choice(len(segments), size=size, p=lengths / lengths.sum())  # uniform along the polyline
+        along = rng.uniform(0, 1, size=size)[:, np.newaxis]
+        across = rng.uniform(-half_width, half_width, size=size)[:, np.newaxis]
+        return waypoints[segment] + along * segments[segment] + across * normals[segment]
+    return _unique_points(rng, sampler, n_targets, width, height, excluded)
+
+
+# -------------------------------------------------------------------
+# depots and hovering times
+# -------------------------------------------------------------------
+
+def place_depots(rng: np.random.Generator, n_depots: int, width: int, height: int, strategy: str = "random"):
+    """ the coordinates of the depots
+
+    :param strategy: one among "random", "border", "grid" and "line" (see the file content)
+    :return: a (n_depots x 2) int64 array of coordinates
+    """
+    assert strategy in DEPOT_STRATEGIES, "the depot strategy must be one among " + str(DEPOT_STRATEGIES)
+    if strategy == "grid":
+        columns = int(np.ceil(np.sqrt(n_depots * width / height)))
+        rows = int(np.ceil(n_depots / columns))
+        cells = np.arange(n_depots)
+        return np.column_stack(((cells % columns + 0.5) * width / columns,
+                                (cells // columns + 0.5) * height / rows)).astype(np.int64)
+
+    def sampler(rng, size):
+        if strategy == "random":
+            return rng.uniform((0, 0), (width, height), size=(size, 2))
+        elif strategy == "line":
+            return np.column_stack((rng.uniform(0, width, size=size), np.full(size, min(100, height - 1))))
+        # border: a random position along the perimeter
+        position = rng.uniform(0, 2 * (width + height), size=size)
+        x = np.select([position < width, position < width + height, position < 2 * width + height],
+                      [position, width, 2 * width + height - position], 0)
+        y = np.select([position < width, position < width + height, position < 2 * width + height],
+                      [0, position - width, height], 2 * (width + height) - position)
+        return np.column_stack((x, y))
+    return _unique_points(rng, sampler, n_depots, width, height)
+
+
+def hovering_times(rng: np.random.Generator, n_targets: int, hovering_time=5):
+    """ the hovering time (seconds) of each target
+
+    :param hovering_time: a number (the same time for all the targets), a tuple (min, max) for uniform random times,
+                            or an array with the time of each target
+    :return: a float array of n_targets hovering times
+    """
+    if isinstance(hovering_time, tuple):
+        return rng.uniform(hovering_time[0], hovering_time[1], size=n_targets)
+    return np.broadcast_to(np.asarray(hovering_time, dtype=float), (n_targets,)).copy()
+
+
+def random_aoi(width: int, height: int, n_targets: int, n_depots: int, layout: str = "uniform",
+               depots: str = "random", hovering_time=5, seed=None, **layout_params) -> AoI:
+    """ generate a random area of interest
+
+    :param width: the width (meters) of the area of interest
+    :param height: the height (meters) of the area of interest
+    :param n_targets: the number of targets
+    :param n_depots: the number of depots
+    :param layout: the distribution of the targets, one among "uniform", "clusters" and "corridor"
+    :param depots: the depot placement strategy, one among "random", "border", "grid" and "line"
+    :param hovering_time: the hovering times of the targets (see hovering_times)
+    :param seed: the seed of the np.random.Generator, or a np.random.Generator (default None: random)
+    :param layout_params: the optional parameters of the layout (e.g., n_clusters and spread for "clusters",
+                            n_waypoints and half_width for "corridor")
+    :return: the area of interest : AoI
+    """
+    assert layout in LAYOUTS, "the layout must be one among " + str(LAYOUTS)
+    rng = np.random.default_rng(seed)
+    depot_points = place_depots(rng, n_depots, width, height, depots)
+    layout_function = {"uniform": uniform_targets, "clusters": clustered_targets, "corridor": corridor_targets}[layout]
+    target_points = layout_function(rng, n_targets, width, height, excluded=depot_points, **layout_params)
+    return AoI.from_arrays(depot_points, target_points, width, height,
+                           targets_hovering_times=hovering_times(rng, n_targets, hovering_time))
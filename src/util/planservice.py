@@ -0,0 +1,295 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains a long-lived local planning service, to re-plan known areas without paying at each request
+the python start up, the AoI build and the trajectories generation.
+
+The service keeps in memory (warm caches):
+    the AoIs (with their distance data), registered once with an id;
+    the pools of candidate tours, for each (AoI, depot, drone autonomy, drone speed), computed by a single trajectory
+    generator per AoI (the drones of a depot share its TSP backbone). A cold pool is computed only once, also for
+    concurrent requests, and the requests with warm pools do not wait for it (no lock is held while computing).
+It accepts plan requests (AoI id, fleet, rounds, algorithm) and runs them on a pool of worker threads. The queue of the
+pending requests is bounded (backpressure): when it is full, the request is immediately rejected as "busy".
+The threads give concurrency, not parallelism: the trajectories generation and GaP are pure python (GIL), hence a
+cold pool still slows down, by time sharing, the warm re-plans of the other requests. The warm caches live in this
+process: run a service per core (or per group of AoIs) to plan in parallel.
+
+Protocol: one json object per line (request and response), over a Unix socket or a localhost TCP socket.
+    {"op": "register_aoi", "aoi_id": "area1", "depots": [[x, y], ..], "targets": [[x, y], ..],
+        "width": 2000, "height": 2000, "hovering_time": 5}   (optional "targets_hovering_times": [h1, h2, ..])
+    {"op": "plan", "aoi_id": "area1", "rounds": 4, "algorithm": "AC-GaP",
+        "fleet": [{"id": 0, "autonomy": 1500, "speed": 8, "depot": 0}, ..]}   (depot: index in the depots list)
+    {"op": "stats"}
+The response has a "status" ("ok", "busy" or "error") and, for plans, the serialized MultiRoundSolution
+(see trajenties.MultiRoundSolution.to_dict) under "solution".
+
+Run with: python3 -m src.util.planservice --socket /tmp/planner.sock   (or --port 8765)
+"""
+
+from src.entities.trajenties import AoI, Drone
+from src.algorithms.trajbuilder import DroneTrajGeneration
+from src.algorithms.dispatch import solve
+
+from concurrent.futures import ThreadPoolExecutor, Future
+from argparse import ArgumentParser
+
+import threading
+import asyncio
+import socket
+import json
+import time
+
+
+""" The planning service: warm caches, a bounded queue of plan requests and a pool of workers """
+class PlanningService:
+
+    def __init__(self, n_workers: int = 4, queue_size: int = 64, debug: bool = True):
+        """
+        :param n_workers: the number of plan requests processed concurrently (threads: no parallelism, see above)
+        :param queue_size: the maximum number of pending plan requests, the further ones are rejected as "busy"
+        :param debug: whether print or not the requests
+        """
+        self.n_workers = n_workers
+        self.queue_size = queue_size
+        self.debug = debug
+
+        self.aois = {}  # aoi id -> AoI
+        self.tour_pools = {}  # (aoi id, depot index, autonomy, speed) -> list of tours
+        self.__pending_pools = {}  # the pools being computed: key -> Future of the list of tours
+        self.__generators = {}  # aoi id -> (DroneTrajGeneration, lock of the generator)
+        self.__pools_lock = threading.Lock()  # held only to read and update the dictionaries, never to compute
+        self.executor = ThreadPoolExecutor(max_workers=n_workers)
+        self.queue = None  # created in the event loop of the server
+        self.served = 0
+
+    # -------------------------------------------------------------------
+    # caches
+    # -------------------------------------------------------------------
+
+    def register_aoi(self, aoi_id: str, aoi: AoI):
+        """ add (or replace) an AoI in the cache and warm its distance data """
+        aoi.metric_closure()
+        aoi.hovering_times()
+        with self.__pools_lock:  # the pools of a replaced AoI are stale
+            self.aois[aoi_id] = aoi
+            self.__generators[aoi_id] = (DroneTrajGeneration(aoi), threading.Lock())
+            for key in [k for k in self.tour_pools if k[0] == aoi_id]:
+                del self.tour_pools[key]
+            for key in [k for k in self.__pending_pools if k[0] == aoi_id]:
+                del self.__pending_pools[key]  # still completed for their requests, but not cached
+
+    def warm_backbones(self, aoi_id: str, drones_depots: dict, aoi: AoI = None):
+        """ compute in advance a single TSP backbone per depot for the drones {drone : depot index} of a request
+
+        :param aoi: the AoI captured by the request (default the registered one): nothing is done if it was replaced
+        """
+        with self.__pools_lock:
+            aoi = self.aois[aoi_id] if aoi is None else aoi
+            if self.aois.get(aoi_id) is not aoi:
+                return
+            generator, generator_lock = self.__generators[aoi_id]
+        with generator_lock:
+            generator.compute_backbones({drone: aoi.depots[depot] for drone, depot in drones_depots.items()})
+
+    def tour_pool(self, aoi_id: str, depot_index: int, drone: Drone, aoi: AoI = None) -> list:
+        """ return the candidate tours for the drone from the depot, computed once and cached. A cold pool is computed
+            by the first request; the concurrent requests of the same pool wait for it, the others do not
+
+        :param aoi: the AoI captured by the request (default the registered one): if it was replaced meanwhile, the
+                    pool of the captured AoI is computed and not cached
+        """
+        key = (aoi_id, depot_index, drone.autonomy, drone.speed)
+        with self.__pools_lock:
+            aoi = self.aois[aoi_id] if aoi is None else aoi
+            stale = self.aois.get(aoi_id) is not aoi
+            if not stale and key in self.tour_pools:
+                return self.tour_pools[key]
+            future = None if stale else self.__pending_pools.get(key)
+            if future is None and not stale:
+                future = self.__pending_pools[key] = Future()
+                generator, generator_lock = self.__generators[aoi_id]
+                owner = True
+            else:
+                owner = False
+        if stale:
+            return DroneTrajGeneration(aoi).compute_trajectories(drone, aoi.depots[depot_index])
+        if not owner:
+            return future.result()
+
+        try:
+            with generator_lock:  # the generator caches the backbones of the AoI
+                pool = generator.compute_trajectories(drone, aoi.depots[depot_index])
+        except BaseException as e:
+            with self.__pools_lock:
+                if self.__pending_pools.get(key) is future:
+                    del self.__pending_pools[key]
+            future.set_exception(e)
+            raise
+        with self.__pools_lock:
+            if self.__pending_pools.get(key) is future:  # the AoI was not replaced meanwhile
+                del self.__pending_pools[key]
+                self.tour_pools[key] = pool
+        future.set_result(pool)
+        return pool
+
+    # -------------------------------------------------------------------
+    # requests
+    # -------------------------------------------------------------------
+
+    def plan(self, request: dict) -> dict:
+        """ compute a plan (blocking): return the serialized multi round solution """
+        aoi_id = request["aoi_id"]
+        t_start = time.perf_counter()
+        drones_depots = {Drone(d["autonomy"], d["speed"], id=d.get("id")): d["depot"] for d in request["fleet"]}
+        with self.__pools_lock:  # the AoI of the whole request, also if it is replaced meanwhile
+            aoi = self.aois.get(aoi_id)
+            if aoi is None:
+                raise KeyError("unknown aoi id: {}".format(aoi_id))
+            cold = {drone: depot for drone, depot in drones_depots.items()
+                    if (aoi_id, depot, drone.autonomy, drone.speed) not in self.tour_pools}
+        if len(cold) > 0:
+            self.warm_backbones(aoi_id, cold, aoi)
+        uavs_tours = {drone: self.tour_pool(aoi_id, depot, drone, aoi) for drone, depot in drones_depots.items()}
+        mrs = solve(request["algorithm"], aoi, uavs_tours, request["rounds"])
+        return {"status": "ok", "solution": mrs.to_dict(request["rounds"]), "time": time.perf_counter() - t_start}
+
+    async def handle(self, request: dict) -> dict:
+        """ serve a request: plans go through the bounded queue, the other operations are served immediately """
+        op = request.get("op")
+        if op == "register_aoi":
+            aoi = AoI([tuple(p) for p in request["depots"]], [tuple(p) for p in request["targets"]],
+                      request.get("width", 0), request.get("height", 0), request.get("hovering_time", 0),
+                      targets_hovering_times=request.get("targets_hovering_times"))
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.register_aoi,
+                                                             request["aoi_id"], aoi)
+            return {"status": "ok"}
+        elif op == "plan":
+            if self.queue.full():
+                return {"status": "busy", "error": "too many pending requests"}
+            answer = asyncio.get_running_loop().create_future()
+            self.queue.put_nowait((request, answer))
+            return await answer
+        elif op == "stats":
+            return {"status": "ok", "aois": list(self.aois.keys()), "tour_pools": len(self.tour_pools),
+                    "pending": self.queue.qsize(), "served": self.served}
+        return {"status": "error", "error": "unknown op: {}".format(op)}
+
+    async def worker(self):
+        """ consume the plan requests of the queue, running them on the executor """
+        loop = asyncio.get_running_loop()
+        while True:
+            request, answer = await self.queue.get()
+            try:
+                response = await loop.run_in_executor(self.executor, self.plan, request)
+            except Exception as e:
+                response = {"status": "error", "error": repr(e)}
+            self.served += 1
+            if not answer.cancelled():
+                answer.set_result(response)
+            self.queue.task_done()
+
+    async def __connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ serve the json lines of a connection """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    response = await self.handle(request)
+                except Exception as e:
+                    response = {"status": "error", "error": repr(e)}
+                if self.debug:
+                    print("PlanningService:", request.get("op") if isinstance(request, dict) else None,
+                          "->", response["status"])
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, path: str = None, host: str = "127.0.0.1", port: int = 8765):
+        """
+        run the service forever.
+
+        :param path: the path of the Unix socket; if None a TCP socket on host:port is used
+        :param host: the host of the TCP socket (default localhost)
+        :param port: the port of the TCP socket
+        """
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        workers = [asyncio.create_task(self.worker()) for i in range(self.n_workers)]
+        if path is not None:
+            server = await asyncio.start_unix_server(self.__connection, path=path, limit=2 ** 26)
+        else:
+            server = await asyncio.start_server(self.__connection, host=host, port=port, limit=2 ** 26)
+        if self.debug:
+            print("PlanningService: listening on", path if path is not None else "{}:{}".format(host, port))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for w in workers:
+                w.cancel()
+
+
+""" A blocking client of the planning service """
+class PlanningClient:
+
+    def __init__(self, path: str = None, host: str = "127.0.0.1", port: int = 8765):
+        """
+        :param path: the path of the Unix socket of the service; if None a TCP socket on host:port is used
+        """
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.file = self.socket.makefile("rwb")
+
+    def request(self, request: dict) -> dict:
+        """ send a request and wait for its response """
+        self.file.write((json.dumps(request) + "\n").encode())
+        self.file.flush()
+        return json.loads(self.file.readline())
+
+    def register_aoi(self, aoi_id: str, aoi: AoI) -> dict:
+        """ register an AoI in the service """
+        return self.request({"op": "register_aoi", "aoi_id": aoi_id, "depots": aoi.depots,
+                             "targets": aoi.target_points, "width": aoi.width, "height": aoi.height,
+                             "hovering_time": aoi.node_hovering_time,
+                             "targets_hovering_times": None if aoi.targets_hovering_times is None
+                             else [float(h) for h in aoi.targets_hovering_times]})
+
+    def plan(self, aoi_id: str, fleet: list, rounds: int, algorithm: str = "AC-GaP") -> dict:
+        """
+        :param aoi_id: the id of a registered AoI
+        :param fleet: a list of dictionaries {"id" : .., "autonomy" : .., "speed" : .., "depot" : depot index}
+        :param rounds: the maximum number of rounds
+        :param algorithm: one among "TC-GaP", "AC-GaP", "TC-OPT", "AC-OPT"
+        """
+        return self.request({"op": "plan", "aoi_id": aoi_id, "fleet": fleet, "rounds": rounds, "algorithm": algorithm})
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser()
+    parser.add_argument('--socket', type=str, default=None, help="the path of the Unix socket")
+    parser.add_argument('--host', type=str, default="127.0.0.1", help="the host of the TCP socket")
+    parser.add_argument('--port', type=int, default=8765, help="the port of the TCP socket")
+    parser.add_argument('--workers', type=int, default=4, help="the number of parallel plan requests")
+    parser.add_argument('--queue', type=int, default=64, help="the maximum number of pending plan requests")
+    args = parser.parse_args()
+
+    service = PlanningService(n_workers=args.workers, queue_size=args.queue)
+    asyncio.run(service.serve(path=args.socket, host=args.host, port=args.port))
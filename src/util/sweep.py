@@ -0,0 +1,332 @@
+"""
+Owner: Andrea Coletta
+Version v1.0
+Release code for TMC : 10.1109/TMC.2020.2994529 and its ICDCS conference version : 10.1109/ICDCS.2019.00209
+
+Please cite these works in case of use.
+
+
+File content:
+This file contains a runner for parameter sweeps of experiments (e.g., TC-GaP vs AC-GaP vs TC-OPT vs AC-OPT).
+
+A sweep is declared as a grid: a dictionary {parameter : list of values}. Each cell of the grid (one value for each
+parameter) is executed on a pool of processes, with a per-task timeout and a number of retries.
+The rows (one for each cell) are streamed to a CSV file (or a Parquet dataset) as soon as the cells complete:
+a crashed sweep can be resumed: the already completed cells are skipped, the failed ones (error or timeout) run
+again and their new row supersedes the failed one.
+
+E.g.,
+    grid = {"algorithm": ["TC-GaP", "AC-GaP"], "seed": [1, 2, 3], "n_targets": [50, 100],
+            "fleet": [[(1500, 8), (1500, 16)]], "max_rounds": [3, 4]}
+    SweepRunner(grid, "data/sweep.csv", n_workers=4, timeout=600, retries=1).run()
+"""
+
+from src.entities.trajenties import Drone
+from src.algorithms.trajbuilder import DroneTrajGeneration
+from src.algorithms.dispatch import solve
+from src.util import utility
+
+from multiprocessing.connection import wait
+
+import multiprocessing
+import itertools
+import json
+import time
+import csv
+import os
+
+# the default values of the optional parameters of a cell
+DEFAULT_CELL_PARAMS = {"n_depots": 2, "width": 2000, "height": 2000, "hovering_time": 5}
+
+# the number of maximal tours of each drone in the seed pool of the column generation (TC-CG and AC-CG)
+CG_SEED_TOURS = 20
+
+# the metrics of each row of the sweep (in addition to the cell parameters) and their types
+METRICS = {"coverage": int, "cumulative_coverage": int, "rounds": int,
+           "time_aoi": float, "time_trajectories": float, "time_algorithm": float,
+           "status": str, "attempts": int, "error": str}
+
+
+# -----------------------------------------------------------------------------------
+#
+#							 FUNCTIONS
+#
+# -----------------------------------------------------------------------------------
+
+def cell_id(params: dict) -> str:
+    """ a stable identifier of the cell: the json of its parameters (sorted keys) """
+    return json.dumps(params, sort_keys=True)
+
+
+def run_cell(params: dict) -> dict:
+    """
+    run a cell of the sweep: build the random AoI, the fleet and its trajectories, and solve the assignment.
+
+    :param params: the parameters of the cell. Mandatory keys: "algorithm", "seed", "n_targets", "fleet", "max_rounds".
+                    "fleet" is a list of (autonomy, speed) of the drones; the i-th drone uses the depot i % n_depots.
+                    Optional keys (see DEFAULT_CELL_PARAMS): "n_depots", "width", "height", "hovering_time".
+    :return: a dictionary with the metrics of the cell (coverage, cumulative coverage, rounds and runtime per stage)
+    """
+    params = dict(DEFAULT_CELL_PARAMS, **params)
+
+    t_start = time.perf_counter()
+    aoi = utility.build_random_aoi(params["width"], params["height"], params["n_targets"], params["n_depots"],
+                                   params["hovering_time"], seed=params["seed"])
+    drones = [Drone(autonomy, speed, id=i) for i, (autonomy, speed) in enumerate(params["fleet"])]
+    t_aoi = time.perf_counter()
+
+    trajectories_builder = DroneTrajGeneration(aoi)
+    drones_depots = {drone: aoi.depots[i % aoi.n_depots] for i, drone in enumerate(drones)}
+    if params["algorithm"] in ("TC-CG", "AC-CG"):  # the seed pool: the column generation generates the other tours
+        trajectories_builder.compute_backbones(drones_depots)
+        uavs_tours = {drone: list(trajectories_builder.iter_trajectories(drone, depot, max_tours=CG_SEED_TOURS,
+                                                                          maximal=True))
+                      for drone, depot in drones_depots.items()}
+    else:
+        uavs_tours = trajectories_builder.compute_fleet_trajectories(drones_depots)
+    t_trajectories = time.perf_counter()
+
+    mrs = solve(params["algorithm"], aoi, uavs_tours, params["max_rounds"])
+    t_algorithm = time.perf_counter()
+
+    return {"coverage": mrs.coverage_score(),
+            "cumulative_coverage": mrs.cumulative_coverage_score(params["max_rounds"]),
+            "rounds": mrs.max_rounds,
+            "time_aoi": t_aoi - t_start,
+            "time_trajectories": t_trajectories - t_aoi,
+            "time_algorithm": t_algorithm - t_trajectories}
+
+
+def _cell_process(run, params: dict, conn):
+    """ Internal use - the body of a worker process: run the cell and send back the outcome """
+    try:
+        conn.send(("ok", run(params)))
+    except Exception as e:
+        conn.send(("error", repr(e)))
+    finally:
+        conn.close()
+
+
+# -----------------------------------------------------------------------------------
+#
+#							 WRITERS
+#
+# -----------------------------------------------------------------------------------
+
+""" Stream the rows of the sweep to a CSV file, one row at time """
+class CsvRowWriter:
+
+    def __init__(self, path: str, fieldnames: list):
+        """
+        :param path: the csv file. If it already exists, the rows are appended (resume)
+        :param fieldnames: the columns of the csv file
+        """
+        self.path = path
+        self.fieldnames = fieldnames
+        self.__drop_partial_row()
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self.file = open(self.path, "a", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+        if new_file:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def __drop_partial_row(self):
+        """ a crash may leave a truncated last row: remove it before appending new rows """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            content = f.read()
+            if content and not content.endswith(b"\n"):
+                f.truncate(content.rfind(b"\n") + 1)
+
+    def completed_cells(self) -> set:
+        """ return the ids of the cells already written with status "ok": the failed cells (error or timeout) run
+            again on resume, their new row supersedes the failed one (the last row of a cell is its outcome) """
+        with open(self.path, newline="") as f:
+            return {row["cell"] for row in csv.DictReader(f) if row.get("cell") and row.get("status") == "ok"}
+
+    def write(self, row: dict):
+        """ write and flush a row on the file """
+        self.writer.writerow(row)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+""" Stream the rows of the sweep to a Parquet dataset (a directory), one part file per row. Requires pyarrow. """
+class ParquetRowWriter:
+
+    def __init__(self, path: str, fieldnames: list):
+        """
+        :param path: the directory of the dataset. If it already exists, the new part files are added (resume)
+        :param fieldnames: the columns of the dataset
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is required to write the sweep in Parquet format, use a .csv output instead")
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        self.path = path
+        self.fieldnames = fieldnames
+        os.makedirs(self.path, exist_ok=True)
+        self.nparts = len(self.__parts())
+
+    def __parts(self) -> list:
+        return sorted(f for f in os.listdir(self.path) if f.startswith("part-") and f.endswith(".parquet"))
+
+    def completed_cells(self) -> set:
+        """ return the ids of the cells already written with status "ok": the failed cells (error or timeout) run
+            again on resume, their new part supersedes the failed one (the last part of a cell is its outcome) """
+        cells = set()
+        for part in self.__parts():
+            table = self.pq.read_table(os.path.join(self.path, part), columns=["cell", "status"]).to_pydict()
+            cells |= {cell for cell, status in zip(table["cell"], table["status"]) if status == "ok"}
+        return cells
+
+    def __schema(self, row: dict):
+        """ a fixed schema for all the parts: the types of the metrics, and of the parameters of the row """
+        types = {int: self.pa.int64(), float: self.pa.float64(), str: self.pa.string()}
+        return self.pa.schema([(k, types[METRICS[k] if k in METRICS else type(row[k])]) for k in self.fieldnames])
+
+    def write(self, row: dict):
+        """ write a row as a new part file (atomically: a crash never leaves a truncated part) """
+        table = self.pa.Table.from_pylist([{k: row.get(k) for k in self.fieldnames}], schema=self.__schema(row))
+        part = os.path.join(self.path, "part-{:06d}.parquet".format(self.nparts))
+        self.pq.write_table(table, part + ".tmp")
+        os.replace(part + ".tmp", part)
+        self.nparts += 1
+
+    def close(self):
+        pass
+
+
+# -----------------------------------------------------------------------------------
+#
+#							 SWEEP RUNNER
+#
+# -----------------------------------------------------------------------------------
+
+""" Run a declarative grid of experiments on a pool of processes """
+class SweepRunner:
+
+    def __init__(self, grid: dict, output: str, n_workers: int = None, timeout: float = None,
+                 retries: int = 0, run=run_cell, debug: bool = True):
+        """
+        :param grid: a dictionary {parameter : list of values}; the cells are the cartesian product of the values.
+                        See run_cell for the parameters of a cell.
+        :param output: where stream the rows. A path ending with .parquet is written as a Parquet dataset (directory),
+                        any other path as a csv file
+        :param n_workers: the number of parallel processes, at least 1 (default: the number of cpus)
+        :param timeout: the maximum time in seconds of each attempt of a cell; None for no timeout (default None)
+        :param retries: the number of further attempts of a cell after a timeout or an error (default 0)
+        :param run: the function that runs a cell: params -> metrics dictionary (default run_cell)
+        :param debug: whether print or not the progress of the sweep (default True)
+        """
+        self.grid = grid
+        self.output = output
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        assert self.n_workers >= 1, "the sweep needs at least a worker"
+        self.timeout = timeout
+        self.retries = retries
+        self.run_function = run
+        self.debug = debug
+
+        self.param_names = sorted(grid.keys())
+        self.fieldnames = ["cell"] + self.param_names + list(METRICS.keys())
+
+    def cells(self) -> list:
+        """ return all the cells of the grid, each cell is a dictionary {parameter : value} """
+        values = [self.grid[name] for name in self.param_names]
+        return [dict(zip(self.param_names, combination)) for combination in itertools.product(*values)]
+
+    def __writer(self):
+        if self.output.endswith(".parquet"):
+            return ParquetRowWriter(self.output, self.fieldnames)
+        return CsvRowWriter(self.output, self.fieldnames)
+
+    def __row(self, params: dict, status: str, attempts: int, metrics: dict = None, error: str = ""):
+        """ build the output row of a cell """
+        row = {"cell": cell_id(params), "status": status, "attempts": attempts, "error": error}
+        for name in self.param_names:
+            value = params[name]
+            row[name] = value if isinstance(value, (int, float, str)) else json.dumps(value)
+        row.update(metrics or {})
+        return row
+
+    def run(self) -> int:
+        """
+        run all the cells not yet completed in the output and stream their rows.
+
+        :return: the number of cells executed by this call
+        """
+        writer = self.__writer()
+        completed = writer.completed_cells()
+        pending = [(params, 1) for params in self.cells() if cell_id(params) not in completed]
+        if self.debug:
+            print("Sweep:", len(pending), "cells to run,", len(completed), "already completed")
+
+        executed = 0
+        running = {}  # connection -> (process, params, attempt, start time)
+        try:
+            while pending or running:
+                # fill the pool
+                while pending and len(running) < self.n_workers:
+                    params, attempt = pending.pop(0)
+                    reader, sender = multiprocessing.Pipe(duplex=False)
+                    process = multiprocessing.Process(target=_cell_process,
+                                                      args=(self.run_function, params, sender), daemon=True)
+                    process.start()
+                    sender.close()
+                    running[reader] = (process, params, attempt, time.monotonic())
+
+                for reader in wait(list(running.keys()), timeout=self.__next_deadline(running)):
+                    process, params, attempt, _ = running.pop(reader)
+                    try:
+                        status, outcome = reader.recv()
+                    except EOFError:  # the process died without an answer
+                        status, outcome = "error", "worker exited with code {}".format(process.exitcode)
+                    reader.close()
+                    process.join()
+                    if status == "ok":
+                        writer.write(self.__row(params, status, attempt, metrics=outcome))
+                        executed += 1
+                    else:
+                        executed += self.__failed(writer, pending, params, attempt, status, outcome)
+
+                # timeouts
+                now = time.monotonic()
+                for reader in [r for r, v in running.items()
+                               if self.timeout is not None and now - v[3] > self.timeout]:
+                    process, params, attempt, _ = running.pop(reader)
+                    process.terminate()
+                    process.join()
+                    reader.close()
+                    executed += self.__failed(writer, pending, params, attempt, "timeout",
+                                              "timeout after {} seconds".format(self.timeout))
+        finally:
+            for reader, (process, _, _, _) in running.items():
+                process.terminate()
+                reader.close()
+            writer.close()
+        return executed
+
+    def __next_deadline(self, running: dict):
+        """ the time to wait before the next timeout expires """
+        if self.timeout is None:
+            return None
+        first_start = min(v[3] for v in running.values())
+        return max(0.0, first_start + self.timeout - time.monotonic())
+
+    def __failed(self, writer, pending: list, params: dict, attempt: int, status: str, error: str) -> int:
+        """ retry a failed cell or, if no retries are left, write its row. Return the number of completed cells """
+        if self.debug:
+            print("Sweep: cell", cell_id(params), "attempt", attempt, "->", status, error)
+        if attempt <= self.retries:
+            pending.append((params, attempt + 1))
+            return 0
+        writer.write(self.__row(params, status, attempt, error=error))
+        return 1
@@ -7,7 +7,8 @@ Please cite these works in case of use.
 
 
 File content:
-This file contains classes responsable to print AoI, Tours and Multi-Round Solutions
+This file contains classes responsable to print AoI, Tours and Multi-Round Solutions.
+It is the only module that depends on matplotlib: the entities load it lazily, on the first plot/save call.
 
 The main classes are:
     Tours -> a wrapper which represent a tour for a drone.
@@ -48,6 +49,20 @@ def gradient_color(lenght):
     return t_colors
 
 
+def plot_cumulative_coverage(rounds: list, cum_coverage: list, title: str = "Cumulative Coverage"):
+    """
+        plot the cumulative coverage of a multi-round solution along the rounds.
+        :param rounds: the rounds on the x axis. e.g., [1, 2, ..., n]
+        :param cum_coverage: the cumulative coverage (number of covered targets) up to each round
+        :param title: the title of the plot
+    """
+    plt.plot(rounds, cum_coverage)
+    plt.ylabel("Cumulative Coverage")
+    plt.xlabel("Round i-th")
+    plt.title(title)
+    plt.show()
+
+
 """ This class is responsable to print and AoI with several targets, viable paths and depots """
 class AoIPlotManager:
 
@@ -17,35 +17,39 @@ from src.entities.trajenties import Tour, AoI, MultiRoundSolution, MultiRoundSol
 
 
 def pruning_multiroundsolution(mrs : MultiRoundSolution) -> MultiRoundSolution:
-    """
+    """ single pass, index based: a tour is rebuilt only if it loses some targets,
+        and the metrics of the pruned solution are kept by the builder along the pruning.
 
     :param mrs: the inptu multi round solution to prune (remove redundant visits)
     :return: a MultiRoundSolution without redundant targets
     """
     # new pruned solution
     pruned_solution = MultiRoundSolutionBuilder(mrs.aoi)
-    for drone in mrs.drone_and_tours.keys():
+    drones = list(mrs.drone_and_tours.keys())
+    for drone in drones:
         pruned_solution.add_drone(drone)
 
     # prune and build new solution
-    already_covered_nodes = set()
+    already_covered_nodes = np.zeros(mrs.aoi.n_targets, dtype=bool)
     for round in range(mrs.max_rounds):
-        for drone in mrs.drone_and_tours.keys():
+        for drone in drones:
             if round >= len(mrs.drone_and_tours[drone]):  # the drone does not use all the rounds
                 continue
 
             actual_tour = mrs.drone_and_tours[drone][round]
-            new_tour_nodes = [actual_tour.depot_index]
-            for node in actual_tour.targets_indexes:
-                if node not in already_covered_nodes:
-                    new_tour_nodes.append(node)
+            targets = actual_tour.targets_array()
+            keep = ~already_covered_nodes[targets]
+            already_covered_nodes[targets] = True
 
-            already_covered_nodes |= set(actual_tour.targets_indexes)
+            if not keep.any():  # we removed all the nodes (all already visit)
+                continue
+            elif keep.all():  # nothing to remove, the tour is kept as is
+                new_tour = actual_tour
+            else:
+                new_tour = Tour.from_ordered_nodes(mrs.aoi, [actual_tour.depot_index] + targets[keep].tolist())
 
-            if len(new_tour_nodes) > 1:  # otherwise we removed all the nodes (all already visit)
-                pruned_solution.append_tour(drone,
-                                            Tour.from_graph_indexes(mrs.aoi,
-                                                                    build_tour_from_ordered_nodes(new_tour_nodes)))
+            # the tour is in the next round of the drone: the empty tours are removed
+            pruned_solution.append_tour(drone, new_tour)
 
     return pruned_solution.build()
 
@@ -71,7 +75,7 @@ def build_random_aoi(width_area:int, height_area :int, n_target :int, n_depots :
     random_depots_points_on_x = [(np.random.randint(0, width_area),
                                   100)  # fixed y
                                  for i in range(n_depots)]
-    return AoI(random_depots_points_on_x, random_target_points, width_area, height_area, node_hovering_time=5)
+    return AoI(random_depots_points_on_x, random_target_points, width_area, height_area, node_hovering_time=hovering_time)
 
 
 def build_tour_from_ordered_nodes(nodes: list):
@@ -99,20 +103,18 @@ class Christofides():
     def compute(cls, graph : nx.Graph, depot_index: int):
         """
 
-        :param graph: the graph where compute the TSP tour
+        :param graph: the graph where compute the TSP tour, it is not modified (e.g., a read-only view of the AoI graph)
         :param: depot_index : the index of node which is referred as depot (start and end of the tour)
         :return: the tsp Tour [e1,e2,...,en] with e1 with indexes of graph
         """
-        graph = graph.copy()
-
         # first step -> MST of graph
         mst = nx.minimum_spanning_tree(graph)
 
         # even
         odd_nodes = Christofides.odd_nodes(mst)
 
-        # induced subgraph of odd nodes
-        odd_graph = graph.subgraph(odd_nodes).copy()
+        # induced subgraph of odd nodes (a view)
+        odd_graph = graph.subgraph(odd_nodes)
 
         # minimum weighted matching
         perfect_match = Christofides.min_weight_matching(odd_graph)
@@ -134,16 +136,129 @@ class Christofides():
         tsp_tour = Christofides.shorted_tour(eu_tour)
         return tsp_tour
 
+    @classmethod
+    def compute_dense(cls, distances: np.ndarray, nodes: list, depot_index: int, two_opt_passes: int = 10):
+        """ the TSP tour of the input nodes on a dense distance matrix (e.g., the metric closure of an AoI with sparse
+            viable paths), without building a complete graph: the MST (Prim) and a greedy matching of its odd nodes
+            are computed with numpy on the sub-matrix of the nodes, then the shortcut eulerian tour is improved by
+            2-opt. The greedy matching has not the 1.5 approximation of the perfect matching.
+
+        :param distances: the (symmetric) distances between all the graph nodes, a square numpy array
+        :param nodes: the indexes (of the graph) of the nodes of the tour, the depot included
+        :param depot_index: the index of node which is referred as depot (start and end of the tour)
+        :param two_opt_passes: the max number of passes of the 2-opt improvement (0: no improvement)
+        :return: the tsp Tour [e1,e2,...,en] with e1 with indexes of graph
+        """
+        nodes = [depot_index] + [node for node in nodes if node != depot_index]
+        sub = distances[np.ix_(nodes, nodes)]
+        assert np.isfinite(sub).all(), "The nodes of the TSP should be connected"
+
+        mst_edges = Christofides.dense_mst(sub)
+        degree = np.bincount(np.array(mst_edges, dtype=np.int64).reshape(-1), minlength=len(nodes))
+        match_edges = Christofides.greedy_matching(sub, np.flatnonzero(degree % 2))
+
+        # eulerian circuit (Hierholzer) of mst + matching, from the depot, then shortcut
+        adjacency = [[] for _ in nodes]
+        for edge_id, (u, v) in enumerate(mst_edges + match_edges):
+            adjacency[u].append((v, edge_id))
+            adjacency[v].append((u, edge_id))
+        used = np.zeros(len(mst_edges) + len(match_edges), dtype=bool)
+        stack, circuit = [0], []
+        while stack:
+            u = stack[-1]
+            while adjacency[u] and used[adjacency[u][-1][1]]:
+                adjacency[u].pop()
+            if adjacency[u]:
+                v, edge_id = adjacency[u].pop()
+                used[edge_id] = True
+                stack.append(v)
+            else:
+                circuit.append(stack.pop())
+        order = list(dict.fromkeys(circuit[::-1]))  # unique nodes in order of visit, from the depot
+        assert len(order) == len(nodes), "The mst + matching of the TSP -> not an eulerian graph"
+
+        order = Christofides.two_opt(sub, np.array(order), two_opt_passes)
+        return build_tour_from_ordered_nodes([nodes[k] for k in order])
+
+    @classmethod
+    def dense_mst(cls, distances: np.ndarray) -> list:
+        """ the minimum spanning tree (Prim) of the complete graph of a dense distance matrix
+
+        :param distances: the (symmetric) distances of the nodes, a square numpy array
+        :return: the list of the n - 1 edges (i, j) of the tree, indexes of the matrix
+        """
+        nnodes = len(distances)
+        in_tree = np.zeros(nnodes, dtype=bool)
+        in_tree[0] = True
+        best = distances[0].astype(float)  # the distance of each node from the tree
+        best[0] = np.inf
+        parent = np.zeros(nnodes, dtype=np.int64)
+        edges = []
+        for _ in range(nnodes - 1):
+            v = int(np.argmin(best))
+            edges.append((int(parent[v]), v))
+            in_tree[v] = True
+            closer = (distances[v] < best) & ~in_tree
+            parent[closer] = v
+            best[closer] = distances[v][closer]
+            best[v] = np.inf
+        return edges
+
+    @classmethod
+    def greedy_matching(cls, distances: np.ndarray, odd_nodes: np.ndarray) -> list:
+        """ a greedy perfect matching of the odd nodes: the pairs are matched by increasing distance
+
+        :param distances: the (symmetric) distances of the nodes, a square numpy array
+        :param odd_nodes: the indexes (of the matrix) of the nodes to match, an even number
+        :return: the list of the matched edges (i, j), indexes of the matrix
+        """
+        rows, cols = np.triu_indices(len(odd_nodes), k=1)
+        order = np.argsort(distances[odd_nodes[rows], odd_nodes[cols]], kind="stable")
+        matched = np.zeros(len(odd_nodes), dtype=bool)
+        edges = []
+        for a, b in zip(rows[order].tolist(), cols[order].tolist()):
+            if not matched[a] and not matched[b]:
+                matched[a] = matched[b] = True
+                edges.append((int(odd_nodes[a]), int(odd_nodes[b])))
+                if 2 * len(edges) == len(odd_nodes):
+                    break
+        return edges
+
+    @classmethod
+    def two_opt(cls, distances: np.ndarray, order: np.ndarray, max_passes: int) -> list:
+        """ improve a tour by 2-opt moves, the first node (the depot) is not moved: for each edge (a, b) of the tour,
+            the best edge (c, d) after it is found in a vectorized way and the path from b to c is reversed if shorter
+
+        :param distances: the (symmetric) distances of the nodes, a square numpy array
+        :param order: the indexes (of the matrix) of the nodes in order of visit, starting from the depot
+        :param max_passes: the max number of passes on the tour
+        :return: the improved order, a list
+        """
+        nnodes = len(order)
+        for _ in range(max_passes):
+            improved = False
+            for i in range(1, nnodes - 1):
+                a, b = order[i - 1], order[i]
+                c, d = order[i + 1:], np.append(order[i + 2:], order[0])
+                delta = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+                k = int(np.argmin(delta))
+                if delta[k] < -1e-9 * max(distances[a, b], 1):
+                    order[i:i + k + 2] = order[i:i + k + 2][::-1].copy()
+                    improved = True
+            if not improved:
+                break
+        return order.tolist()
+
     @classmethod
     def min_weight_matching(cls, graph: nx.Graph):
         """
-        :param graph: NetworkX Graph -  the graph where compute the minium weight matching .
+        :param graph: NetworkX Graph -  the graph where compute the minium weight matching (not modified).
         :return: a list of edges of the perfect match
         """
-        temp_graph = graph.copy()
         # reverse weight to use built-in function of networkx -> max_weight_matching
-        for edge in temp_graph.edges():
-            temp_graph.edges[edge[0], edge[1]]["weight"] = 1.0 / temp_graph.edges[edge[0], edge[1]]["weight"]
+        temp_graph = nx.Graph()
+        temp_graph.add_nodes_from(graph)
+        temp_graph.add_weighted_edges_from((u, v, 1.0 / w) for u, v, w in graph.edges(data="weight"))
 
         # list of edges for a perfect matching graph
         return nx.max_weight_matching(temp_graph)